@@ -1,19 +1,24 @@
 # ai/routes/ai_chat.py
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 from uuid import uuid4
 from datetime import datetime
+from contextlib import contextmanager
+import asyncio
+import json
 import logging
+import time
 
-from ..service.rag import RAGService
+from ..service.rag import get_rag_service
 from ..service.conversation import ConversationService
 from ..service.ai_brain import ai_brain
 from ..service.text_normalizer import text_normalizer
 from ..service.tts_service import tts_service
 from ..service.stt_service import stt_service
 from ..service.query_understanding import QueryUnderstanding
+from ..service.executors import run_in_executor
 
 logger = logging.getLogger(__name__)
 
@@ -71,9 +76,11 @@ def _rag_context_to_blocks(context_raw):
 
     return [str(context_raw).strip()]
 
-# Initialiser les services
-rag = RAGService()
+# Initialiser les services (RAGService partagé par tout le processus)
+rag = get_rag_service()
 conversation_service = ConversationService()
+# Le cache sémantique des réponses réutilise l'encodeur (et le cache d'embeddings) du RAG
+ai_brain.attach_embedder(rag.embed_query)
 
 # ==============================
 # Request Models
@@ -337,369 +344,461 @@ def chat_guest(req: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Erreur du service AI: {str(e)}")
 
 
-@router.post("/chat/intelligent")
-def chat_intelligent(req: ChatRequest):
-    """
-    🧠 NOUVEAU: Endpoint avec IA VRAIMENT INTELLIGENTE
+class _StageTimer:
+    """Durées (ms) des étapes d'une requête du pipeline intelligent"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def finish(self) -> dict:
+        self.timings["total"] = round((time.perf_counter() - self.started) * 1000, 1)
+        return dict(self.timings)
+
+
+def _expand_query(message: str) -> str:
+    """Requête enrichie (reformulation santé ou mots-clés du domaine) envoyée au RAG"""
+    logger.info(f"🧠 Question originale: '{message}'")
     
-    Utilise Ollama (LLaMA 2 local) pour:
-    - Analyser la question dans le contexte
-    - Reformuler naturellement les réponses RAG
-    - Maintenir un dialogue cohérent
-    - Adapter au contexte burkinabè
+    # Essayer de comprendre la question (surtout pour santé)
+    understanding = QueryUnderstanding.understand_health_query(message)
+    if understanding:
+        logger.info(f"💡 Compréhension: {understanding['suggestion']}")
+        # Utiliser la requête reformulée
+        expanded_query = understanding['reformulated_query']
+    else:
+        # Enrichir la question avec des mots-clés et synonymes
+        expanded_query = message
+        
+        # Ajouter des mots-clés selon le contexte
+        query_lower = message.lower()
+        
+        # Problèmes digestifs (estomac, gaz, ballonnement, digestion...)
+        if any(word in query_lower for word in ['maux', 'mal', 'douleur', 'soigner', 'traiter', 'estomac', 'ventre', 'gaz', 'ballonnement', 'digestion', 'intestin', 'gastrique']):
+            # Ajouter des termes médicaux locaux + synonymes
+            expanded_query += " plantes médicinales traditionnelles Burkina traitement naturel remède estomac ventre digestion gastrique"
+        
+        # Fabrication savon
+        elif any(word in query_lower for word in ['savon', 'fabriquer', 'saponification', 'lessive']):
+            expanded_query += " fabrication artisanale transformation saponification recette savon"
+        
+        # Karité et PFNL
+        elif any(word in query_lower for word in ['karité', 'beurre', 'noix', 'pfnl']):
+            expanded_query += " transformation PFNL beurre karité production artisanale"
+        
+        # Maladies et symptômes généraux
+        elif any(word in query_lower for word in ['fièvre', 'toux', 'rhume', 'paludisme', 'malade']):
+            expanded_query += " plantes médicinales santé traitement naturel Burkina remède"
     
-    DIFFÉRENCE avec /chat/guest:
-    - /chat/guest = RAG pur (copier-coller)
-    - /chat/intelligent = RAG + LLM (dialogue intelligent)
-    """
+    logger.info(f"🔍 Question enrichie: '{expanded_query}'")
+    return expanded_query
+
+
+def _detect_intent(message: str, language: str) -> str:
+    """Intention du message (question par défaut si la détection échoue)"""
     try:
-        # 1️⃣ NORMALISATION ET CORRECTION AUTOMATIQUE
-        original_message = req.message
-        normalized_message = text_normalizer.normalize(req.message)
-        
-        # Utiliser le message normalisé pour le traitement
-        req.message = normalized_message
-        
-        # Log si correction effectuée
-        if normalized_message != original_message:
-            logger.info(f"✏️ Message corrigé: '{original_message}' → '{normalized_message}'")
-        
-        # 2️⃣ Session management
-        session_id = req.session_id or str(uuid4())
-        
-        # 3️⃣ Langue: prioriser le choix utilisateur (pas d'auto-détection)
-        detected_language = (req.language or "").strip() or "fr"
-        
-        try:
-            intent = conversation_service.detect_intent(req.message, detected_language)
-        except:
-            intent = "question"
-        
-        # 4️⃣ DÉTECTER DÉCLARATIONS DE LANGUE (je parle français/moore/dioula)
-        message_lower = req.message.lower()
-        language_declaration_keywords = [
-            "je parle français", "je parle francais", "je parque français",
-            "je parle moore", "je parle mooré", "je parle moré",
-            "je parle dioula", "je parle dyula",
-            "en français", "en francais", "parle français"
-        ]
-        
-        if any(keyword in message_lower for keyword in language_declaration_keywords):
-            language_response = (
-                "D'accord. Je te réponds en français.\n\n"
-                "Pose-moi ta question (ex: plantes médicinales, karité/PFNL, savon, métiers, civisme, maths pratiques)."
-            )
-            
-            ai_brain.add_to_history("user", req.message)
-            ai_brain.add_to_history("assistant", language_response)
-            
-            return {
-                "session_id": session_id,
-                "response": language_response,
-                "language": "fr",
-                "intent": "language_declaration",
-                "mode": "language_preference",
-                "timestamp": datetime.utcnow().isoformat()
-            }
+        return conversation_service.detect_intent(message, language)
+    except Exception:
+        return "question"
+
+
+async def _retrieve(timer: _StageTimer, query: str, language: str, category: str):
+    """Embedding + FAISS dans le pool dédié au RAG"""
+    with timer.stage("retrieval"):
+        return await rag.ask_async(
+            query,
+            k=10,
+            language=language,
+            category=category,
+            min_confidence=0.15
+        )
+
+
+async def _prepare_intelligent_turn(req: ChatRequest, timer: _StageTimer) -> dict:
+    """
+    Étapes communes à /chat/intelligent et à sa version streaming (normalisation,
+    intentions, RAG). Retourne soit une réponse directe sans LLM (salutation, exemples...),
+    soit le tour à générer : {"session_id", "language", "intent", "rag_results"}.
+    
+    Normalisation et intention tournent dans le pool rag. La recherche RAG démarre
+    dès la normalisation, en même temps que la détection d'intention, et continue
+    pendant que les réponses directes (langue, exemples, présentation) sont vérifiées ;
+    son résultat est abandonné si le tour se termine sans elle.
+    """
+    # 1️⃣ NORMALISATION ET CORRECTION AUTOMATIQUE
+    original_message = req.message
+    with timer.stage("normalize"):
+        normalized_message = await run_in_executor("rag", text_normalizer.normalize, req.message)
+    
+    # Utiliser le message normalisé pour le traitement
+    req.message = normalized_message
+    
+    # Log si correction effectuée
+    if normalized_message != original_message:
+        logger.info(f"✏️ Message corrigé: '{original_message}' → '{normalized_message}'")
+    
+    # 2️⃣ Session management
+    session_id = req.session_id or str(uuid4())
+    
+    # 3️⃣ Langue: prioriser le choix utilisateur (pas d'auto-détection)
+    detected_language = (req.language or "").strip() or "fr"
+    
+    # 🔀 Recherche RAG lancée en parallèle de la détection d'intention et des vérifications
+    # suivantes (abandonnée pour les salutations / remerciements et les réponses directes)
+    retrieval = asyncio.ensure_future(
+        _retrieve(timer, _expand_query(req.message), detected_language, req.category)
+    )
+    
+    with timer.stage("intent"):
+        intent = await run_in_executor("rag", _detect_intent, req.message, detected_language)
+    
+    def cancel_retrieval():
+        # Réponse directe : le résultat de la recherche ne sert pas
+        # (déjà terminée : consommer une éventuelle erreur pour ne pas la journaliser)
+        if not retrieval.cancel():
+            retrieval.exception()
+    
+    # 4️⃣ DÉTECTER DÉCLARATIONS DE LANGUE (je parle français/moore/dioula)
+    message_lower = req.message.lower()
+    language_declaration_keywords = [
+        "je parle français", "je parle francais", "je parque français",
+        "je parle moore", "je parle mooré", "je parle moré",
+        "je parle dioula", "je parle dyula",
+        "en français", "en francais", "parle français"
+    ]
+    
+    if any(keyword in message_lower for keyword in language_declaration_keywords):
+        language_response = (
+            "D'accord. Je te réponds en français.\n\n"
+            "Pose-moi ta question (ex: plantes médicinales, karité/PFNL, savon, métiers, civisme, maths pratiques)."
+        )
         
-        # 5️⃣ DÉTECTER DEMANDES D'EXEMPLES (montre-moi, donne exemple, je choisis)
-        example_keywords = [
-            "montre", "montre moi", "montre-moi", "exemple", "exemples",
-            "donne exemple", "donne-moi exemple", "cite", "liste",
-            "je choisis", "j'ai choisi", "je veux", "je voudrais",
-            "parle moi de", "parle-moi de", "dis moi", "dis-moi"
-        ]
+        cancel_retrieval()
+        ai_brain.add_to_history("user", req.message, session_id)
+        ai_brain.add_to_history("assistant", language_response, session_id)
         
-        # Détecter le domaine mentionné
-        domain_keywords = {
-            "plantes": "Plantes Medicinales",
-            "plante": "Plantes Medicinales",
-            "médicinale": "Plantes Medicinales",
-            "medicinale": "Plantes Medicinales",
-            "remède": "Plantes Medicinales",
-            "remede": "Plantes Medicinales",
-            "santé": "Plantes Medicinales",
-            "sante": "Plantes Medicinales",
-            "maladie": "Plantes Medicinales",
-            
-            "agriculture": "Agriculture Locale",
-            "cultiver": "Agriculture Locale",
-            "culture": "Agriculture Locale",
-            "mil": "Agriculture Locale",
-            "sorgho": "Agriculture Locale",
-            
-            "savon": "Science Pratique - Saponification",
-            "saponification": "Science Pratique - Saponification",
-            
-            "métier": "Metiers Informels",
-            "metier": "Metiers Informels",
-            "business": "Metiers Informels",
+        return {
+            "session_id": session_id,
+            "response": language_response,
+            "language": "fr",
+            "intent": "language_declaration",
+            "mode": "language_preference",
+            "timestamp": datetime.utcnow().isoformat()
         }
-        
-        is_asking_example = any(keyword in message_lower for keyword in example_keywords)
-        detected_domain = None
-        
-        for keyword, domain in domain_keywords.items():
-            if keyword in message_lower:
-                detected_domain = domain
-                break
-        
-        # Si pas de domaine détecté mais demande d'exemple, utiliser la catégorie fournie
-        if is_asking_example and not detected_domain:
-            if req.category and req.category != "general":
-                detected_domain = req.category
-        
-        # Si demande d'exemples + domaine détecté → Donner des exemples concrets
-        if is_asking_example and detected_domain:
-            # Exemples pré-définis par domaine
-            domain_examples = {
-                "Plantes Medicinales": (
-                    "🌿 **Voici des plantes médicinales burkinabè que je connais:**\n\n"
-                    "1. **Moringa** 🌱 - Combat la fatigue et l'anémie\n"
-                    "   → Consommer 1 cuillère à soupe de poudre par jour\n\n"
-                    "2. **Karité** 🥜 - Soins de la peau et cheveux\n"
-                    "   → Beurre naturel pour hydrater et protéger\n\n"
-                    "3. **Baobab** 🌳 - Riche en vitamine C\n"
-                    "   → Poudre de fruit pour renforcer l'immunité\n\n"
-                    "4. **Néré** 🌰 - Soumbala pour l'assaisonnement\n"
-                    "   → Aide la digestion et riche en protéines\n\n"
-                    "**Pose-moi une question précise sur une plante !**\n"
-                    "Exemple: \"Comment utiliser le moringa contre la fatigue ?\""
-                ),
-                "Agriculture Locale": (
-                    "🌾 **Voici des cultures importantes au Burkina Faso:**\n\n"
-                    "1. **Mil** - Culture vivrière de base\n"
-                    "   → Planter en début de saison des pluies\n\n"
-                    "2. **Sorgho** - Résistant à la sécheresse\n"
-                    "   → Bon pour le tô et le dolo\n\n"
-                    "3. **Maïs** - Culture commerciale\n"
-                    "   → Demande plus d'eau\n\n"
-                    "4. **Niébé (haricot)** - Protéines végétales\n"
-                    "   → Enrichit le sol en azote\n\n"
-                    "**Pose une question précise !**\n"
-                    "Exemple: \"Quelle est la meilleure période pour cultiver le mil ?\""
-                ),
-                "Science Pratique - Saponification": (
-                    "🧴 **Je peux t'aider avec la fabrication de savon:**\n\n"
-                    "- Savon à base de karité\n"
-                    "- Savon noir traditionnel\n"
-                    "- Saponification à froid\n"
-                    "- Dosage de la soude caustique\n\n"
-                    "**Pose une question !**\n"
-                    "Exemple: \"Comment faire du savon au karité ?\""
-                ),
-                "Metiers Informels": (
-                    "💼 **Voici des métiers informels au Burkina:**\n\n"
-                    "- Transformation de produits locaux\n"
-                    "- Petit commerce\n"
-                    "- Artisanat\n"
-                    "- Services à domicile\n\n"
-                    "**Dis-moi ce qui t'intéresse !**"
-                )
-            }
-            
-            example_response = domain_examples.get(
-                detected_domain,
-                f"Je peux t'aider avec {detected_domain}. Pose-moi une question précise !"
-            )
-            
-            ai_brain.add_to_history("user", req.message)
-            ai_brain.add_to_history("assistant", example_response)
-            
-            return {
-                "session_id": session_id,
-                "response": example_response,
-                "language": detected_language,
-                "intent": "request_examples",
-                "mode": "examples_provided",
-                "category": detected_domain,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        
-        # 6️⃣ DÉTECTER QUESTIONS DE PRÉSENTATION (qui/nom/appelles)
-        presentation_keywords = [
-            "comment tu t'appel", "comment t'appel", "tu t'appel", 
-            "c'est quoi ton nom", "quel est ton nom", "ton nom",
-            "qui es tu", "qui es-tu", "tu es qui", "t'es qui",
-            "comment tu", "qui tu es"
-        ]
-        
-        if any(keyword in message_lower for keyword in presentation_keywords):
-            presentation_response = (
-                "Je m'appelle YINGR-AI ! 🇧🇫\n\n"
-                "Je suis l'Intelligence Artificielle locale et souveraine du Burkina Faso. "
-                "Mon rôle est de t'aider avec des connaissances pratiques sur:\n"
-                "• Les plantes médicinales 🌿\n"
-                "• L'agriculture locale 🌾\n"
-                "• La transformation de produits 🧴\n"
-                "• Les métiers informels 💼\n"
-                "• Le civisme et le développement personnel 📚\n\n"
-                "Comment puis-je t'aider aujourd'hui ?"
+    
+    # 5️⃣ DÉTECTER DEMANDES D'EXEMPLES (montre-moi, donne exemple, je choisis)
+    example_keywords = [
+        "montre", "montre moi", "montre-moi", "exemple", "exemples",
+        "donne exemple", "donne-moi exemple", "cite", "liste",
+        "je choisis", "j'ai choisi", "je veux", "je voudrais",
+        "parle moi de", "parle-moi de", "dis moi", "dis-moi"
+    ]
+    
+    # Détecter le domaine mentionné
+    domain_keywords = {
+        "plantes": "Plantes Medicinales",
+        "plante": "Plantes Medicinales",
+        "médicinale": "Plantes Medicinales",
+        "medicinale": "Plantes Medicinales",
+        "remède": "Plantes Medicinales",
+        "remede": "Plantes Medicinales",
+        "santé": "Plantes Medicinales",
+        "sante": "Plantes Medicinales",
+        "maladie": "Plantes Medicinales",
+        
+        "agriculture": "Agriculture Locale",
+        "cultiver": "Agriculture Locale",
+        "culture": "Agriculture Locale",
+        "mil": "Agriculture Locale",
+        "sorgho": "Agriculture Locale",
+        
+        "savon": "Science Pratique - Saponification",
+        "saponification": "Science Pratique - Saponification",
+        
+        "métier": "Metiers Informels",
+        "metier": "Metiers Informels",
+        "business": "Metiers Informels",
+    }
+    
+    is_asking_example = any(keyword in message_lower for keyword in example_keywords)
+    detected_domain = None
+    
+    for keyword, domain in domain_keywords.items():
+        if keyword in message_lower:
+            detected_domain = domain
+            break
+    
+    # Si pas de domaine détecté mais demande d'exemple, utiliser la catégorie fournie
+    if is_asking_example and not detected_domain:
+        if req.category and req.category != "general":
+            detected_domain = req.category
+    
+    # Si demande d'exemples + domaine détecté → Donner des exemples concrets
+    if is_asking_example and detected_domain:
+        # Exemples pré-définis par domaine
+        domain_examples = {
+            "Plantes Medicinales": (
+                "🌿 **Voici des plantes médicinales burkinabè que je connais:**\n\n"
+                "1. **Moringa** 🌱 - Combat la fatigue et l'anémie\n"
+                "   → Consommer 1 cuillère à soupe de poudre par jour\n\n"
+                "2. **Karité** 🥜 - Soins de la peau et cheveux\n"
+                "   → Beurre naturel pour hydrater et protéger\n\n"
+                "3. **Baobab** 🌳 - Riche en vitamine C\n"
+                "   → Poudre de fruit pour renforcer l'immunité\n\n"
+                "4. **Néré** 🌰 - Soumbala pour l'assaisonnement\n"
+                "   → Aide la digestion et riche en protéines\n\n"
+                "**Pose-moi une question précise sur une plante !**\n"
+                "Exemple: \"Comment utiliser le moringa contre la fatigue ?\""
+            ),
+            "Agriculture Locale": (
+                "🌾 **Voici des cultures importantes au Burkina Faso:**\n\n"
+                "1. **Mil** - Culture vivrière de base\n"
+                "   → Planter en début de saison des pluies\n\n"
+                "2. **Sorgho** - Résistant à la sécheresse\n"
+                "   → Bon pour le tô et le dolo\n\n"
+                "3. **Maïs** - Culture commerciale\n"
+                "   → Demande plus d'eau\n\n"
+                "4. **Niébé (haricot)** - Protéines végétales\n"
+                "   → Enrichit le sol en azote\n\n"
+                "**Pose une question précise !**\n"
+                "Exemple: \"Quelle est la meilleure période pour cultiver le mil ?\""
+            ),
+            "Science Pratique - Saponification": (
+                "🧴 **Je peux t'aider avec la fabrication de savon:**\n\n"
+                "- Savon à base de karité\n"
+                "- Savon noir traditionnel\n"
+                "- Saponification à froid\n"
+                "- Dosage de la soude caustique\n\n"
+                "**Pose une question !**\n"
+                "Exemple: \"Comment faire du savon au karité ?\""
+            ),
+            "Metiers Informels": (
+                "💼 **Voici des métiers informels au Burkina:**\n\n"
+                "- Transformation de produits locaux\n"
+                "- Petit commerce\n"
+                "- Artisanat\n"
+                "- Services à domicile\n\n"
+                "**Dis-moi ce qui t'intéresse !**"
             )
-            
-            ai_brain.add_to_history("user", req.message)
-            ai_brain.add_to_history("assistant", presentation_response)
-            
-            return {
-                "session_id": session_id,
-                "response": presentation_response,
-                "language": detected_language,
-                "intent": "presentation",
-                "mode": "intelligent_presentation",
-                "timestamp": datetime.utcnow().isoformat()
-            }
+        }
         
-        # 7️⃣ Gérer salutations (SANS LLM pour réponses plus rapides et consistantes)
-        if intent == "greeting":
-            greeting_responses_fr = [
-                "Bonjour ! Je suis YINGR-AI, ton assistant burkinabè. 🇧🇫\n\nComment puis-je t'aider aujourd'hui ?",
-                "Salut ! Content de te parler. 😊\n\nQue veux-tu savoir ?",
-                "Bienvenue ! Je suis là pour t'aider. 👋\n\nPose-moi tes questions sur l'agriculture, la santé, les métiers..."
-            ]
-            
-            import random
-            greeting_response = random.choice(greeting_responses_fr)
-            
-            ai_brain.add_to_history("user", req.message)
-            ai_brain.add_to_history("assistant", greeting_response)
-            
-            return {
-                "session_id": session_id,
-                "response": greeting_response,
-                "language": detected_language,
-                "intent": intent,
-                "mode": "intelligent_greeting",
-                "timestamp": datetime.utcnow().isoformat()
-            }
+        example_response = domain_examples.get(
+            detected_domain,
+            f"Je peux t'aider avec {detected_domain}. Pose-moi une question précise !"
+        )
         
-        # 8️⃣ Gérer remerciements (SANS LLM pour réponses plus rapides)
-        if intent == "thanks":
-            thanks_responses_fr = [
-                "Je t'en prie ! 😊 N'hésite pas si tu as d'autres questions.",
-                "Avec plaisir ! Je suis là pour t'aider. 🙌",
-                "Pas de souci ! Reviens quand tu veux. 👍"
-            ]
-            
-            import random
-            thanks_response = random.choice(thanks_responses_fr)
-            
-            ai_brain.add_to_history("user", req.message)
-            ai_brain.add_to_history("assistant", thanks_response)
-            
-            return {
-                "session_id": session_id,
-                "response": thanks_response,
-                "language": detected_language,
-                "intent": intent,
-                "mode": "intelligent_thanks",
-                "timestamp": datetime.utcnow().isoformat()
-            }
+        cancel_retrieval()
+        ai_brain.add_to_history("user", req.message, session_id)
+        ai_brain.add_to_history("assistant", example_response, session_id)
         
-        # 9️⃣ COMPRENDRE L'INTENTION de la question
-        logger.info(f"🧠 Question originale: '{req.message}'")
-        
-        # Essayer de comprendre la question (surtout pour santé)
-        understanding = QueryUnderstanding.understand_health_query(req.message)
-        if understanding:
-            logger.info(f"💡 Compréhension: {understanding['suggestion']}")
-            # Utiliser la requête reformulée
-            expanded_query = understanding['reformulated_query']
-        else:
-            # Enrichir la question avec des mots-clés et synonymes
-            expanded_query = req.message
-            
-            # Ajouter des mots-clés selon le contexte
-            query_lower = req.message.lower()
-            
-            # Problèmes digestifs (estomac, gaz, ballonnement, digestion...)
-            if any(word in query_lower for word in ['maux', 'mal', 'douleur', 'soigner', 'traiter', 'estomac', 'ventre', 'gaz', 'ballonnement', 'digestion', 'intestin', 'gastrique']):
-                # Ajouter des termes médicaux locaux + synonymes
-                expanded_query += " plantes médicinales traditionnelles Burkina traitement naturel remède estomac ventre digestion gastrique"
-            
-            # Fabrication savon
-            elif any(word in query_lower for word in ['savon', 'fabriquer', 'saponification', 'lessive']):
-                expanded_query += " fabrication artisanale transformation saponification recette savon"
-            
-            # Karité et PFNL
-            elif any(word in query_lower for word in ['karité', 'beurre', 'noix', 'pfnl']):
-                expanded_query += " transformation PFNL beurre karité production artisanale"
-            
-            # Maladies et symptômes généraux
-            elif any(word in query_lower for word in ['fièvre', 'toux', 'rhume', 'paludisme', 'malade']):
-                expanded_query += " plantes médicinales santé traitement naturel Burkina remède"
-        
-        logger.info(f"🔍 Question enrichie: '{expanded_query}'")
-        
-        # Interroger le RAG avec la requête enrichie
-        answer_raw, context_raw = rag.ask(
-            query=expanded_query,  # ← Utiliser la requête ENRICHIE
-            k=10,
-            language=detected_language,
-            category=req.category,
-            min_confidence=0.15
+        return {
+            "session_id": session_id,
+            "response": example_response,
+            "language": detected_language,
+            "intent": "request_examples",
+            "mode": "examples_provided",
+            "category": detected_domain,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    
+    # 6️⃣ DÉTECTER QUESTIONS DE PRÉSENTATION (qui/nom/appelles)
+    presentation_keywords = [
+        "comment tu t'appel", "comment t'appel", "tu t'appel", 
+        "c'est quoi ton nom", "quel est ton nom", "ton nom",
+        "qui es tu", "qui es-tu", "tu es qui", "t'es qui",
+        "comment tu", "qui tu es"
+    ]
+    
+    if any(keyword in message_lower for keyword in presentation_keywords):
+        presentation_response = (
+            "Je m'appelle YINGR-AI ! 🇧🇫\n\n"
+            "Je suis l'Intelligence Artificielle locale et souveraine du Burkina Faso. "
+            "Mon rôle est de t'aider avec des connaissances pratiques sur:\n"
+            "• Les plantes médicinales 🌿\n"
+            "• L'agriculture locale 🌾\n"
+            "• La transformation de produits 🧴\n"
+            "• Les métiers informels 💼\n"
+            "• Le civisme et le développement personnel 📚\n\n"
+            "Comment puis-je t'aider aujourd'hui ?"
         )
         
-        logger.info(f"📊 RAG résultats: answer_raw length={len(answer_raw) if answer_raw else 0}, context_raw length={len(context_raw) if context_raw else 0}")
-        if isinstance(context_raw, str):
-            logger.info(f"📄 Contexte brut (100 premiers chars): {context_raw[:100] if context_raw else 'VIDE'}")
-        else:
-            logger.info(f"📄 Contexte brut (type={type(context_raw)}): {str(context_raw)[:100] if context_raw else 'VIDE'}")
+        cancel_retrieval()
+        ai_brain.add_to_history("user", req.message, session_id)
+        ai_brain.add_to_history("assistant", presentation_response, session_id)
         
-        # 9️⃣ Transformer le contexte en format adapté pour AI Brain
-        # RAGService.ask() renvoie un contexte texte avec séparateur "\n\n---\n\n".
-        # Ce contexte est souvent "answers-only" (sans questions), donc on construit
-        # des pseudo-sources Q/R en réutilisant la question utilisateur.
-        rag_results = []
-        for block in _rag_context_to_blocks(context_raw)[:3]:
-            rag_results.append({
-                "question": req.message,
-                "reponse": block
-            })
+        return {
+            "session_id": session_id,
+            "response": presentation_response,
+            "language": detected_language,
+            "intent": "presentation",
+            "mode": "intelligent_presentation",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    
+    # 7️⃣ Gérer salutations (SANS LLM pour réponses plus rapides et consistantes)
+    if intent == "greeting":
+        greeting_responses_fr = [
+            "Bonjour ! Je suis YINGR-AI, ton assistant burkinabè. 🇧🇫\n\nComment puis-je t'aider aujourd'hui ?",
+            "Salut ! Content de te parler. 😊\n\nQue veux-tu savoir ?",
+            "Bienvenue ! Je suis là pour t'aider. 👋\n\nPose-moi tes questions sur l'agriculture, la santé, les métiers..."
+        ]
         
-        logger.info(f"📚 {len(rag_results)} documents structurés pour le LLM")
+        import random
+        greeting_response = random.choice(greeting_responses_fr)
         
-        # 🔟 🎯 GÉNÉRATION INTELLIGENTE avec AI Brain
-        intelligent_response = ai_brain.generate_intelligent_response(
-            question=req.message,
-            rag_results=rag_results,
-            category=req.category,
-            language=detected_language
-        )
+        cancel_retrieval()
+        ai_brain.add_to_history("user", req.message, session_id)
+        ai_brain.add_to_history("assistant", greeting_response, session_id)
         
-        # 1️⃣1️⃣ 🔊 GÉNÉRATION AUDIO (uniquement pour mooré et dioula)
-        audio_url = None
-        audio_mode = "not_available"
+        return {
+            "session_id": session_id,
+            "response": greeting_response,
+            "language": detected_language,
+            "intent": intent,
+            "mode": "intelligent_greeting",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    
+    # 8️⃣ Gérer remerciements (SANS LLM pour réponses plus rapides)
+    if intent == "thanks":
+        thanks_responses_fr = [
+            "Je t'en prie ! 😊 N'hésite pas si tu as d'autres questions.",
+            "Avec plaisir ! Je suis là pour t'aider. 🙌",
+            "Pas de souci ! Reviens quand tu veux. 👍"
+        ]
         
-        if detected_language in ["mo", "di"]:  # Mooré ou Dioula
-            try:
-                response_text = intelligent_response["reponse"]
-                audio_url, audio_mode = tts_service.generate_audio(
-                    text=response_text,
-                    language=detected_language
-                )
-                logger.info(f"🔊 Audio généré: {audio_url} (mode: {audio_mode})")
-            except Exception as e:
-                logger.warning(f"⚠️ Audio non disponible: {e}")
-                audio_url = None
-                audio_mode = "not_available"
+        import random
+        thanks_response = random.choice(thanks_responses_fr)
         
-        # 1️⃣2️⃣ Retourner la réponse intelligente avec audio
-        response_text = _fix_mojibake(intelligent_response["reponse"])
-        context_first = _fix_mojibake(rag_results[0]["reponse"]) if rag_results else ""
-
-        payload = {
+        cancel_retrieval()
+        ai_brain.add_to_history("user", req.message, session_id)
+        ai_brain.add_to_history("assistant", thanks_response, session_id)
+        
+        return {
             "session_id": session_id,
-            "response": response_text,
+            "response": thanks_response,
             "language": detected_language,
             "intent": intent,
-            "category": intelligent_response["categorie"],
-            "sources_count": intelligent_response.get("sources_utilisees", 0),
-            "mode": intelligent_response.get("mode", "intelligent"),
-            "context": [context_first] if context_first else [],  # Première source
-            "timestamp": intelligent_response.get("timestamp", datetime.utcnow().isoformat()),
-            "audio_url": audio_url,
-            "audio_mode": audio_mode
+            "mode": "intelligent_thanks",
+            "timestamp": datetime.utcnow().isoformat()
         }
+    
+    answer_raw, context_raw = await retrieval
+    
+    logger.info(f"📊 RAG résultats: answer_raw length={len(answer_raw) if answer_raw else 0}, context_raw length={len(context_raw) if context_raw else 0}")
+    if isinstance(context_raw, str):
+        logger.info(f"📄 Contexte brut (100 premiers chars): {context_raw[:100] if context_raw else 'VIDE'}")
+    else:
+        logger.info(f"📄 Contexte brut (type={type(context_raw)}): {str(context_raw)[:100] if context_raw else 'VIDE'}")
+    
+    # 9️⃣ Transformer le contexte en format adapté pour AI Brain
+    # RAGService.ask() renvoie un contexte texte avec séparateur "\n\n---\n\n".
+    # Ce contexte est souvent "answers-only" (sans questions), donc on construit
+    # des pseudo-sources Q/R en réutilisant la question utilisateur.
+    # AI Brain garde ensuite ce qui tient dans le budget de contexte du LLM.
+    rag_results = []
+    for block in _rag_context_to_blocks(context_raw)[:ai_brain.context_packer.max_passages]:
+        rag_results.append({
+            "question": req.message,
+            "reponse": block
+        })
+    
+    logger.info(f"📚 {len(rag_results)} documents structurés pour le LLM")
+
+    return {
+        "session_id": session_id,
+        "language": detected_language,
+        "intent": intent,
+        "rag_results": rag_results
+    }
+
+
+async def _intelligent_payload(turn: dict, intelligent_response: dict, timer: _StageTimer) -> dict:
+    """Réponse finale de /chat/intelligent : audio (mooré/dioula) + métadonnées"""
+    detected_language = turn["language"]
+    rag_results = turn["rag_results"]
+
+    # 1️⃣1️⃣ 🔊 GÉNÉRATION AUDIO (uniquement pour mooré et dioula)
+    audio_url = None
+    audio_mode = "not_available"
+    
+    if detected_language in ["mo", "di"]:  # Mooré ou Dioula
+        try:
+            response_text = intelligent_response["reponse"]
+            with timer.stage("tts"):
+                audio_url, audio_mode = await run_in_executor(
+                    "tts",
+                    tts_service.generate_audio,
+                    text=response_text,
+                    language=detected_language
+                )
+            logger.info(f"🔊 Audio généré: {audio_url} (mode: {audio_mode})")
+        except Exception as e:
+            logger.warning(f"⚠️ Audio non disponible: {e}")
+            audio_url = None
+            audio_mode = "not_available"
+    
+    # 1️⃣2️⃣ Retourner la réponse intelligente avec audio
+    response_text = _fix_mojibake(intelligent_response["reponse"])
+    context_first = _fix_mojibake(rag_results[0]["reponse"]) if rag_results else ""
+
+    return {
+        "session_id": turn["session_id"],
+        "response": response_text,
+        "language": detected_language,
+        "intent": turn["intent"],
+        "category": intelligent_response["categorie"],
+        "sources_count": intelligent_response.get("sources_utilisees", 0),
+        "mode": intelligent_response.get("mode", "intelligent"),
+        "context": [context_first] if context_first else [],  # Première source
+        "timestamp": intelligent_response.get("timestamp", datetime.utcnow().isoformat()),
+        "audio_url": audio_url,
+        "audio_mode": audio_mode,
+        "timings": timer.finish()
+    }
+
+
+
+@router.post("/chat/intelligent")
+async def chat_intelligent(req: ChatRequest):
+    """
+    🧠 NOUVEAU: Endpoint avec IA VRAIMENT INTELLIGENTE
+    
+    Utilise Ollama (LLaMA 2 local) pour:
+    - Analyser la question dans le contexte
+    - Reformuler naturellement les réponses RAG
+    - Maintenir un dialogue cohérent
+    - Adapter au contexte burkinabè
+    
+    DIFFÉRENCE avec /chat/guest:
+    - /chat/guest = RAG pur (copier-coller)
+    - /chat/intelligent = RAG + LLM (dialogue intelligent)
+    """
+    try:
+        timer = _StageTimer()
+        turn = await _prepare_intelligent_turn(req, timer)
+        if "rag_results" not in turn:
+            return turn  # Réponse directe (salutation, exemples...), pas d'appel LLM
+        
+        # 🔟 🎯 GÉNÉRATION INTELLIGENTE avec AI Brain (appel Ollama non bloquant)
+        with timer.stage("llm"):
+            intelligent_response = await ai_brain.generate_intelligent_response_async(
+                question=req.message,
+                rag_results=turn["rag_results"],
+                category=req.category,
+                language=turn["language"],
+                session_id=turn["session_id"]
+            )
+        payload = await _intelligent_payload(turn, intelligent_response, timer)
+        ai_brain.record_stage_timings(payload["timings"])
 
         # Certains clients (ex: PowerShell Invoke-WebRequest) affichent des accents cassés
         # si le charset n'est pas précisé. On force UTF-8 pour un rendu correct.
@@ -712,11 +811,94 @@ def chat_intelligent(req: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Erreur service AI intelligent: {str(e)}")
 
 
+def _sse(event: str, data: dict) -> str:
+    """Formate un évènement Server-Sent Events (données JSON UTF-8)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/intelligent/stream")
+async def chat_intelligent_stream(req: ChatRequest):
+    """
+    ⚡ Version streaming de /chat/intelligent (Server-Sent Events)
+    
+    Évènements envoyés :
+    - meta  : session, langue, intention (dès que le RAG a répondu)
+    - token : {"delta": "..."} au fil de la génération Ollama
+    - done  : réponse complète + métadonnées (même contenu que /chat/intelligent)
+              et timings (durée de chaque étape, "ttft_ms", "total_ms"). Le texte de "done" fait foi.
+    - error : {"detail": "..."} en cas d'erreur
+    
+    L'historique et le cache ne sont écrits qu'à la fin de la génération.
+    """
+    started = time.perf_counter()
+    timer = _StageTimer()
+    try:
+        turn = await _prepare_intelligent_turn(req, timer)
+    except Exception as e:
+        logger.error(f"❌ Erreur chat intelligent (stream): {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur service AI intelligent: {str(e)}")
+
+    async def events():
+        try:
+            if "rag_results" not in turn:
+                # Réponse directe (salutation, exemples...), pas d'appel LLM
+                yield _sse("done", turn)
+                return
+
+            yield _sse("meta", {
+                "session_id": turn["session_id"],
+                "language": turn["language"],
+                "intent": turn["intent"],
+                "sources_count": len(turn["rag_results"])
+            })
+
+            first_token_at = None
+            llm_started = time.perf_counter()
+            async for kind, data in ai_brain.generate_response_stream(
+                question=req.message,
+                rag_results=turn["rag_results"],
+                language=turn["language"],
+                category=req.category,
+                session_id=turn["session_id"]
+            ):
+                if kind == "token":
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        logger.info(f"⚡ Premier token après {(first_token_at - started) * 1000:.0f} ms")
+                    yield _sse("token", {"delta": data})
+                    continue
+
+                timer.timings["llm"] = round((time.perf_counter() - llm_started) * 1000, 1)
+                payload = await _intelligent_payload(turn, data, timer)
+                ai_brain.record_stage_timings(payload["timings"])
+                total_ms = (time.perf_counter() - started) * 1000
+                ttft_ms = ((first_token_at or time.perf_counter()) - started) * 1000
+                ai_brain.record_latency(ttft_ms, total_ms)
+                payload["timings"].update({"ttft_ms": round(ttft_ms, 1), "total_ms": round(total_ms, 1)})
+                yield _sse("done", payload)
+        except Exception as e:
+            logger.error(f"❌ Erreur streaming chat intelligent: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream; charset=utf-8",
+        # Pas de mise en tampon par les proxys (nginx, Render) pour que les tokens arrivent au fil de l'eau
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    """Statistiques des caches (réponses LLM + embeddings de requête)"""
+    return ai_brain.get_cache_stats()
+
+
 @router.post("/chat/clear-history")
-def clear_chat_history():
-    """Efface l'historique conversationnel (pour tests)"""
+def clear_chat_history(session_id: Optional[str] = None):
+    """Efface l'historique conversationnel d'une session (ou l'historique local, pour tests)"""
     try:
-        ai_brain.clear_history()
+        ai_brain.clear_history(session_id)
         return {"status": "ok", "message": "Historique effacé"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -768,7 +950,9 @@ async def chat_voice(
         
         try:
             # Utiliser la langue choisie par l'utilisateur au lieu de l'auto-détection
-            transcription, detected_language, confidence = stt_service.transcribe_audio_bytes(
+            transcription, detected_language, confidence = await run_in_executor(
+                "stt",
+                stt_service.transcribe_audio_bytes,
                 audio_bytes=audio_bytes,
                 filename=audio.filename,
                 language=language  # Utiliser la langue choisie
@@ -819,20 +1003,22 @@ async def chat_voice(
             session_id = f"voice_{uuid4().hex[:8]}"
         
         # Normaliser le texte (correction typos)
-        normalized_message = text_normalizer.normalize(transcription)
+        normalized_message = await run_in_executor("rag", text_normalizer.normalize, transcription)
         logger.info(f"📝 Message normalisé: '{normalized_message}'")
         
         # Utiliser la langue choisie par l'utilisateur (pas d'auto-détection)
         detected_lang = language
-        intent = conversation_service.detect_intent(normalized_message, detected_lang)
         
-        # Interroger RAG
-        answer_raw, context_raw = rag.ask(
-            query=normalized_message,
-            k=3,
-            language=detected_lang,
-            category=category,
-            min_confidence=0.35
+        # Intention et recherche RAG en parallèle
+        intent, (answer_raw, context_raw) = await asyncio.gather(
+            run_in_executor("rag", _detect_intent, normalized_message, detected_lang),
+            rag.ask_async(
+                normalized_message,
+                k=3,
+                language=detected_lang,
+                category=category,
+                min_confidence=0.35
+            )
         )
         
         # Transformer contexte RAG
@@ -844,11 +1030,12 @@ async def chat_voice(
             })
         
         # Génération intelligente avec AI Brain
-        intelligent_response = ai_brain.generate_intelligent_response(
+        intelligent_response = await ai_brain.generate_intelligent_response_async(
             question=normalized_message,
             rag_results=rag_results,
             category=category,
-            language=detected_lang
+            language=detected_lang,
+            session_id=session_id
         )
         
         # 6️⃣ Génération audio de la réponse (TTS)
@@ -858,7 +1045,9 @@ async def chat_voice(
         if detected_lang in ["mo", "di"]:
             try:
                 response_text = intelligent_response["reponse"]
-                audio_url, audio_mode = tts_service.generate_audio(
+                audio_url, audio_mode = await run_in_executor(
+                    "tts",
+                    tts_service.generate_audio,
                     text=response_text,
                     language=detected_lang
                 )
@@ -11,7 +11,7 @@ import uuid
 import shutil
 import os
 
-from ..service.rag import RAGService
+from ..service.rag import get_rag_service
 try:
     from mongodb import db  # type: ignore
 except ImportError:
@@ -24,8 +24,8 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-logger.info("[YINGRE AI] Initialisation du RAGService pour l'ingest...")
-rag = RAGService()
+# Même instance que /ai/chat et main.py : les documents ingérés sont visibles immédiatement
+rag = get_rag_service()
 logger.info("[YINGRE AI] RAGService prêt pour l'ingest.")
 
 security_scheme = HTTPBearer()
@@ -49,9 +49,11 @@ class IngestRequest(BaseModel):
 @router.post("/ingest")
 def ingest_text(req: IngestRequest, user=Depends(require_expert)):
     try:
-        # Ajouter chaque texte dans RAG + MongoDB documents
+        # Ajouter tous les textes dans RAG en un seul lot
+        rag_report = rag.ingest_many([{"text": t, "source": req.source} for t in req.texts])
+
+        # Puis chaque texte dans MongoDB documents
         for t in req.texts:
-            rag.ingest([t], req.source)  # RAG
             db.add_document({
                 "content": t,
                 "source": req.source,
@@ -59,7 +61,14 @@ def ingest_text(req: IngestRequest, user=Depends(require_expert)):
                 "uploaded_at": datetime.utcnow(),
                 "type": "text"
             })
-        return {"status": "ok", "ingested_count": len(req.texts)}
+        return {
+            "status": "ok",
+            "ingested_count": len(req.texts),
+            "added": rag_report["added"],
+            "updated": rag_report["updated"],
+            "unchanged": rag_report["unchanged"],
+            "docs_per_second": rag_report["docs_per_second"]
+        }
     except Exception as e:
         logger.error(f"❌ Erreur ingestion texte: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2,20 +2,31 @@
 AI BRAIN – Cerveau conversationnel YINGR-AI 🇧🇫
 
 PRODUCTION READY:
-- Historique conversation persistant dans Redis
-- Cache RAG ultra rapide avec monitoring
-- Limitation longueur RAG + max 3 sources
+- Historique conversation par session (mémoire LRU ou Redis)
+- Cache RAG ultra rapide avec monitoring (exact Redis + sémantique par similarité)
+- Contexte RAG + historique assemblés dans un budget de tokens (context_packer)
 - Multi-langues: fr / mo / di
 - CPU only, fallback robuste
 """
 
 import os
-import requests
 import json
 import hashlib
-from typing import List, Dict, Tuple, Optional
+from collections import deque
+from typing import AsyncIterator, List, Dict, Tuple, Optional
 from datetime import datetime
 
+import numpy as np
+
+from .context_packer import context_packer, estimate_tokens
+from .embedding_cache import query_embedding_cache
+from .embedding_batcher import query_embedding_batcher
+from . import executors
+from .llm_backends import create_llm_backend
+from .semantic_cache import semantic_response_cache
+from .single_flight import single_flight
+from .session_history import session_history_store
+
 try:
     import redis
     REDIS_AVAILABLE = True
@@ -26,11 +37,19 @@ except ImportError:
 class AIBrain:
     def __init__(self, ollama_url: str = "http://localhost:11434"):
         self.ollama_url = os.getenv("OLLAMA_URL", ollama_url)
-        self.model = os.getenv("OLLAMA_MODEL", "llama3.1:8b-instruct-q4_K_M")
+        self.model = os.getenv("LLM_MODEL") or os.getenv("OLLAMA_MODEL", "llama3.1:8b-instruct-q4_K_M")
+        self.generation_options = {
+            "temperature": 0.4, "top_p": 0.85, "repeat_penalty": 1.2,
+            # Fenêtre fixe (la changer par requête forcerait Ollama à recharger le modèle)
+            "num_predict": int(os.getenv("LLM_NUM_PREDICT", "100")),
+            "num_ctx": int(os.getenv("LLM_NUM_CTX", "1024"))
+        }
+        self.context_packer = context_packer
+        # Backend LLM (LLM_BACKEND : Ollama par défaut, pool keep-alive + concurrence bornée)
+        self.llm_backend = create_llm_backend(base_url=self.ollama_url)
         
-        # Conversation history locale
-        self.conversation_history: List[Dict] = []
-        self.max_history = 5
+        # Historique conversationnel par session_id (plus de liste partagée entre utilisateurs)
+        self.history_store = session_history_store
 
         # Cache Redis
         self.cache_ttl = int(os.getenv("CACHE_TTL", "3600"))
@@ -39,6 +58,24 @@ class AIBrain:
         self.cache_misses = 0
         self._init_redis_cache()
 
+        # Cache sémantique : embedding de la question -> réponse (encodeur fourni par le RAG)
+        self.semantic_cache = semantic_response_cache
+        self.embed_question = None
+
+        # Une seule génération Ollama par question identique en cours (worker et, via Redis, entre workers)
+        self.single_flight = single_flight
+
+        # Latences des réponses en streaming (temps jusqu'au premier token, temps total)
+        self.ttft_ms = deque(maxlen=500)
+        self.total_ms = deque(maxlen=500)
+
+        # Durées par étape du pipeline /chat/intelligent (ms)
+        self.stage_ms: Dict[str, deque] = {}
+
+        # Évaluation du prompt par le backend : (tokens du prompt, tokens évalués, tokens en cache, ms)
+        self.prompt_evals = deque(maxlen=500)
+        self.llm_backend.on_metrics = self.record_prompt_metrics
+
     # ------------------- REDIS CACHE -------------------
     def _init_redis_cache(self):
         self.redis_client = None
@@ -50,6 +87,10 @@ class AIBrain:
             self.redis_client = redis.from_url(redis_url, decode_responses=True)
             self.redis_client.ping()
             print("✅ Cache Redis actif")
+            # Partager aussi le cache des embeddings de requête entre workers
+            query_embedding_cache.attach_redis(self.redis_client)
+            self.history_store.attach_redis(self.redis_client)
+            single_flight.attach_redis(self.redis_client)
         except Exception as e:
             print(f"⚠️  Redis indisponible ({e}) - cache désactivé")
             self.redis_client = None
@@ -67,46 +108,75 @@ class AIBrain:
             cached = self.redis_client.get(cache_key)
             if cached:
                 self.cache_hits += 1
-                # Charger historique si présent
                 data = json.loads(cached)
-                hist = data.get("history", [])
-                if hist:
-                    self.conversation_history = hist[-self.max_history*2:]
+                # Anciennes entrées : l'historique global y était stocké, il ne doit pas fuiter
+                data.pop("history", None)
                 return data
         except Exception as e:
             print(f"⚠️  Erreur lecture cache: {e}")
         return None
 
+    # ------------------- CACHE SÉMANTIQUE -------------------
+    def attach_embedder(self, embed_question):
+        """
+        Fonction texte -> vecteur (RAGService.embed_query : cache LRU + micro-batching).
+        La question brute diffère de la requête enrichie envoyée au RAG : son embedding
+        est en général calculé ici, d'où la recherche hors de la boucle d'événements.
+        """
+        self.embed_question = embed_question
+
+    def _question_vector(self, question: str) -> Optional[np.ndarray]:
+        if self.embed_question is None or not self.semantic_cache.enabled:
+            return None
+        try:
+            return self.embed_question(question)
+        except Exception as e:
+            print(f"⚠️  Erreur embedding cache sémantique: {e}")
+            return None
+
+    def _get_semantic_response(self, question: str, language: str, category: str) -> Optional[Dict]:
+        vector = self._question_vector(question)
+        if vector is None:
+            return None
+        found = self.semantic_cache.get(vector, language, category)
+        if not found:
+            return None
+        response, similarity, cached_question = found
+        self.cache_hits += 1
+        print(f"🧠 Cache sémantique ({similarity:.3f}) : '{question}' ≈ '{cached_question}'")
+        return {**response, "cache_similarity": round(similarity, 4)}
+
+    def _set_semantic_response(self, question: str, language: str, category: str, response: Dict):
+        vector = self._question_vector(question)
+        if vector is not None:
+            self.semantic_cache.set(vector, language, category, question, response)
+
     def _set_cached_response(self, question: str, language: str, response: Dict) -> None:
         if not self.redis_client:
             return
         try:
             cache_key = self._make_cache_key(question, language)
-            # Sauvegarder aussi l'historique
-            response_copy = response.copy()
-            response_copy["history"] = self.conversation_history
-            self.redis_client.setex(cache_key, self.cache_ttl, json.dumps(response_copy))
+            self.redis_client.setex(cache_key, self.cache_ttl, json.dumps(response))
         except Exception as e:
             print(f"⚠️  Erreur écriture cache: {e}")
 
     # ------------------- HISTORIQUE -------------------
-    def add_to_history(self, role: str, content: str):
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
-        if len(self.conversation_history) > self.max_history * 2:
-            self.conversation_history = self.conversation_history[-self.max_history * 2:]
-
-    def clear_history(self):
-        self.conversation_history = []
-
-    def get_context_summary(self) -> str:
-        if not self.conversation_history:
+    def add_to_history(self, role: str, content: str, session_id: Optional[str] = None):
+        self.history_store.append(session_id, role, content)
+
+    def get_history(self, session_id: Optional[str] = None) -> List[Dict]:
+        return self.history_store.get(session_id)
+
+    def clear_history(self, session_id: Optional[str] = None):
+        self.history_store.clear(session_id)
+
+    def get_context_summary(self, session_id: Optional[str] = None) -> str:
+        # Dernier échange complet, plus anciens réduits à une phrase, dans le budget de tokens
+        messages = self.context_packer.compress_history(self.history_store.get(session_id))
+        if not messages:
             return ""
         summary = "\n=== HISTORIQUE ===\n"
-        for msg in self.conversation_history[-6:]:
+        for msg in messages:
             role_fr = "Utilisateur" if msg["role"] == "user" else "Assistant"
             summary += f"{role_fr}: {msg['content']}\n"
         summary += "=== FIN ===\n\n"
@@ -121,94 +191,259 @@ class AIBrain:
             "cache_misses": self.cache_misses,
             "total_requests": total,
             "hit_rate_percent": round(hit_rate, 2),
-            "redis_active": self.redis_client is not None
+            "redis_active": self.redis_client is not None,
+            "query_embeddings": query_embedding_cache.get_stats(),
+            "query_batching": query_embedding_batcher.get_stats(),
+            "semantic": self.semantic_cache.get_stats(),
+            "single_flight": self.single_flight.get_stats(),
+            "llm": self.llm_backend.get_stats(),
+            "sessions": self.history_store.get_stats(),
+            "context": self.context_packer.get_stats(),
+            "streaming": self.get_latency_stats(),
+            "prompt_cache": self.get_prompt_cache_stats(),
+            "pipeline": self.get_pipeline_stats(),
+            "executors": executors.get_stats()
+        }
+
+    # ------------------- LATENCES STREAMING -------------------
+    def record_latency(self, ttft_ms: float, total_ms: float):
+        self.ttft_ms.append(ttft_ms)
+        self.total_ms.append(total_ms)
+
+    def get_latency_stats(self) -> Dict:
+        if not self.ttft_ms:
+            return {"responses": 0}
+        ttft = np.array(self.ttft_ms)
+        total = np.array(self.total_ms)
+        return {
+            "responses": len(ttft),
+            "ttft_p50_ms": round(float(np.percentile(ttft, 50)), 1),
+            "ttft_p95_ms": round(float(np.percentile(ttft, 95)), 1),
+            "total_p50_ms": round(float(np.percentile(total, 50)), 1),
+            "total_p95_ms": round(float(np.percentile(total, 95)), 1)
+        }
+
+    def record_stage_timings(self, timings: Dict[str, float]):
+        for stage, ms in timings.items():
+            self.stage_ms.setdefault(stage, deque(maxlen=500)).append(ms)
+
+    def get_pipeline_stats(self) -> Dict:
+        stats = {}
+        for stage, values in list(self.stage_ms.items()):
+            ms = np.array(values)
+            stats[stage] = {
+                "count": len(ms),
+                "p50_ms": round(float(np.percentile(ms, 50)), 1),
+                "p95_ms": round(float(np.percentile(ms, 95)), 1)
+            }
+        return stats
+
+    # ------------------- CACHE DE PRÉFIXE -------------------
+    def record_prompt_metrics(self, messages: List[Dict], metrics: Dict):
+        """Compteurs de fin de génération du backend (prompt_eval_count = tokens réellement évalués)"""
+        total = metrics.get("prompt_tokens") or sum(estimate_tokens(m["content"]) + 4 for m in messages)
+        evaluated = metrics.get("prompt_eval_count") or 0
+        cached = metrics.get("cached_tokens", max(0, total - evaluated))
+        self.prompt_evals.append((total, evaluated, cached, metrics.get("prompt_eval_ms", 0.0)))
+
+    def get_prompt_cache_stats(self) -> Dict:
+        if not self.prompt_evals:
+            return {"requests": 0}
+        samples = np.array(self.prompt_evals, dtype="float64")
+        total, evaluated, cached, eval_ms = samples.T
+        # Coût moyen d'un token de prompt sur la fenêtre -> temps économisé par les tokens en cache
+        ms_per_token = eval_ms.sum() / evaluated.sum() if evaluated.sum() else 0.0
+        return {
+            "requests": len(samples),
+            "avg_prompt_tokens": round(float(total.mean()), 1),
+            "avg_evaluated_tokens": round(float(evaluated.mean()), 1),
+            "avg_cached_tokens": round(float(cached.mean()), 1),
+            "prefix_reuse_percent": round(float(cached.sum() / total.sum() * 100), 1) if total.sum() else 0,
+            "prompt_eval_p50_ms": round(float(np.percentile(eval_ms, 50)), 1),
+            "prompt_eval_p95_ms": round(float(np.percentile(eval_ms, 95)), 1),
+            "ms_per_prompt_token": round(float(ms_per_token), 2),
+            "saved_ms_per_request": round(float(cached.mean() * ms_per_token), 1)
         }
 
     # ------------------- GENERATION REPONSE -------------------
-    def generate_response(self, question: str, rag_results: List[Dict], language: str, category: str = "general") -> Dict:
-        cached_response = self._get_cached_response(question, language)
+    def generate_response(self, question: str, rag_results: List[Dict], language: str, category: str = "general",
+                          session_id: Optional[str] = None) -> Dict:
+        early = self._cached_or_no_data(question, rag_results, language, category, session_id)
+        if early:
+            return early
+
+        def generate():
+            system_prompt, user_prompt = self._build_prompts(question, rag_results, language, session_id)
+            try:
+                self.cache_misses += 1
+                response = self._call_ollama(system_prompt, user_prompt)
+            except Exception as e:
+                return self._fallback_result(question, rag_results, language, category, e)
+            return self._complete_response(question, rag_results, language, category, response)
+
+        result, shared = self.single_flight.do_sync(
+            self._make_cache_key(question, language), generate,
+            lookup=lambda: self._get_cached_response(question, language)
+        )
+        return self._finish_turn(question, result, session_id, shared)
+
+    async def generate_response_async(self, question: str, rag_results: List[Dict], language: str, category: str = "general",
+                                      session_id: Optional[str] = None) -> Dict:
+        """Comme generate_response, sans bloquer la boucle d'événements (caches, appel LLM)"""
+        early = await executors.run_in_executor(
+            "io", self._cached_or_no_data, question, rag_results, language, category, session_id
+        )
+        if early:
+            return early
+
+        async def generate():
+            system_prompt, user_prompt = self._build_prompts(question, rag_results, language, session_id)
+            try:
+                self.cache_misses += 1
+                response = await self._call_ollama_async(system_prompt, user_prompt)
+            except Exception as e:
+                return self._fallback_result(question, rag_results, language, category, e)
+            result = self._complete_response(question, rag_results, language, category, response, store=False)
+            # Écritures Redis + cache sémantique hors de la boucle d'événements
+            await executors.run_in_executor("io", self._store_response, question, language, category, result)
+            return result
+
+        result, shared = await self.single_flight.do(
+            self._make_cache_key(question, language), generate,
+            lookup=lambda: self._get_cached_response(question, language)
+        )
+        return self._finish_turn(question, result, session_id, shared)
+
+    async def generate_response_stream(self, question: str, rag_results: List[Dict], language: str,
+                                       category: str = "general",
+                                       session_id: Optional[str] = None) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Réponse en streaming : ("token", fragment) au fil de la génération, puis ("done", résultat).
+        Le résultat final fait foi (texte complet, ou fallback si Ollama échoue en cours de route) ;
+        l'historique et le cache ne sont écrits qu'à la fin.
+        Si la même question est déjà en cours de génération dans ce worker, on attend son résultat.
+        """
+        early = await executors.run_in_executor(
+            "io", self._cached_or_no_data, question, rag_results, language, category, session_id
+        )
+        if early:
+            yield "token", early.get("reponse", "")
+            yield "done", early
+            return
+
+        key = self._make_cache_key(question, language)
+        pending = self.single_flight.join(key)
+        if pending is not None:
+            shared_result = await self.single_flight.wait(pending)
+            if shared_result is not None:
+                yield "token", shared_result.get("reponse", "")
+                yield "done", self._finish_turn(question, shared_result, session_id, True)
+                return
+
+        future = self.single_flight.lead(key)
+        result = None
+        try:
+            system_prompt, user_prompt = self._build_prompts(question, rag_results, language, session_id)
+            self.cache_misses += 1
+            parts = []
+            try:
+                async for chunk in self.llm_backend.chat_stream(
+                    self.model, self._messages(system_prompt, user_prompt), self.generation_options
+                ):
+                    delta = chunk.get("message", {}).get("content") or ""
+                    if delta:
+                        parts.append(delta)
+                        yield "token", delta
+                result = self._complete_response(
+                    question, rag_results, language, category, "".join(parts).strip(), store=False
+                )
+                await executors.run_in_executor("io", self._store_response, question, language, category, result)
+            except Exception as e:
+                result = self._fallback_result(question, rag_results, language, category, e)
+        finally:
+            # Client déconnecté (result None) : les appelants en attente génèrent eux-mêmes
+            if result is None:
+                self.single_flight.resolve(key, future)
+            else:
+                self.single_flight.resolve(key, future, result)
+        yield "done", self._finish_turn(question, result, session_id, False)
+
+    def _cached_or_no_data(self, question: str, rag_results: List[Dict], language: str, category: str,
+                           session_id: Optional[str] = None) -> Optional[Dict]:
+        cached_response = (self._get_cached_response(question, language)
+                           or self._get_semantic_response(question, language, category))
         if cached_response:
-            self.add_to_history("user", question)
-            self.add_to_history("assistant", cached_response.get("reponse", ""))
+            self.add_to_history("user", question, session_id)
+            self.add_to_history("assistant", cached_response.get("reponse", ""), session_id)
             return {**cached_response, "cache_hit": True}
 
         if not rag_results:
             return self._no_data_response(question, language, category)
+        return None
 
-        system_prompt, user_prompt = self._build_prompts(question, rag_results, language)
+    def _complete_response(self, question: str, rag_results: List[Dict], language: str, category: str, response: str,
+                           store: bool = True) -> Dict:
+        result = {
+            "reponse": response,
+            "mode": "intelligent",
+            "langue": language,
+            "categorie": category,
+            "sources_utilisees": len(rag_results),
+            "sources": len(rag_results),
+            "timestamp": datetime.utcnow().isoformat(),
+            "cache_hit": False
+        }
+        if store:
+            self._store_response(question, language, category, result)
+        return result
+
+    def _store_response(self, question: str, language: str, category: str, result: Dict):
+        self._set_cached_response(question, language, result)
+        self._set_semantic_response(question, language, category, result)
+
+    def _finish_turn(self, question: str, result: Dict, session_id: Optional[str], shared: bool) -> Dict:
+        """Historique de la session appelante (la génération a pu être partagée avec d'autres sessions)"""
+        if result.get("mode") == "intelligent":
+            self.add_to_history("user", question, session_id)
+            self.add_to_history("assistant", result.get("reponse", ""), session_id)
+        return {**result, "coalesced": True} if shared else result
+
+    def _fallback_result(self, question: str, rag_results: List[Dict], language: str, category: str, error: Exception) -> Dict:
+        fallback = self._fallback_response(question, rag_results, language)
+        return {
+            "reponse": fallback,
+            "mode": "structured_rag",
+            "erreur": str(error),
+            "langue": language,
+            "categorie": category,
+            "sources_utilisees": len(rag_results),
+            "sources": len(rag_results),
+            "timestamp": datetime.utcnow().isoformat(),
+            "cache_hit": False
+        }
 
-        try:
-            self.cache_misses += 1
-            response = self._call_ollama(system_prompt, user_prompt)
-            result = {
-                "reponse": response,
-                "mode": "intelligent",
-                "langue": language,
-                "categorie": category,
-                "sources_utilisees": len(rag_results),
-                "sources": len(rag_results),
-                "timestamp": datetime.utcnow().isoformat(),
-                "cache_hit": False
-            }
-            self.add_to_history("user", question)
-            self.add_to_history("assistant", response)
-            self._set_cached_response(question, language, result)
-            return result
-        except Exception as e:
-            fallback = self._fallback_response(question, rag_results, language)
-            return {
-                "reponse": fallback,
-                "mode": "structured_rag",
-                "erreur": str(e),
-                "langue": language,
-                "categorie": category,
-                "sources_utilisees": len(rag_results),
-                "sources": len(rag_results),
-                "timestamp": datetime.utcnow().isoformat(),
-                "cache_hit": False
-            }
+    def generate_intelligent_response(self, question: str, rag_results: List[Dict], category: str = "general", language: str = "fr",
+                                      session_id: Optional[str] = None) -> Dict:
+        return self.generate_response(question, rag_results, language, category, session_id)
 
-    def generate_intelligent_response(self, question: str, rag_results: List[Dict], category: str = "general", language: str = "fr") -> Dict:
-        return self.generate_response(question, rag_results, language, category)
+    async def generate_intelligent_response_async(self, question: str, rag_results: List[Dict], category: str = "general", language: str = "fr",
+                                                  session_id: Optional[str] = None) -> Dict:
+        return await self.generate_response_async(question, rag_results, language, category, session_id)
 
     # ------------------- PROMPTS -------------------
-    def _build_prompts(self, question: str, rag_results: List[Dict], language: str) -> Tuple[str, str]:
+    def _build_prompts(self, question: str, rag_results: List[Dict], language: str,
+                       session_id: Optional[str] = None) -> Tuple[str, str]:
         """Construit les prompts système/utilisateur à partir de briques pédagogiques.
 
         Compatible avec deux formats de RAG:
         - Ancien: {"question": str, "reponse": str}
         - Enrichi: {"reponse_courte", "reponse_detaillee", "conseil", "avertissement", ...}
-        """
-
-        blocks = []
-        for r in rag_results[:3]:
-            # Nouveau format enrichi UNIQUEMENT
-            short = (r.get("reponse_courte") or "").strip()
-            detailed = (r.get("reponse_detaillee") or "").strip()
-            advice = (r.get("conseil") or "").strip()
-            warning = (r.get("avertissement") or "").strip()
-
-            if not (short or detailed or advice or warning):
-                # Ancien champ "reponse" n'est plus utilisé
-                continue
-
-            # Construire un petit bloc structuré pour le LLM
-            lines = []
-            if short:
-                lines.append(f"Idée principale : {short}")
-            if detailed:
-                # Limiter la taille pour éviter de saturer le contexte
-                detail_trimmed = detailed[:500] + "..." if len(detailed) > 500 else detailed
-                lines.append(f"Explication : {detail_trimmed}")
-            if advice:
-                lines.append(f"Conseil pratique : {advice}")
-            if warning:
-                lines.append(f"Avertissement : {warning}")
 
-            blocks.append("\n".join(lines))
+        Les connaissances remplissent ce qui reste de num_ctx après les consignes,
+        l'historique, la question et la réponse attendue (num_predict).
+        """
 
-        knowledge = "\n\n---\n\n".join(blocks)
-        history_context = self.get_context_summary()
+        history_context = self.get_context_summary(session_id)
 
         system_prompts = {
             "fr": (
@@ -227,40 +462,49 @@ class AIBrain:
             "di": "I ye YINGR-AI ye.\nI ka kuma sùrun ani ɲɔgɔn.\nI ka jaabi kelen di.\nKan: dioula."
         }
 
-        system_prompt = system_prompts.get(language, system_prompts["fr"])
+        # Tout ce qui est fixe (consignes de langue + mission) est en tête du prompt système :
+        # ce préfixe identique d'une requête à l'autre reste dans le cache KV du backend.
+        # Ce qui varie (historique, connaissances, question) vient après, dans le message utilisateur.
+        system_prompt = f"""{system_prompts.get(language, system_prompts["fr"])}
 
-        user_prompt = f"""{history_context}Voici des éléments de connaissance issus de la base :
+Ta mission :
+- Synthétiser l'idée principale.
+- Donner une explication simple et concrète adaptée au Burkina Faso.
+- Ajouter au moins un conseil pratique si disponible.
+- Mentionner un avertissement si pertinent.
+- Utiliser uniquement les éléments qui aident vraiment à répondre à la question (ignorer les informations hors-sujet par rapport à la demande de l'utilisateur).
+- Ne répète pas la question mot pour mot.
+- Termine par UNE seule question pour continuer le dialogue."""
 
-    {knowledge}
+        user_template = f"""{history_context}Voici des éléments de connaissance issus de la base :
 
-    Ta mission :
-    - Synthétiser l'idée principale.
-    - Donner une explication simple et concrète adaptée au Burkina Faso.
-    - Ajouter au moins un conseil pratique si disponible.
-    - Mentionner un avertissement si pertinent.
-    - Utiliser uniquement les éléments qui aident vraiment à répondre à la question (ignorer les informations hors-sujet par rapport à la demande de l'utilisateur).
-    - Ne répète pas la question mot pour mot.
-    - Termine par UNE seule question pour continuer le dialogue.
+{{knowledge}}
 
-    Question utilisateur : {question}
-    """
+Question utilisateur : {question}
+"""
+        fixed_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_template)
+        budget = self.generation_options["num_ctx"] - self.generation_options["num_predict"] - fixed_tokens - 32
+        knowledge, _ = self.context_packer.pack(rag_results, budget)
+        user_prompt = user_template.replace("{knowledge}", knowledge, 1)
         return system_prompt, user_prompt
 
     # ------------------- OLLAMA -------------------
+    @staticmethod
+    def _messages(system_prompt: str, user_prompt: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
     def _call_ollama(self, system_prompt: str, user_prompt: str) -> str:
-        payload = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "stream": False,
-            "options": {"temperature":0.4, "top_p":0.85, "num_predict":100, "num_ctx":1024, "repeat_penalty":1.2}
-        }
-        r = requests.post(f"{self.ollama_url}/api/chat", json=payload, timeout=120)
-        r.raise_for_status()
-        data = r.json()
-        return (data.get("message", {}).get("content") or "").strip()
+        return self.llm_backend.chat_sync(
+            self.model, self._messages(system_prompt, user_prompt), self.generation_options
+        )
+
+    async def _call_ollama_async(self, system_prompt: str, user_prompt: str) -> str:
+        return await self.llm_backend.chat(
+            self.model, self._messages(system_prompt, user_prompt), self.generation_options
+        )
 
     # ------------------- FALLBACK -------------------
     def _fallback_response(self, question: str, rag_results: List[Dict], language: str) -> str:
@@ -0,0 +1,126 @@
+# ai/service/bm25_index.py
+"""
+Index inversé BM25 construit à l'ingestion, à côté du VectorStore.
+Permet une recherche par mots-clés autonome (termes locaux: soumbala, kinkeliba...)
+même quand l'embedding ne les retrouve pas.
+"""
+import math
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .hybrid_search import HybridSearch
+
+
+def tokenize(text: str) -> List[str]:
+    """Mots-clés (sans mots vides) en minuscules et sans accents: karité → karite"""
+    tokens = []
+    for word in HybridSearch.extract_keywords(text or ""):
+        word = unicodedata.normalize('NFD', word)
+        tokens.append(''.join(c for c in word if unicodedata.category(c) != 'Mn'))
+    return tokens
+
+
+class BM25Index:
+    """Index inversé terme → {doc_id: fréquence}, score Okapi BM25"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    # =========================
+    # Mise à jour
+    # =========================
+    def add(self, doc_id: int, text: str):
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id, text)
+        tokens = tokenize(text)
+        for token in tokens:
+            postings = self.postings.setdefault(token, {})
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+        self.doc_lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, doc_id: int, text: str):
+        """Retire un document (le texte d'origine donne la liste des termes à nettoyer)"""
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for token in set(tokenize(text)):
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[token]
+
+    # =========================
+    # Recherche
+    # =========================
+    def search(self, query: str, k: int = 5, allowed_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        """Retourne les k meilleurs (doc_id, score BM25), éventuellement restreints à allowed_ids"""
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+        allowed = set(allowed_ids) if allowed_ids is not None else None
+
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = self._idf(len(postings), n_docs)
+            for doc_id, tf in postings.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def coverage(self, query: str, doc_ids: Iterable[int]) -> Dict[int, float]:
+        """
+        Part (0-1) du poids IDF des termes de la requête présents dans chaque document.
+        Un terme absent du corpus a l'IDF maximal : "voiture rouge" ne couvre qu'une petite
+        part d'un document qui contient seulement "rouge".
+        """
+        n_docs = len(self.doc_lengths)
+        weights = {token: self._idf(len(self.postings.get(token, ())), n_docs) for token in set(tokenize(query))}
+        total = sum(weights.values())
+        if not total:
+            return {doc_id: 0.0 for doc_id in doc_ids}
+        return {
+            doc_id: sum(w for token, w in weights.items() if doc_id in self.postings.get(token, ())) / total
+            for doc_id in doc_ids
+        }
+
+    @staticmethod
+    def _idf(doc_freq: int, n_docs: int) -> float:
+        return math.log(1.0 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    # =========================
+    # Persistance
+    # =========================
+    def to_state(self) -> Dict:
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "postings": self.postings,
+            "doc_lengths": self.doc_lengths,
+            "total_length": self.total_length,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "BM25Index":
+        index = cls(k1=state["k1"], b=state["b"])
+        index.postings = state["postings"]
+        index.doc_lengths = state["doc_lengths"]
+        index.total_length = state["total_length"]
+        return index
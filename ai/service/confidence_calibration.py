@@ -0,0 +1,112 @@
+# ai/service/confidence_calibration.py
+"""
+Calibration de la confiance du RAG : similarité du meilleur document → probabilité
+que la question soit couverte par la base (régression logistique / Platt scaling).
+
+Ajustée sur un jeu de questions étiquetées (calibrate_confidence.py), sauvegardée dans
+RAG_CALIBRATION_PATH. Sans calibration, RAGService garde les seuils de similarité des routes.
+"""
+import json
+import logging
+import math
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ConfidenceCalibrator:
+    """P(pertinent | similarité) = 1 / (1 + exp(-(a·similarité + b)))"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("RAG_CALIBRATION_PATH", "data/faiss/calibration.json")
+        # Probabilité minimale pour répondre quand la calibration est active
+        self.min_probability = float(os.getenv("RAG_MIN_PROBABILITY", "0.5"))
+        self.a = None
+        self.b = None
+        self.metric = None
+        self.load()
+
+    @property
+    def is_calibrated(self) -> bool:
+        return self.a is not None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.a, self.b, self.metric = state["a"], state["b"], state["metric"]
+            logger.info(f"✅ Calibration de confiance chargée ({self.metric}, a={self.a:.3f}, b={self.b:.3f})")
+        except Exception as e:
+            logger.warning(f"⚠️  Calibration de confiance illisible ({self.path}): {e}")
+
+    def applies_to(self, metric: str) -> bool:
+        """La calibration n'est valable que pour la métrique sur laquelle elle a été ajustée"""
+        return self.is_calibrated and self.metric == metric
+
+    def probability(self, similarity: float) -> float:
+        z = self.a * similarity + self.b
+        return 1.0 / (1.0 + math.exp(-z)) if z >= 0 else math.exp(z) / (1.0 + math.exp(z))
+
+    # =========================
+    # Ajustement
+    # =========================
+    def fit(self, similarities: List[float], labels: List[bool], metric: str, iterations: int = 100) -> Dict:
+        """
+        Ajuste a et b par Newton (IRLS) avec les cibles lissées de Platt,
+        puis retourne un rapport (exactitude, score de Brier) sur le jeu fourni.
+        """
+        x = np.asarray(similarities, dtype="float64")
+        y = np.asarray(labels, dtype="float64")
+        n_pos, n_neg = int(y.sum()), int(len(y) - y.sum())
+        if not n_pos or not n_neg:
+            raise ValueError("Le jeu de calibration doit contenir des questions pertinentes ET hors sujet")
+
+        # Cibles de Platt : évitent des coefficients infinis sur un jeu séparable
+        targets = np.where(y > 0, (n_pos + 1.0) / (n_pos + 2.0), 1.0 / (n_neg + 2.0))
+        features = np.column_stack([x, np.ones_like(x)])
+        weights = np.zeros(2)
+        for _ in range(iterations):
+            p = 1.0 / (1.0 + np.exp(-features @ weights))
+            gradient = features.T @ (p - targets)
+            hessian = features.T @ (features * (p * (1.0 - p))[:, None]) + 1e-9 * np.eye(2)
+            step = np.linalg.solve(hessian, gradient)
+            weights -= step
+            if np.abs(step).max() < 1e-10:
+                break
+
+        if weights[0] <= 0:
+            raise ValueError("La similarité ne sépare pas les questions pertinentes des hors sujet sur ce jeu")
+        self.a, self.b = float(weights[0]), float(weights[1])
+        self.metric = metric
+        probabilities = np.array([self.probability(s) for s in x])
+        predicted = probabilities >= self.min_probability
+        report = {
+            "a": self.a,
+            "b": self.b,
+            "metric": metric,
+            "samples": len(x),
+            "positives": n_pos,
+            "negatives": n_neg,
+            "accuracy": round(float(np.mean(predicted == (y > 0))), 4),
+            "brier": round(float(np.mean((probabilities - y) ** 2)), 4),
+            # Similarité à partir de laquelle P >= min_probability
+            "similarity_threshold": round(self.similarity_for(self.min_probability), 4),
+            "fitted_at": datetime.utcnow().isoformat(),
+        }
+        return report
+
+    def similarity_for(self, probability: float) -> float:
+        return (math.log(probability / (1.0 - probability)) - self.b) / self.a
+
+    def save(self, report: Dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,194 @@
+# ai/service/context_packer.py
+"""
+Assemblage du contexte du prompt dans un budget de tokens.
+
+Sur CPU, le temps de traitement du prompt croît avec sa longueur : au lieu de
+« 3 documents, explication coupée à 500 caractères, 6 messages d'historique »,
+on remplit un budget (num_ctx - num_predict - consignes) :
+- passages par ordre de pertinence (champ "score" s'il existe, sinon rang du RAG)
+- phrases déjà présentes dans un passage plus pertinent supprimées (recouvrements)
+- passage qui dépasse le budget coupé à la fin d'une phrase plutôt qu'écarté
+- historique compressé : dernier échange complet, les précédents réduits à leur première phrase
+"""
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+|\n+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Champs des documents enrichis, dans l'ordre d'affichage
+_FIELDS = (
+    ("reponse_courte", "Idée principale"),
+    ("reponse_detaillee", "Explication"),
+    ("conseil", "Conseil pratique"),
+    ("avertissement", "Avertissement"),
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation sans tokenizer : ~3.5 caractères par token pour un BPE type Llama en français"""
+    if not text:
+        return 0
+    return int(len(text) / 3.5) + 1
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text or "") if s.strip()]
+
+
+def _shingles(sentence: str) -> set:
+    words = [w.lower() for w in _WORD.findall(sentence)]
+    if len(words) < 3:
+        return set(words)
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+class ContextPacker:
+    def __init__(self):
+        # Plafond de tokens pour les connaissances, même si le contexte du modèle permet plus
+        self.max_knowledge_tokens = int(os.getenv("RAG_CONTEXT_MAX_TOKENS", "600"))
+        self.max_passages = int(os.getenv("RAG_CONTEXT_MAX_PASSAGES", "5"))
+        # Recouvrement (trigrammes de mots) à partir duquel une phrase est un doublon
+        self.dedup_threshold = float(os.getenv("RAG_CONTEXT_DEDUP", "0.7"))
+        self.history_tokens = int(os.getenv("SESSION_HISTORY_MAX_TOKENS", "300"))
+
+        self.prompts = 0
+        self.knowledge_tokens = 0
+        self.deduplicated = 0
+        self.truncated = 0
+        self.dropped = 0
+
+    # ------------------- PASSAGES -------------------
+    @staticmethod
+    def _ranked(rag_results: List[Dict]) -> List[Dict]:
+        if any("score" in r for r in rag_results):
+            return sorted(rag_results, key=lambda r: r.get("score", 0.0), reverse=True)
+        return list(rag_results)
+
+    @staticmethod
+    def _fields(result: Dict) -> List[Tuple[str, str]]:
+        fields = [(label, (result.get(key) or "").strip()) for key, label in _FIELDS]
+        fields = [(label, text) for label, text in fields if text]
+        if not fields and (result.get("reponse") or "").strip():
+            # Documents des routes (blocs de contexte bruts du RAG)
+            fields = [("Information", result["reponse"].strip())]
+        return fields
+
+    def _is_duplicate(self, sentence: str, seen: List[set]) -> bool:
+        shingles = _shingles(sentence)
+        if not shingles:
+            return True
+        for other in seen:
+            if len(shingles & other) / len(shingles) >= self.dedup_threshold:
+                return True
+        return False
+
+    def pack(self, rag_results: List[Dict], budget: int) -> Tuple[str, Dict]:
+        """Blocs de connaissance séparés par "---" tenant dans budget tokens, et statistiques"""
+        budget = max(0, min(budget, self.max_knowledge_tokens))
+        remaining = budget
+        seen: List[set] = []
+        blocks = []
+        stats = {"budget": budget, "passages": 0, "deduplicated": 0, "truncated": 0, "dropped": 0}
+
+        for result in self._ranked(rag_results):
+            if len(blocks) >= self.max_passages or remaining <= 0:
+                stats["dropped"] += 1
+                continue
+            lines = []
+            candidates = list(seen)
+            for label, text in self._fields(result):
+                kept = []
+                for sentence in _sentences(text):
+                    if self._is_duplicate(sentence, candidates):
+                        stats["deduplicated"] += 1
+                        continue
+                    kept.append(sentence)
+                    candidates.append(_shingles(sentence))
+                if kept:
+                    lines.append((label, kept))
+            if not lines:
+                stats["dropped"] += 1
+                continue
+
+            block, cost, taken, cut = self._fit(lines, remaining)
+            if not block:
+                stats["dropped"] += 1
+                continue
+            # Seules les phrases réellement gardées comptent pour les doublons suivants
+            seen.extend(_shingles(sentence) for sentence in taken)
+            blocks.append(block)
+            remaining -= cost + 2  # séparateur
+            stats["passages"] += 1
+            stats["truncated"] += int(cut)
+
+        stats["tokens"] = budget - remaining if blocks else 0
+        self._record(stats)
+        return "\n\n---\n\n".join(blocks), stats
+
+    @staticmethod
+    def _fit(lines: List[Tuple[str, List[str]]], budget: int) -> Tuple[str, int, List[str], bool]:
+        """Ajoute les phrases dans l'ordre tant qu'elles tiennent dans le budget"""
+        out, cost, cut, all_taken = [], 0, False, []
+        for label, sentences in lines:
+            taken = []
+            prefix = estimate_tokens(f"{label} : ")
+            for sentence in sentences:
+                extra = estimate_tokens(sentence) + (prefix if not taken else 1)
+                if cost + extra > budget:
+                    cut = True
+                    break
+                taken.append(sentence)
+                cost += extra
+            if taken:
+                out.append(f"{label} : {' '.join(taken)}" + (" ..." if cut else ""))
+                all_taken.extend(taken)
+            if cut:
+                break
+        return "\n".join(out), cost, all_taken, cut
+
+    def _record(self, stats: Dict):
+        self.prompts += 1
+        self.knowledge_tokens += stats["tokens"]
+        self.deduplicated += stats["deduplicated"]
+        self.truncated += stats["truncated"]
+        self.dropped += stats["dropped"]
+
+    # ------------------- HISTORIQUE -------------------
+    def compress_history(self, messages: List[Dict], budget: Optional[int] = None) -> List[Dict]:
+        """
+        Messages (ordre chronologique) tenant dans le budget : le dernier échange en entier,
+        les plus anciens réduits à leur première phrase.
+        """
+        remaining = budget or self.history_tokens
+        selected = []
+        for position, message in enumerate(reversed(messages)):
+            content = message["content"]
+            if position >= 2:
+                sentences = _sentences(content)
+                content = sentences[0] if sentences else ""
+            cost = estimate_tokens(content)
+            if not content or cost > remaining:
+                break
+            remaining -= cost
+            selected.append({**message, "content": content})
+        selected.reverse()
+        return selected
+
+    def get_stats(self) -> Dict:
+        return {
+            "prompts": self.prompts,
+            "avg_knowledge_tokens": round(self.knowledge_tokens / self.prompts, 1) if self.prompts else 0,
+            "max_knowledge_tokens": self.max_knowledge_tokens,
+            "deduplicated_sentences": self.deduplicated,
+            "truncated_passages": self.truncated,
+            "dropped_passages": self.dropped
+        }
+
+
+# INSTANCE GLOBALE
+context_packer = ContextPacker()
@@ -1,23 +1,172 @@
-from sentence_transformers import SentenceTransformer
-import numpy as np
+# ai/service/embedding.py
+"""
+Encodeurs de phrases, partagés par le RAG, l'ingestion et les scripts.
+
+- get_encoder(model_name) : chargement paresseux et thread-safe, une instance par modèle
+  (EMBEDDING_MODEL par défaut) ; EMBEDDING_BACKEND=onnx sert le modèle exporté
+- Encoder.encode : vecteurs float32 normalisés L2 (produit scalaire = cosinus)
+- Encoder.encode_documents : cache disque par empreinte du contenu (EMBEDDING_DISK_CACHE_DIR),
+  ré-ingérer les mêmes fichiers ingest/connaissances*.json ne ré-encode pas les passages inchangés
+"""
+import hashlib
 import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Union
 
-class EmbeddingService:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        logging.basicConfig(level=logging.INFO)
-        logging.info(f"Chargement du modèle d'embedding: {model_name}...")
-        self.model = SentenceTransformer(model_name)
-        logging.info("Modèle chargé avec succès.")
-
-    def embed(self, texts):
-        # Si c'est une seule chaîne de caractères, la convertir en liste
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+_encoders: Dict[str, "Encoder"] = {}
+_encoders_lock = threading.Lock()
+
+
+def content_hash(text: str) -> str:
+    """Empreinte SHA-256 du texte exact encodé"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class DocumentEmbeddingCache:
+    """Embeddings de documents sur disque (SQLite), clé = empreinte du contenu"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # Plusieurs workers peuvent ingérer en même temps : WAL + attente du verrou
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            # Requêtes par paquets (limite de paramètres SQLite)
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="float32")
+            self.hits += len(found)
+            self.misses += len(set(hashes)) - len(found)
+        return found
+
+    def set_many(self, items: Dict[str, np.ndarray]):
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype="float32").tobytes()) for key, vector in items.items()]
+            )
+            self.conn.commit()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            (size,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            return {"path": self.path, "entries": size, "hits": self.hits, "misses": self.misses}
+
+
+class Encoder:
+    """Modèle d'embedding chargé (SentenceTransformer ou ONNX) et son cache disque"""
+
+    def __init__(self, model_name: str, model, variant: str):
+        self.model_name = model_name
+        self.model = model
+        self.variant = variant
+        self.dim = model.get_sentence_embedding_dimension()
+        self.disk_cache = None
+        if os.getenv("EMBEDDING_DISK_CACHE", "1") == "1":
+            # Un fichier par modèle et par variante (torch / onnx / onnx-int8 donnent des vecteurs voisins, pas identiques)
+            name = re.sub(r"[^\w.-]+", "_", f"{model_name}-{variant}")
+            directory = os.getenv("EMBEDDING_DISK_CACHE_DIR", os.path.join("data", "embedding_cache"))
+            self.disk_cache = DocumentEmbeddingCache(os.path.join(directory, f"{name}.sqlite"))
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 32) -> np.ndarray:
+        """Embeddings (n x dim) float32 normalisés ; une chaîne seule donne (1 x dim)"""
         if isinstance(texts, str):
             texts = [texts]
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+        embeddings = np.asarray(
+            self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True), dtype="float32"
+        ).reshape(len(texts), self.dim)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.clip(norms, 1e-12, None)
+
+    def encode_documents(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Comme encode(), en réutilisant les embeddings déjà calculés pour le même contenu"""
+        if self.disk_cache is None or not texts:
+            return self.encode(texts, batch_size=batch_size)
+
+        hashes = [content_hash(text) for text in texts]
+        cached = self.disk_cache.get_many(hashes)
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.encode(list(missing.values()), batch_size=batch_size)
+            computed = dict(zip(missing.keys(), vectors))
+            self.disk_cache.set_many(computed)
+            cached.update(computed)
+            logger.info(f"🧮 {len(missing)} passages encodés, {len(texts) - len(missing)} repris du cache disque")
+
+        return np.vstack([cached[key] for key in hashes])
+
+    def get_stats(self) -> Dict:
+        return {
+            "model": self.model_name,
+            "backend": self.variant,
+            "dim": self.dim,
+            "disk_cache": self.disk_cache.get_stats() if self.disk_cache is not None else None
+        }
+
+
+def _load_model(model_name: str):
+    """(modèle, variante) selon EMBEDDING_BACKEND, repli sur SentenceTransformer"""
+    if os.getenv("EMBEDDING_BACKEND", "torch") == "onnx":
+        from .onnx_encoder import OnnxEncoder
+        path = os.getenv("EMBEDDING_ONNX_DIR") if model_name == DEFAULT_MODEL else None
         try:
-            embeddings = self.model.encode(texts, convert_to_numpy=True)
-            # Conversion en float32 pour FAISS
-            embeddings = np.array(embeddings).astype('float32')
-            return embeddings
-        except Exception as e:
-            logging.error(f"Erreur lors de l'encodage des textes: {e}")
-            return np.array([], dtype='float32')
+            model = OnnxEncoder(path or os.path.join("data", "onnx", os.path.basename(model_name)))
+            return model, "onnx-int8" if model.quantized else "onnx"
+        except RuntimeError as e:
+            logger.warning(f"⚠️  {e} - retour à SentenceTransformer")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name), "torch"
+
+
+def get_encoder(model_name: Optional[str] = None) -> Encoder:
+    """Encodeur du modèle (chargé une seule fois par processus)"""
+    model_name = model_name or DEFAULT_MODEL
+    with _encoders_lock:
+        encoder = _encoders.get(model_name)
+        if encoder is None:
+            logger.info(f"Chargement du modèle d'embedding {model_name}...")
+            model, variant = _load_model(model_name)
+            encoder = Encoder(model_name, model, variant)
+            _encoders[model_name] = encoder
+            logger.info(f"✅ Modèle d'embedding chargé: {model_name} ({variant})")
+        return encoder
+
+
+class EmbeddingService:
+    """Ancienne interface (texte(s) → tableau float32), adossée à get_encoder"""
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.encoder = get_encoder(model_name)
+
+    def embed(self, texts) -> np.ndarray:
+        return self.encoder.encode(texts)
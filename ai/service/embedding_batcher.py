@@ -0,0 +1,138 @@
+# ai/service/embedding_batcher.py
+"""
+Micro-batching des embeddings de requête.
+
+Sous charge, chaque requête appelait encode([question]) seule : un lot de 1 n'utilise
+qu'une petite partie du débit matriciel (BLAS) du CPU. Les demandes concurrentes sont
+mises en file ; un thread unique les regroupe pendant au plus EMBED_BATCH_MAX_WAIT_MS
+ou jusqu'à EMBED_BATCH_MAX_SIZE textes, encode le lot en un appel puis rend à chaque
+appelant son vecteur.
+
+Les appelants sont des threads (pool "rag") : la taille des lots est bornée par
+RAG_EXECUTOR_WORKERS, qui vaut par défaut EMBED_BATCH_MAX_SIZE. Un appelant qui attend
+son lot plus de EMBED_BATCH_TIMEOUT secondes (thread de lots bloqué) encode seul sa requête.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Regroupe les encodages concurrents d'une seule requête en lots"""
+
+    def __init__(self, max_batch: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        self.enabled = os.getenv("EMBED_BATCH_ENABLED", "1") == "1"
+        self.max_batch = max_batch or int(os.getenv("EMBED_BATCH_MAX_SIZE", "16"))
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+        self.timeout = float(os.getenv("EMBED_BATCH_TIMEOUT", "10"))
+        self.encoder: Optional[Callable[[List[str]], np.ndarray]] = None
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+        self.batches = 0
+        self.items = 0
+        self.max_queue_depth = 0
+        self.timeouts = 0
+        self.batch_sizes = deque(maxlen=500)
+        self.wait_ms = deque(maxlen=500)
+
+    def attach_encoder(self, encoder: Callable[[List[str]], np.ndarray]):
+        """Fonction d'encodage par lot (RAGService.embed)"""
+        self.encoder = encoder
+
+    # ------------------- APPELANTS -------------------
+    def encode(self, text: str) -> np.ndarray:
+        """Vecteur de text, calculé dans le prochain lot (bloquant)"""
+        if not self.enabled:
+            return self.encoder([text])[0]
+
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Encore en file : retiré des lots ; lot déjà en cours d'encodage : on ne l'attend plus
+            future.cancel()
+            if future.done() and not future.cancelled():
+                return future.result()
+        self.timeouts += 1
+        logger.warning(f"⚠️  Embedding de requête sans lot après {self.timeout}s, encodage direct")
+        return self.encoder([text])[0]
+
+    def _ensure_worker(self):
+        # Thread créé à la première utilisation (après le fork des workers gunicorn)
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="yingr-embed-batcher", daemon=True)
+                self._worker.start()
+
+    # ------------------- THREAD DE LOTS -------------------
+    def _collect(self) -> List[tuple]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Appelants partis sur délai dépassé : leur texte n'est pas encodé
+            batch = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                vectors = self.encoder([text for text, _, _ in batch])
+            except Exception as e:
+                logger.warning(f"⚠️  Erreur encodage du lot d'embeddings: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, queued_at), vector in zip(batch, vectors):
+                self.wait_ms.append((started - queued_at) * 1000)
+                future.set_result(np.asarray(vector, dtype="float32"))
+            self.batches += 1
+            self.items += len(batch)
+            self.batch_sizes.append(len(batch))
+
+    # ------------------- STATISTIQUES -------------------
+    def get_stats(self) -> Dict:
+        sizes = list(self.batch_sizes)
+        waits = list(self.wait_ms)
+        return {
+            "enabled": self.enabled,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_ms,
+            "timeout_s": self.timeout,
+            "timeouts": self.timeouts,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "avg_batch_fill_percent": round(float(np.mean(sizes)) / self.max_batch * 100, 1) if sizes else 0,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "queue_wait_p95_ms": round(float(np.percentile(waits, 95)), 2) if waits else 0
+        }
+
+
+# INSTANCE GLOBALE
+query_embedding_batcher = EmbeddingBatcher()
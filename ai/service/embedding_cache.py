@@ -0,0 +1,145 @@
+# ai/service/embedding_cache.py
+"""
+Cache des vecteurs de requête (LRU + TTL) pour éviter de ré-encoder
+les questions fréquentes ("moringa fatigue", salutations...).
+
+- En mémoire, borné (RAG_QUERY_CACHE_SIZE) avec expiration (RAG_QUERY_CACHE_TTL)
+- Optionnellement partagé entre workers via la connexion Redis d'AIBrain ; les clés Redis
+  portent le modèle d'embedding (nom, variante, dimension) pour qu'un worker ne lise pas
+  les vecteurs d'un autre modèle
+"""
+import base64
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEmbeddingCache:
+    """Cache LRU + TTL des embeddings de requête, clé = modèle + texte normalisé"""
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[int] = None):
+        self.max_size = max_size or int(os.getenv("RAG_QUERY_CACHE_SIZE", "2048"))
+        self.ttl = ttl or int(os.getenv("RAG_QUERY_CACHE_TTL", "3600"))
+        self.redis_client = None
+        self.namespace = "default"
+        self.dim = None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def attach_redis(self, redis_client):
+        """Partage le cache entre workers via Redis (None = mémoire seule)"""
+        self.redis_client = redis_client
+
+    def attach_encoder(self, encoder):
+        """Modèle dont les vecteurs sont mis en cache (changement de modèle = cache local vidé)"""
+        namespace = f"{encoder.model_name}:{encoder.variant}:{encoder.dim}"
+        with self._lock:
+            if namespace != self.namespace:
+                self._entries.clear()
+            self.namespace = namespace
+            self.dim = encoder.dim
+
+    @staticmethod
+    def normalize_key(text: str) -> str:
+        return " ".join((text or "").lower().split())
+
+    def _redis_key(self, key: str) -> str:
+        return f"yingr_qemb:{self.namespace}:{hashlib.md5(key.encode()).hexdigest()}"
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.normalize_key(text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+        vector = self._get_redis(key)
+        with self._lock:
+            if vector is not None:
+                self.redis_hits += 1
+                self._put_local(key, vector, now)
+            else:
+                self.misses += 1
+        return vector
+
+    def set(self, text: str, vector: np.ndarray):
+        key = self.normalize_key(text)
+        vector = np.asarray(vector, dtype="float32")
+        with self._lock:
+            self._put_local(key, vector, time.monotonic())
+        self._set_redis(key, vector)
+
+    def _put_local(self, key: str, vector: np.ndarray, now: float):
+        self._entries[key] = (now + self.ttl, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    # ------------------- REDIS -------------------
+    def _get_redis(self, key: str) -> Optional[np.ndarray]:
+        if self.redis_client is None:
+            return None
+        try:
+            cached = self.redis_client.get(self._redis_key(key))
+            if cached:
+                # Client Redis en decode_responses=True : vecteur stocké en base64
+                vector = np.frombuffer(base64.b64decode(cached), dtype="float32").copy()
+                if self.dim is not None and vector.size != self.dim:
+                    logger.warning(f"⚠️  Embedding en cache ignoré: {vector.size} dimensions au lieu de {self.dim}")
+                    return None
+                return vector
+        except Exception as e:
+            logger.warning(f"⚠️  Erreur lecture cache embeddings: {e}")
+        return None
+
+    def _set_redis(self, key: str, vector: np.ndarray):
+        if self.redis_client is None:
+            return
+        try:
+            encoded = base64.b64encode(vector.tobytes()).decode("ascii")
+            self.redis_client.setex(self._redis_key(key), self.ttl, encoded)
+        except Exception as e:
+            logger.warning(f"⚠️  Erreur écriture cache embeddings: {e}")
+
+    # ------------------- STATISTIQUES -------------------
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.redis_hits + self.misses
+            hit_rate = ((self.hits + self.redis_hits) / total * 100) if total > 0 else 0
+            return {
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "total_requests": total,
+                "hit_rate_percent": round(hit_rate, 2),
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "redis_active": self.redis_client is not None,
+                "model": self.namespace
+            }
+
+
+# INSTANCE GLOBALE
+query_embedding_cache = QueryEmbeddingCache()
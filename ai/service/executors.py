@@ -0,0 +1,59 @@
+# ai/service/executors.py
+"""
+Pools de threads dédiés aux étapes bloquantes des routes async.
+
+Le pool par défaut de Starlette (run_in_threadpool) est partagé avec toutes les routes
+synchrones : une rafale de requêtes /chat/guest peut y retarder l'embedding d'une requête
+/chat/intelligent. Chaque type d'étape a donc son pool, dimensionné pour le CPU :
+- rag : préparation de la requête (normalisation, intention), embedding + recherche FAISS
+  (RAG_EXECUTOR_WORKERS) ; les threads attendent surtout leur lot d'embeddings (encodé par
+  un seul thread), d'où autant de threads qu'un lot peut contenir de requêtes (EMBED_BATCH_MAX_SIZE)
+- tts : synthèse vocale (TTS_EXECUTOR_WORKERS)
+- stt : transcription Whisper (STT_EXECUTOR_WORKERS)
+- io  : appels réseau bloquants (Redis, MongoDB) et maintenance de l'index RAG (ingestion,
+  compaction, rechargement), qui ne doit pas occuper les threads des recherches (IO_EXECUTOR_WORKERS)
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_POOL_SIZES = {
+    "rag": ("RAG_EXECUTOR_WORKERS", os.getenv("EMBED_BATCH_MAX_SIZE", "16")),
+    "tts": ("TTS_EXECUTOR_WORKERS", "1"),
+    "stt": ("STT_EXECUTOR_WORKERS", "1"),
+    "io": ("IO_EXECUTOR_WORKERS", "4"),
+}
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """Pool nommé, créé à la première utilisation (après le fork des workers gunicorn)"""
+    with _lock:
+        executor = _executors.get(name)
+        if executor is None:
+            env, default = _POOL_SIZES[name]
+            executor = ThreadPoolExecutor(max_workers=int(os.getenv(env, default)), thread_name_prefix=f"yingr-{name}")
+            _executors[name] = executor
+        return executor
+
+
+async def run_in_executor(name: str, func: Callable, *args, **kwargs):
+    """Exécute func(*args, **kwargs) dans le pool name sans bloquer la boucle d'événements"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(name), functools.partial(func, *args, **kwargs))
+
+
+def get_stats() -> Dict:
+    with _lock:
+        return {
+            name: {"workers": executor._max_workers, "queued": executor._work_queue.qsize()}
+            for name, executor in _executors.items()
+        }
@@ -11,7 +11,7 @@ logger = logging.getLogger(__name__)
 
 class HybridSearch:
     """
-    Combine recherche par mots-clés (BM25-like) et recherche sémantique (embeddings)
+    Combine recherche par mots-clés (index BM25) et recherche sémantique (embeddings)
     pour améliorer la précision
     """
     
@@ -39,68 +39,21 @@ class HybridSearch:
         return keywords
     
     @staticmethod
-    def keyword_score(query_keywords: List[str], document_text: str) -> float:
+    def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
         """
-        Score BM25-like simple basé sur la fréquence des mots-clés
-        """
-        doc_lower = document_text.lower()
-        score = 0.0
-        
-        for keyword in query_keywords:
-            # Compter les occurrences du mot-clé
-            count = doc_lower.count(keyword)
-            if count > 0:
-                # Score augmente avec le nombre d'occurrences, mais avec diminution marginale
-                score += 1.0 + (count - 1) * 0.3
-        
-        return score
-    
-    @staticmethod
-    def rerank_results(
-        query: str,
-        results: List[dict],
-        semantic_scores: List[float],
-        keyword_weight: float = 0.4
-    ) -> Tuple[List[dict], List[float]]:
-        """
-        Réordonne les résultats en combinant scores sémantiques et par mots-clés
+        Fusionne plusieurs classements (listes d'identifiants, du meilleur au moins bon)
+        par Reciprocal Rank Fusion: score(d) = somme des 1 / (k + rang(d))
         
         Args:
-            query: Question de l'utilisateur
-            results: Liste des documents trouvés
-            semantic_scores: Scores de similarité sémantique
-            keyword_weight: Poids des mots-clés (0.0 = 100% sémantique, 1.0 = 100% mots-clés)
+            rankings: Classements à fusionner (ex: recherche vectorielle, BM25)
+            k: Constante d'amortissement (60 dans l'article d'origine)
         
         Returns:
-            Tuple[List[dict], List[float]]: Résultats réordonnés et nouveaux scores
+            List[Tuple[int, float]]: (identifiant, score RRF) triés par score décroissant
         """
-        query_keywords = HybridSearch.extract_keywords(query)
-        
-        logger.info(f"🔑 Mots-clés extraits: {query_keywords}")
-        
-        # Calculer les scores hybrides
-        hybrid_scores = []
-        for i, (result, sem_score) in enumerate(zip(results, semantic_scores)):
-            doc_text = result.get('text', '')
-            
-            # Score par mots-clés
-            kw_score = HybridSearch.keyword_score(query_keywords, doc_text)
-            
-            # Normaliser le score de mots-clés (max 5 mots-clés matchés = score 1.0)
-            kw_score_norm = min(kw_score / 5.0, 1.0)
-            
-            # Score hybride (combinaison linéaire)
-            hybrid = (1.0 - keyword_weight) * sem_score + keyword_weight * kw_score_norm
-            
-            hybrid_scores.append(hybrid)
-            
-            if i < 3:  # Logger les 3 premiers
-                logger.info(f"  Doc {i+1}: sem={sem_score:.3f}, kw={kw_score_norm:.3f} → hybrid={hybrid:.3f}")
-        
-        # Trier par score hybride décroissant
-        sorted_indices = sorted(range(len(hybrid_scores)), key=lambda i: hybrid_scores[i], reverse=True)
-        
-        reranked_results = [results[i] for i in sorted_indices]
-        reranked_scores = [hybrid_scores[i] for i in sorted_indices]
+        fused = {}
+        for ranking in rankings:
+            for rank, doc_id in enumerate(ranking, start=1):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
         
-        return reranked_results, reranked_scores
+        return sorted(fused.items(), key=lambda item: item[1], reverse=True)
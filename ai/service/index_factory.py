@@ -0,0 +1,147 @@
+# ai/service/index_factory.py
+"""
+Fabrique d'index FAISS pour la génération de base du VectorStore.
+
+RAG_INDEX_TYPE (par déploiement) :
+- flat  : recherche exacte (force brute), défaut
+- hnsw  : graphe HNSW, sans entraînement, très bon rappel
+- ivfpq : listes inversées + quantification produit, entraîné sur les vecteurs existants,
+          le plus compact pour les grandes bases (> 100k passages)
+
+RAG_INDEX_METRIC :
+- l2     : distance euclidienne (historique), plus petit = plus proche
+- cosine : produit scalaire sur vecteurs normalisés L2, plus grand = plus proche
+
+Le segment delta reste toujours en flat (petit, modifiable), avec la même métrique.
+"""
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+METRICS = ("l2", "cosine")
+
+# Points d'entraînement minimum pour un quantificateur PQ 8 bits (256 centroïdes)
+_PQ_MIN_TRAINING = 256
+# Plafond d'efSearch quand il est augmenté pour une recherche filtrée
+_MAX_EF_SEARCH = 1024
+
+
+def default_index_type() -> str:
+    index_type = os.getenv("RAG_INDEX_TYPE", "flat").lower()
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"RAG_INDEX_TYPE inconnu: {index_type} (attendu: {', '.join(INDEX_TYPES)})")
+    return index_type
+
+
+def default_metric() -> str:
+    metric = os.getenv("RAG_INDEX_METRIC", "l2").lower()
+    if metric not in METRICS:
+        raise ValueError(f"RAG_INDEX_METRIC inconnu: {metric} (attendu: {', '.join(METRICS)})")
+    return metric
+
+
+def _faiss_metric(metric: str):
+    return faiss.METRIC_INNER_PRODUCT if metric == "cosine" else faiss.METRIC_L2
+
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """Copie normalisée L2 (ligne par ligne) des vecteurs"""
+    vectors = np.array(vectors, dtype="float32", copy=True).reshape(len(vectors), -1)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def _ivf_nlist(n_vectors: int) -> int:
+    nlist = int(os.getenv("RAG_IVF_NLIST", "0"))
+    if nlist <= 0:
+        # ~4·√n listes, avec au moins 39 points d'entraînement par liste
+        nlist = min(int(4 * math.sqrt(n_vectors)), n_vectors // 39)
+    return max(1, nlist)
+
+
+def make_flat_index(dim: int, metric: str = "l2"):
+    """Index exact à identifiants (segment delta, petites bases)"""
+    flat = faiss.IndexFlatIP(dim) if metric == "cosine" else faiss.IndexFlatL2(dim)
+    return faiss.IndexIDMap2(flat)
+
+
+def _make_index(index_type: str, dim: int, n_vectors: int, metric: str):
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, int(os.getenv("RAG_HNSW_M", "32")), _faiss_metric(metric))
+        index.hnsw.efConstruction = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "80"))
+        return index
+    if index_type == "ivfpq":
+        pq_m = int(os.getenv("RAG_PQ_M", "48"))
+        if dim % pq_m:
+            raise ValueError(f"RAG_PQ_M ({pq_m}) doit diviser la dimension ({dim})")
+        quantizer = faiss.IndexFlatIP(dim) if metric == "cosine" else faiss.IndexFlatL2(dim)
+        return faiss.IndexIVFPQ(quantizer, dim, _ivf_nlist(n_vectors), pq_m, 8, _faiss_metric(metric))
+    return faiss.IndexFlatIP(dim) if metric == "cosine" else faiss.IndexFlatL2(dim)
+
+
+def resolve_index_type(index_type: str, n_vectors: int) -> str:
+    """IVF-PQ a besoin d'assez de vecteurs pour s'entraîner ; sinon on reste en flat."""
+    if index_type == "ivfpq" and n_vectors < max(_PQ_MIN_TRAINING, 39 * _ivf_nlist(n_vectors)):
+        logger.warning(f"IVF-PQ: {n_vectors} vecteurs insuffisants pour l'entraînement, index flat utilisé")
+        return "flat"
+    return index_type
+
+
+def build_index(vectors: np.ndarray, ids: np.ndarray, dim: int, index_type: str = None, metric: str = None):
+    """
+    Construit (et entraîne si besoin) un IndexIDMap2 contenant vectors sous les identifiants ids.
+    En cosine, les vecteurs sont normalisés avant l'indexation.
+    """
+    index_type = resolve_index_type(index_type or default_index_type(), len(ids))
+    metric = metric or default_metric()
+    inner = _make_index(index_type, dim, len(ids), metric)
+    if metric == "cosine":
+        vectors = normalize_vectors(vectors)
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if not inner.is_trained:
+        inner.train(vectors)
+    index = faiss.IndexIDMap2(inner)
+    if len(ids):
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype="int64"))
+    return index
+
+
+def index_type_of(index) -> str:
+    inner = faiss.downcast_index(index.index if hasattr(index, "id_map") else index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def metric_of(index) -> str:
+    return "cosine" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+
+
+def search_parameters(index, selector=None, selectivity=1.0):
+    """
+    Paramètres de recherche adaptés au type d'index (efSearch / nprobe + filtre éventuel).
+    selectivity : part des documents acceptés par le filtre. Le graphe HNSW et les listes IVF
+    écartent les autres en cours de parcours : efSearch / nprobe sont augmentés d'autant
+    pour garder assez de candidats filtrés.
+    """
+    index_type = index_type_of(index)
+    scale = 1.0 / min(1.0, max(selectivity, 1e-6))
+    if index_type == "hnsw":
+        ef_search = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+        ef_search = min(int(ef_search * scale), max(ef_search, _MAX_EF_SEARCH))
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    if index_type == "ivfpq":
+        nprobe = int(os.getenv("RAG_IVF_NPROBE", "16"))
+        nlist = faiss.extract_index_ivf(index).nlist
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(nlist, math.ceil(nprobe * scale)))
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
@@ -0,0 +1,335 @@
+# ai/service/llm_backends.py
+"""
+Backends LLM interchangeables pour AIBrain (LLM_BACKEND) :
+- ollama   : HTTP /api/chat (OllamaClient), défaut
+- openai   : API compatible OpenAI /v1/chat/completions (llama.cpp server, vLLM, LM Studio...)
+- llamacpp : llama-cpp-python dans le processus (modèle GGUF LLM_MODEL_PATH)
+- mock     : générateur déterministe hors ligne (latence et débit de tokens réglables),
+             pour les tests de bout en bout et les benchmarks sans serveur de modèle
+
+Tous exposent la même interface que OllamaClient : chat() / chat_stream() (async),
+chat_sync(), aclose(), get_stats(), avec des fragments de flux au format Ollama.
+"""
+import abc
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from .context_packer import estimate_tokens
+from .ollama_client import OllamaBusyError, OllamaClient
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKENDS = ("ollama", "openai", "llamacpp", "mock")
+
+
+# ============================================================
+# OpenAI compatible (HTTP)
+# ============================================================
+class OpenAICompatibleClient(OllamaClient):
+    """Même pool / concurrence qu'OllamaClient, protocole /v1/chat/completions"""
+    name = "openai"
+    chat_path = "/chat/completions"
+
+    def __init__(self, base_url: Optional[str] = None):
+        super().__init__(base_url or os.getenv("LLM_BASE_URL", "http://localhost:8080/v1"))
+        self.api_key = os.getenv("LLM_API_KEY", "")
+        # llama.cpp server : réutiliser le cache KV du préfixe commun (champ non standard, refusé par l'API OpenAI)
+        self.cache_prompt = os.getenv("LLM_CACHE_PROMPT", "0") == "1"
+
+    def _headers(self) -> Dict:
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    def _payload(self, model: str, messages: List[Dict], options: Optional[Dict], stream: bool = False) -> Dict:
+        options = options or {}
+        payload = {"model": model, "messages": messages, "stream": stream}
+        # Options Ollama -> paramètres OpenAI
+        for source, target in (("temperature", "temperature"), ("top_p", "top_p"), ("num_predict", "max_tokens")):
+            if source in options:
+                payload[target] = options[source]
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        if self.cache_prompt:
+            payload["cache_prompt"] = True
+        return payload
+
+    def _metrics(self, data: Dict) -> Optional[Dict]:
+        # usage (OpenAI, vLLM) et/ou timings + tokens_cached (llama.cpp server)
+        usage = data.get("usage") or {}
+        timings = data.get("timings") or {}
+        if not usage and not timings:
+            return None
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", data.get("tokens_cached"))
+        prompt_tokens = usage.get("prompt_tokens")
+        evaluated = timings.get("prompt_n")
+        if evaluated is None:
+            evaluated = (prompt_tokens or 0) - (cached or 0)
+        metrics = {
+            "prompt_eval_count": evaluated,
+            "prompt_eval_ms": timings.get("prompt_ms", 0.0),
+            "eval_count": timings.get("predicted_n", usage.get("completion_tokens", 0)),
+            "eval_ms": timings.get("predicted_ms", 0.0),
+            "load_ms": 0.0
+        }
+        if prompt_tokens is not None:
+            metrics["prompt_tokens"] = prompt_tokens
+        if cached is not None:
+            metrics["cached_tokens"] = cached
+        return metrics
+
+    def _content(self, data: Dict) -> str:
+        choices = data.get("choices") or [{}]
+        return (choices[0].get("message", {}).get("content") or "").strip()
+
+    def _chunk(self, line: str) -> Optional[Dict]:
+        # Flux SSE : "data: {...}" puis "data: [DONE]"
+        if not line.startswith("data:"):
+            return None
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return None
+        event = json.loads(data)
+        choices = event.get("choices") or [{}]
+        chunk = {"message": {"content": choices[0].get("delta", {}).get("content") or ""}, "done": False}
+        # Dernier évènement : compteurs (include_usage) et timings llama.cpp
+        if event.get("usage") or event.get("timings"):
+            chunk.update(done=True, usage=event.get("usage"), timings=event.get("timings"),
+                         tokens_cached=event.get("tokens_cached"))
+        return chunk
+
+
+# ============================================================
+# Backends dans le processus
+# ============================================================
+class InProcessBackend(abc.ABC):
+    """
+    Base des backends sans HTTP : _generate() produit les fragments de texte (bloquant),
+    chat()/chat_stream() le déroulent dans un thread pour ne pas bloquer la boucle.
+    """
+    name = "in_process"
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max_concurrency or int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+        self.queue_timeout = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "30"))
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.in_flight = 0
+        self.on_metrics = None
+
+    # Compteurs au format Ollama (durées en ns) -> mêmes métriques que les backends HTTP
+    _metrics = OllamaClient._metrics
+    _report = OllamaClient._report
+
+    def prefill(self, messages: List[Dict]) -> Dict:
+        """Évaluation du prompt avant génération ; retourne les compteurs prompt_eval_*"""
+        return {}
+
+    @abc.abstractmethod
+    def _generate(self, messages: List[Dict], options: Dict) -> Iterator[str]:
+        """Fragments de texte de la réponse (bloquant, appelé dans un thread)"""
+
+    def _final_chunk(self, messages: List[Dict], produced: int, prefill: Dict) -> Dict:
+        return {"message": {"content": ""}, "done": True, "eval_count": produced, **prefill}
+
+    def _acquire(self):
+        if not self._semaphore.acquire(timeout=self.queue_timeout):
+            raise OllamaBusyError(f"{self.name} saturé ({self.max_concurrency} générations en cours)")
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def _count(self, attribute: str):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+
+    def chat_sync(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                  timeout: Optional[float] = None) -> str:
+        self._acquire()
+        try:
+            prefill = self.prefill(messages)
+            parts = list(self._generate(messages, options or {}))
+            self._report(messages, self._final_chunk(messages, len(parts), prefill))
+            return "".join(parts).strip()
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            self._release()
+
+    async def chat(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                   timeout: Optional[float] = None) -> str:
+        parts = []
+        async for chunk in self.chat_stream(model, messages, options, timeout):
+            parts.append(chunk["message"]["content"])
+        return "".join(parts).strip()
+
+    async def chat_stream(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                          timeout: Optional[float] = None) -> AsyncIterator[Dict]:
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._acquire))
+        try:
+            await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # Le thread finira par obtenir le créneau : le rendre aussitôt
+            acquiring.add_done_callback(lambda f: None if f.exception() else self._release())
+            raise
+        produced = 0
+        try:
+            prefill = await asyncio.to_thread(self.prefill, messages)
+            iterator = self._generate(messages, options or {})
+            while True:
+                # Un fragment à la fois dans un thread : l'annulation arrête la génération au fragment suivant
+                delta = await asyncio.to_thread(next, iterator, None)
+                if delta is None:
+                    break
+                produced += 1
+                yield {"message": {"content": delta}, "done": False}
+            final = self._final_chunk(messages, produced, prefill)
+            self._report(messages, final)
+            yield final
+        except (asyncio.CancelledError, GeneratorExit):
+            self._count("cancelled")
+            raise
+        except Exception:
+            self._count("errors")
+            raise
+        finally:
+            self._release()
+
+    async def aclose(self):
+        return None
+
+    def get_stats(self) -> Dict:
+        return {
+            "backend": self.name,
+            "requests": self.requests,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency
+        }
+
+
+class LlamaCppBackend(InProcessBackend):
+    """Modèle GGUF chargé une fois par worker avec llama-cpp-python (dépendance optionnelle)"""
+    name = "llamacpp"
+
+    def __init__(self, model_path: Optional[str] = None):
+        # llama.cpp n'est pas réentrant : une génération à la fois par modèle chargé
+        super().__init__(max_concurrency=1)
+        try:
+            from llama_cpp import Llama
+        except ImportError:
+            raise RuntimeError("LLM_BACKEND=llamacpp nécessite llama-cpp-python (pip install llama-cpp-python)")
+        self.model_path = model_path or os.getenv("LLM_MODEL_PATH", "")
+        if not self.model_path:
+            raise RuntimeError("LLM_MODEL_PATH doit pointer vers un modèle GGUF")
+        self.llm = Llama(
+            model_path=self.model_path,
+            n_ctx=int(os.getenv("LLM_N_CTX", "2048")),
+            n_threads=int(os.getenv("LLM_N_THREADS", "0")) or None,
+            verbose=False
+        )
+        cache_mb = int(os.getenv("LLM_PROMPT_CACHE_MB", "256"))
+        if cache_mb > 0:
+            # Cache des états KV par préfixe : le prompt système commun n'est évalué qu'une fois
+            from llama_cpp import LlamaRAMCache
+            self.llm.set_cache(LlamaRAMCache(capacity_bytes=cache_mb << 20))
+        logger.info(f"✅ Modèle llama.cpp chargé: {self.model_path}")
+
+    def _generate(self, messages: List[Dict], options: Dict) -> Iterator[str]:
+        stream = self.llm.create_chat_completion(
+            messages=messages,
+            temperature=options.get("temperature", 0.4),
+            top_p=options.get("top_p", 0.85),
+            max_tokens=options.get("num_predict", 256),
+            repeat_penalty=options.get("repeat_penalty", 1.1),
+            stream=True
+        )
+        for event in stream:
+            delta = event["choices"][0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+
+class MockLLMBackend(InProcessBackend):
+    """
+    Générateur déterministe : même conversation -> même réponse.
+    MOCK_LLM_LATENCY_MS = délai avant le premier token, MOCK_LLM_TOKENS_PER_SEC = débit ensuite.
+    MOCK_LLM_PROMPT_MS_PER_TOKEN simule l'évaluation du prompt avec un cache de préfixe
+    à un emplacement (comme un slot llama.cpp) : seule la partie qui diffère du prompt
+    précédent est « évaluée ».
+    """
+    name = "mock"
+
+    VOCABULARY = (
+        "le", "moringa", "karité", "champ", "saison", "pluie", "conseil", "santé", "village",
+        "marché", "récolte", "eau", "sol", "semence", "famille", "prix", "on", "peut", "bien",
+        "toujours", "utiliser", "garder", "vendre", "planter", "arroser", "protéger"
+    )
+
+    def __init__(self, latency_ms: Optional[float] = None, tokens_per_sec: Optional[float] = None,
+                 max_concurrency: Optional[int] = None):
+        super().__init__(max_concurrency=max_concurrency)
+        self.latency_ms = float(os.getenv("MOCK_LLM_LATENCY_MS", "200")) if latency_ms is None else latency_ms
+        self.tokens_per_sec = tokens_per_sec or float(os.getenv("MOCK_LLM_TOKENS_PER_SEC", "50"))
+        self.max_tokens = int(os.getenv("MOCK_LLM_MAX_TOKENS", "60"))
+        self.prompt_ms_per_token = float(os.getenv("MOCK_LLM_PROMPT_MS_PER_TOKEN", "0"))
+        self._cached_prompt = ""
+
+    def tokens(self, messages: List[Dict], options: Optional[Dict] = None) -> List[str]:
+        """Réponse déterministe (liste de fragments) dérivée du hash de la conversation"""
+        options = options or {}
+        digest = hashlib.sha256(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")).digest()
+        count = min(options.get("num_predict", self.max_tokens), self.max_tokens)
+        words = [self.VOCABULARY[(digest[i % len(digest)] + i) % len(self.VOCABULARY)] for i in range(max(1, count))]
+        return [words[0].capitalize()] + [" " + w for w in words[1:]] + [" ?"]
+
+    def _generate(self, messages: List[Dict], options: Dict) -> Iterator[str]:
+        time.sleep(self.latency_ms / 1000)
+        for token in self.tokens(messages, options):
+            time.sleep(1.0 / self.tokens_per_sec)
+            yield token
+
+    @staticmethod
+    def _prompt_text(messages: List[Dict]) -> str:
+        return "".join(f"<{m.get('role')}>{m.get('content', '')}" for m in messages)
+
+    def prompt_tokens(self, messages: List[Dict]) -> int:
+        return estimate_tokens(self._prompt_text(messages))
+
+    def prefill(self, messages: List[Dict]) -> Dict:
+        text = self._prompt_text(messages)
+        with self._lock:
+            common = len(os.path.commonprefix([self._cached_prompt, text]))
+            self._cached_prompt = text
+        evaluated = estimate_tokens(text[common:])
+        duration_ms = evaluated * self.prompt_ms_per_token
+        time.sleep(duration_ms / 1000)
+        return {"prompt_eval_count": evaluated, "prompt_eval_duration": int(duration_ms * 1e6)}
+
+
+def create_llm_backend(backend: Optional[str] = None, base_url: Optional[str] = None):
+    """Backend choisi par LLM_BACKEND (ollama par défaut)"""
+    backend = (backend or os.getenv("LLM_BACKEND", "ollama")).lower()
+    if backend == "ollama":
+        return OllamaClient(base_url)
+    if backend == "openai":
+        return OpenAICompatibleClient()
+    if backend == "llamacpp":
+        return LlamaCppBackend()
+    if backend == "mock":
+        return MockLLMBackend()
+    raise ValueError(f"LLM_BACKEND inconnu: {backend} (attendu: {', '.join(LLM_BACKENDS)})")
@@ -0,0 +1,247 @@
+# ai/service/ollama_client.py
+"""
+Client HTTP Ollama mutualisé (httpx) :
+- pool de connexions keep-alive réutilisé entre requêtes
+- concurrence bornée (OLLAMA_MAX_CONCURRENCY générations simultanées par worker),
+  les requêtes suivantes attendent un créneau au plus OLLAMA_QUEUE_TIMEOUT secondes
+- timeout par requête ; l'annulation de la tâche asyncio (client déconnecté, wait_for)
+  ferme la requête HTTP et libère le créneau
+
+Les routes async utilisent chat() / chat_stream() ; le code synchrone existant passe par chat_sync().
+Les fragments de chat_stream() suivent le format Ollama ({"message": {"content"}, "done"}) quel que
+soit le backend (voir llm_backends.py pour les autres transports).
+
+keep_alive (OLLAMA_KEEP_ALIVE) garde le modèle chargé : Ollama réutilise alors le cache KV
+du préfixe commun (prompt système identique) d'une requête à l'autre. Les compteurs de fin
+de génération (prompt_eval_count/duration...) sont transmis à on_metrics.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaBusyError(RuntimeError):
+    """Aucun créneau de génération libéré dans le délai imparti"""
+
+
+class OllamaClient:
+    name = "ollama"
+    chat_path = "/api/chat"
+
+    def __init__(self, base_url: Optional[str] = None):
+        self.base_url = (base_url or os.getenv("OLLAMA_URL", "http://localhost:11434")).rstrip("/")
+        self.max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+        self.max_connections = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+        self.timeout = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+        self.connect_timeout = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+        self.queue_timeout = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "30"))
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        # Appelé avec (messages, métriques normalisées) à la fin de chaque génération
+        self.on_metrics = None
+
+        # Client async lié à la boucle qui l'a créé (recréé si la boucle change)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self._sync_client: Optional[httpx.Client] = None
+        self._sync_semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.in_flight = 0
+
+    # ------------------- CONNEXIONS -------------------
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections
+        )
+
+    def _timeouts(self, timeout: Optional[float] = None) -> httpx.Timeout:
+        return httpx.Timeout(timeout or self.timeout, connect=self.connect_timeout)
+
+    def _headers(self) -> Dict:
+        return {}
+
+    def _get_async_client(self):
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                base_url=self.base_url, limits=self._limits(), timeout=self._timeouts(), headers=self._headers()
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._async_client, self._semaphore
+
+    def _get_sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(
+                    base_url=self.base_url, limits=self._limits(), timeout=self._timeouts(), headers=self._headers()
+                )
+            return self._sync_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        with self._lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+    # ------------------- FORMAT (surchargé par les autres transports HTTP) -------------------
+    def _payload(self, model: str, messages: List[Dict], options: Optional[Dict], stream: bool = False) -> Dict:
+        return {"model": model, "messages": messages, "stream": stream, "options": options or {},
+                "keep_alive": self.keep_alive}
+
+    def _metrics(self, data: Dict) -> Optional[Dict]:
+        """Compteurs de fin de génération (durées Ollama en nanosecondes -> ms)"""
+        if "prompt_eval_count" not in data and "eval_count" not in data:
+            return None
+        return {
+            "prompt_eval_count": data.get("prompt_eval_count", 0),
+            "prompt_eval_ms": data.get("prompt_eval_duration", 0) / 1e6,
+            "eval_count": data.get("eval_count", 0),
+            "eval_ms": data.get("eval_duration", 0) / 1e6,
+            "load_ms": data.get("load_duration", 0) / 1e6
+        }
+
+    def _report(self, messages: List[Dict], data: Dict):
+        if self.on_metrics is None:
+            return
+        metrics = self._metrics(data)
+        if metrics:
+            try:
+                self.on_metrics(messages, metrics)
+            except Exception as e:
+                logger.warning(f"⚠️  Erreur métriques LLM: {e}")
+
+    def _content(self, data: Dict) -> str:
+        return (data.get("message", {}).get("content") or "").strip()
+
+    def _chunk(self, line: str) -> Optional[Dict]:
+        """Une ligne du flux de réponse -> fragment au format Ollama (None = ligne ignorée)"""
+        return json.loads(line) if line.strip() else None
+
+    # ------------------- CHAT -------------------
+
+    async def chat(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                   timeout: Optional[float] = None) -> str:
+        """POST /api/chat sans bloquer la boucle d'événements"""
+        client, semaphore = self._get_async_client()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise OllamaBusyError(f"Ollama saturé ({self.max_concurrency} générations en cours)")
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+        try:
+            r = await client.post(
+                self.chat_path, json=self._payload(model, messages, options), timeout=self._timeouts(timeout)
+            )
+            r.raise_for_status()
+            data = r.json()
+            self._report(messages, data)
+            return self._content(data)
+        except asyncio.CancelledError:
+            with self._lock:
+                self.cancelled += 1
+            logger.info("⏹️  Génération Ollama annulée")
+            raise
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            semaphore.release()
+
+    async def chat_stream(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                          timeout: Optional[float] = None) -> AsyncIterator[Dict]:
+        """
+        POST /api/chat en streaming : produit chaque fragment NDJSON d'Ollama
+        ({"message": {"content": ...}, "done": false} ... puis le fragment final "done": true).
+        Le timeout s'applique entre deux fragments, pas à la génération entière.
+        """
+        client, semaphore = self._get_async_client()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise OllamaBusyError(f"Ollama saturé ({self.max_concurrency} générations en cours)")
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+        try:
+            async with client.stream(
+                "POST", self.chat_path,
+                json=self._payload(model, messages, options, stream=True),
+                timeout=self._timeouts(timeout)
+            ) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    chunk = self._chunk(line)
+                    if chunk is None:
+                        continue
+                    if chunk.get("done"):
+                        self._report(messages, chunk)
+                    yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            with self._lock:
+                self.cancelled += 1
+            logger.info("⏹️  Génération Ollama annulée")
+            raise
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            semaphore.release()
+
+    def chat_sync(self, model: str, messages: List[Dict], options: Optional[Dict] = None,
+                  timeout: Optional[float] = None) -> str:
+        """Version bloquante (threads du pool FastAPI), avec son propre pool keep-alive"""
+        if not self._sync_semaphore.acquire(timeout=self.queue_timeout):
+            raise OllamaBusyError(f"Ollama saturé ({self.max_concurrency} générations en cours)")
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+        try:
+            r = self._get_sync_client().post(
+                self.chat_path, json=self._payload(model, messages, options), timeout=self._timeouts(timeout)
+            )
+            r.raise_for_status()
+            data = r.json()
+            self._report(messages, data)
+            return self._content(data)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._sync_semaphore.release()
+
+    def get_stats(self) -> Dict:
+        return {
+            "backend": self.name,
+            "requests": self.requests,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency
+        }
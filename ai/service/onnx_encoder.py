@@ -0,0 +1,183 @@
+# ai/service/onnx_encoder.py
+"""
+Encodeur all-MiniLM-L6-v2 servi par ONNX Runtime (sans torch à l'exécution).
+
+- export_onnx() : export du modèle SentenceTransformer (torch) en ONNX, avec en option
+  une quantification dynamique int8 des poids (model_int8.onnx)
+- OnnxEncoder : même interface que SentenceTransformer.encode (tokenizer HF "tokenizers",
+  mean pooling, normalisation L2), sélectionné par EMBEDDING_BACKEND=onnx
+- parity_report() : écart entre deux jeux d'embeddings (cosinus ligne à ligne)
+
+Dépendances optionnelles : onnxruntime + tokenizers pour servir, torch + onnx pour exporter.
+"""
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_ONNX_DIR = os.path.join("data", "onnx", DEFAULT_MODEL)
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+CONFIG_FILE = "encoder_config.json"
+
+
+class OnnxEncoder:
+    """Embeddings de phrases via ONNX Runtime (float32 ou int8)"""
+
+    def __init__(self, path: Optional[str] = None, quantized: Optional[bool] = None,
+                 threads: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError:
+            raise RuntimeError("EMBEDDING_BACKEND=onnx nécessite onnxruntime et tokenizers "
+                               "(pip install onnxruntime tokenizers)")
+
+        self.path = path or os.getenv("EMBEDDING_ONNX_DIR", DEFAULT_ONNX_DIR)
+        if quantized is None:
+            quantized = os.getenv("EMBEDDING_ONNX_QUANTIZED", "0") == "1"
+        model_file = os.path.join(self.path, QUANTIZED_FILE if quantized else MODEL_FILE)
+        config_file = os.path.join(self.path, CONFIG_FILE)
+        if not os.path.exists(model_file) or not os.path.exists(config_file):
+            raise RuntimeError(f"Modèle ONNX introuvable dans {self.path} "
+                               f"(python export_onnx_encoder.py{' --quantize' if quantized else ''})")
+
+        with open(config_file, "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.quantized = quantized
+        self.normalize = self.config.get("normalize", True)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.path, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_id"], pad_token=self.config["pad_token"])
+
+        options = ort.SessionOptions()
+        threads = threads if threads is not None else int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_file, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        logger.info(f"✅ Encodeur ONNX chargé: {model_file}")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dim"]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               convert_to_numpy: bool = True, **_) -> np.ndarray:
+        """Équivalent de SentenceTransformer.encode (toujours un tableau numpy float32)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.config["dim"]), dtype="float32")
+
+        batches = [self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        embeddings = np.vstack(batches)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype="int64"),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype="int64"),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype="int64"),
+        }
+        hidden = self.session.run(None, {k: v for k, v in inputs.items() if k in self.input_names})[0]
+
+        # Mean pooling sur les tokens réels (hors padding), comme le module Pooling
+        mask = inputs["attention_mask"][:, :, None].astype("float32")
+        embeddings = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype("float32")
+
+
+def export_onnx(output_dir: str = DEFAULT_ONNX_DIR, model_name: str = DEFAULT_MODEL,
+                quantize: bool = False, opset: int = 14) -> Dict[str, str]:
+    """Exporte le modèle SentenceTransformer (torch) en ONNX ; retourne les fichiers produits"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = model[0], model[1]
+    pooling_config = pooling.get_config_dict()
+    if not (pooling_config.get("pooling_mode_mean_tokens") or pooling_config.get("pooling_mode") == "mean"):
+        raise RuntimeError(f"{model_name} : seul le mean pooling est pris en charge")
+
+    class _Wrapper(torch.nn.Module):
+        # Sortie tensorielle simple (last_hidden_state) pour l'export
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.auto_model(input_ids=input_ids, attention_mask=attention_mask,
+                                   token_type_ids=token_type_ids)[0]
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_file = os.path.join(output_dir, MODEL_FILE)
+    sample = model.tokenizer(["exemple de phrase"], return_tensors="pt")
+    inputs = tuple(sample.get(name, torch.zeros_like(sample["input_ids"]))
+                   for name in ("input_ids", "attention_mask", "token_type_ids"))
+    axes = {0: "batch", 1: "sequence"}
+    torch.onnx.export(
+        _Wrapper(transformer.auto_model).eval(),
+        inputs,
+        model_file,
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={"input_ids": axes, "attention_mask": axes, "token_type_ids": axes,
+                      "last_hidden_state": axes},
+        opset_version=opset,
+    )
+    files = {"model": model_file}
+
+    model.tokenizer.save_pretrained(output_dir)
+    config = {
+        "model": model_name,
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "pad_token": model.tokenizer.pad_token,
+        "pad_id": model.tokenizer.pad_token_id,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+    }
+    with open(os.path.join(output_dir, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        files["quantized"] = os.path.join(output_dir, QUANTIZED_FILE)
+        quantize_dynamic(model_file, files["quantized"], weight_type=QuantType.QInt8)
+
+    logger.info(f"✅ Encodeur exporté en ONNX: {', '.join(files.values())}")
+    return files
+
+
+def parity_report(reference: np.ndarray, candidate: np.ndarray, k: int = 5) -> Dict[str, float]:
+    """
+    Cosinus entre embeddings de référence (torch) et candidats (ONNX), et recouvrement
+    des k plus proches voisins de chaque texte parmi les autres
+    """
+    ref = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    cand = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosines = (ref * cand).sum(axis=1)
+
+    k = min(k, len(ref) - 1)
+    overlap = 1.0
+    if k > 0:
+        top_ref = np.argsort(-(ref @ ref.T), axis=1)[:, 1:k + 1]
+        top_cand = np.argsort(-(cand @ cand.T), axis=1)[:, 1:k + 1]
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(top_ref, top_cand)]))
+
+    return {
+        "texts": len(ref),
+        "cosine_min": round(float(cosines.min()), 5),
+        "cosine_mean": round(float(cosines.mean()), 5),
+        "neighbors_overlap": round(overlap, 4),
+    }
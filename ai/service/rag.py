@@ -1,38 +1,48 @@
 # ai/service/rag.py
 import logging
 import io
-from typing import List, Tuple, Optional
-from sentence_transformers import SentenceTransformer
+import os
+import threading
+import time
+from typing import List, Tuple, Optional, Dict, Any
 import numpy as np
 
-from .vector_store import VectorStore
+from .vector_store import VectorStore, content_key, normalized_content_hash
 from .rag_enhancer import rag_enhancer
 from .hybrid_search import HybridSearch
+from .embedding_cache import query_embedding_cache
+from .embedding_batcher import query_embedding_batcher
+from .embedding import get_encoder
+from .confidence_calibration import ConfidenceCalibrator
+from .executors import run_in_executor
 
 logger = logging.getLogger(__name__)
 
-# Singleton pour le modèle d'embedding (éviter chargements multiples)
-_embedding_model_cache = None
-
-def get_embedding_model():
-    """Retourne le modèle d'embedding (singleton)"""
-    global _embedding_model_cache
-    if _embedding_model_cache is None:
-        logger.info("Chargement initial du modèle d'embedding...")
-        _embedding_model_cache = SentenceTransformer("all-MiniLM-L6-v2")
-        logger.info("✅ Modèle d'embedding chargé: all-MiniLM-L6-v2")
-    return _embedding_model_cache
+# Singleton pour le RAGService (un seul index FAISS en mémoire par processus)
+_rag_service_instance = None
+_rag_service_lock = threading.Lock()
 
 class RAGService:
     """
     RAGService : Retrieval-Augmented Generation
     Utilise un index FAISS pour retrouver les documents pertinents
-    et un modèle SentenceTransformer pour générer des embeddings.
+    et un encodeur de phrases (ai/service/embedding.py) pour générer des embeddings.
     """
     def __init__(self):
         logger.info("Initialisation du RAGService...")
-        self.embedding_model = get_embedding_model()
-        self.vector_store = VectorStore(dim=384)
+        self.encoder = get_encoder()
+        self.vector_store = VectorStore(dim=self.encoder.dim)
+        # Taille des mini-lots envoyés à l'encodeur pendant l'ingestion
+        self.embed_batch_size = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+        # Similarité → probabilité de pertinence (si un jeu étiqueté a été calibré)
+        self.calibrator = ConfidenceCalibrator()
+        # Sous le seuil de confiance, un résultat BM25 ne suffit que s'il couvre
+        # cette part du poids IDF des termes de la question
+        self.min_keyword_coverage = float(os.getenv("RAG_BM25_MIN_COVERAGE", "0.6"))
+        # Requêtes concurrentes encodées par lots (EMBED_BATCH_*)
+        query_embedding_batcher.attach_encoder(self.embed)
+        # Vecteurs de requête en cache propres à ce modèle
+        query_embedding_cache.attach_encoder(self.encoder)
         logger.info("Index FAISS et métadonnées chargés avec succès.")
 
     # =========================
@@ -42,16 +52,69 @@ class RAGService:
         """
         Ajouter des textes/documents à l'index FAISS
         """
-        embeddings = self.embed(texts)
-        metadata = [{"source": source, "text": txt} for txt in texts]
-        self.vector_store.add(embeddings, metadata)
-        logger.info(f"{len(texts)} documents ingérés dans l'index.")
+        return self.ingest_many([{"text": txt, "source": source} for txt in texts])
+
+    def ingest_many(self, records: List[Dict[str, Any]], batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ingestion par lot : chaque record est un dict {"text": ..., "source": ..., **métadonnées},
+        avec en option "doc_key", identifiant stable du passage (ex: catégorie + langue + question).
+        
+        Ingestion idempotente : chaque passage reçoit une empreinte de son contenu normalisé.
+        - même clé (ou, sans clé, même contenu dans la même langue et catégorie) et même
+          empreinte : ignoré (unchanged)
+        - même clé, contenu modifié : le document est remplacé (updated)
+        - sinon : ajouté (added)
+        Seuls les passages ajoutés ou modifiés sont encodés (par mini-lots, via le cache disque
+        des embeddings) puis écrits dans l'index en une seule opération.
+        Retourne un rapport avec les compteurs par statut et le débit (docs/s).
+        """
+        start = time.perf_counter()
+        records = [r for r in records if (r.get("text") or "").strip()]
+        report = {"ingested": 0, "added": 0, "updated": 0, "unchanged": 0, "duplicates": 0}
+
+        # Un seul passage par clé (le dernier) et par contenu dans une partition (le premier) dans le lot
+        by_key, seen_hashes = {}, set()
+        for r in records:
+            meta = {**r, "source": r.get("source", "unknown"), "content_hash": normalized_content_hash(r["text"])}
+            doc_key, scope = content_key(meta)
+            by_key.pop(doc_key, None)
+            by_key[doc_key] = ({**meta, "doc_key": doc_key}, scope)
+        metadata = []
+        for meta, scope in by_key.values():
+            if scope not in seen_hashes:
+                seen_hashes.add(scope)
+                metadata.append(meta)
+        report["duplicates"] = len(records) - len(metadata)
+
+        statuses = self.vector_store.classify(metadata)
+        to_write = [meta for meta, status in zip(metadata, statuses) if status != "unchanged"]
+        report["unchanged"] = len(metadata) - len(to_write)
+        if to_write:
+            batch_size = batch_size or self.embed_batch_size
+            embeddings = self.encoder.encode_documents([m["text"] for m in to_write], batch_size=batch_size)
+            written = self.vector_store.upsert(embeddings, to_write)
+            report["added"] = len(written["added"])
+            report["updated"] = len(written["updated"])
+            report["unchanged"] += len(written["unchanged"])
+        report["ingested"] = report["added"] + report["updated"]
+
+        elapsed = time.perf_counter() - start
+        report["seconds"] = round(elapsed, 3)
+        report["docs_per_second"] = round(len(records) / elapsed, 1) if elapsed > 0 else float(len(records))
+        logger.info(
+            f"Ingestion: {report['added']} ajoutés, {report['updated']} mis à jour, "
+            f"{report['unchanged']} inchangés, {report['duplicates']} doublons du lot "
+            f"({report['docs_per_second']} docs/s)."
+        )
+        return report
 
     def ask(self, query: str, k: int = 5, language: str = None, category: str = None, min_confidence: float = 0.40) -> Tuple[str, str]:
         """
         Récupérer une réponse pertinente et le contexte
         Filtre par langue et catégorie si spécifiés
         min_confidence: seuil de similarité (0-1). Plus bas = plus permissif. Défaut 0.40
+        Si une calibration existe pour la métrique de l'index, c'est la probabilité calibrée
+        qui est comparée à RAG_MIN_PROBABILITY (min_confidence est alors ignoré).
         
         AMÉLIORÉ avec enrichissement de requête et re-ranking hybride
         """
@@ -59,133 +122,61 @@ class RAGService:
         enriched_query = rag_enhancer.enrich_query(query, category)
         logger.info(f"📝 Requête enrichie: '{enriched_query[:100]}'")
         
-        query_vector = self.embed([enriched_query])
+        results, similarities, category_filter = self._vector_search(enriched_query, k, language, category)
         
-        # Rechercher plus de résultats pour re-ranking
-        search_k = k * 3 if (language or category) else k
-        results, scores = self.vector_store.search(query_vector, k=search_k, return_scores=True)
+        # 🔥 Recherche BM25 en parallèle (question ORIGINALE, pas enrichie, pour les mots-clés)
+        keyword_results = self.vector_store.keyword_search(
+            query, k=k, language=language, category=category_filter
+        )
 
-        if not results:
+        if not results and not keyword_results:
             return "Je n'ai pas trouvé d'information sur ce sujet. Pourriez-vous reformuler votre question ?", ""
         
-        # Convertir distance L2 en score de similarité (0-1)
-        # Distance L2: 0 = identique, plus grand = plus différent
-        # On normalise: similarité = 1 / (1 + distance)
-        similarities = [1.0 / (1.0 + d) for d in scores]
-        
-        # Vérifier si le meilleur résultat dépasse le seuil
+        # Vérifier si le meilleur résultat dépasse le seuil (similarité brute ou probabilité calibrée)
         best_similarity = max(similarities) if similarities else 0.0
-        logger.info(f"📊 Meilleure similarité: {best_similarity:.3f} (seuil: {min_confidence})")
+        confidence, threshold = self._confidence(best_similarity, min_confidence)
+        logger.info(
+            f"📊 Meilleure similarité: {best_similarity:.3f}, confiance: {confidence:.3f} "
+            f"(seuil: {threshold}), {len(keyword_results)} résultats BM25"
+        )
         
-        if best_similarity < min_confidence:
-            logger.warning(f"❌ Similarité trop faible ({best_similarity:.3f} < {min_confidence})")
-            return "Je ne suis pas sûr de comprendre votre question. Pourriez-vous la reformuler ou choisir un sujet parmi les catégories disponibles ?", ""
-
-        # Filtrer par langue ET catégorie si spécifiées, en gardant les scores
-        # ⚠️ IMPORTANT: Si category='general', on filtre SEULEMENT par langue (pas de filtre catégorie)
-        if language or (category and category.lower() != 'general'):
-            filtered_results = []
-            filtered_scores = []
-            for idx, r in enumerate(results):
-                source = r.get("source", "")
-                
-                # Critères de filtrage
-                lang_match = True
-                cat_match = True
-                
-                # Vérifier la langue (ex: admin-json-Histoire-fr)
-                if language:
-                    lang_match = f"-{language}" in source
-                
-                # Vérifier la catégorie (ex: admin-json-Agriculture-fr)
-                # ⚠️ On ignore si category='general'
-                if category and category.lower() != 'general':
-                    # Normaliser : enlever accents, espaces, tirets, tout en minuscule pour comparaison
-                    import unicodedata
-                    def normalize_text(text):
-                        # Enlever accents
-                        text = unicodedata.normalize('NFD', text)
-                        text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
-                        return text.lower().replace(' ', '').replace('&', '').replace('-', '')
-                    
-                    cat_norm = normalize_text(category)
-                    source_norm = normalize_text(source)
-                    
-                    # Chercher la catégorie normalisée dans la source normalisée
-                    cat_match = cat_norm in source_norm
-                    
-                    if len(filtered_results) == 0:  # Logger TOUS les tests jusqu'à trouver un match
-                        logger.info(f"🔍 Test #{len([r for r in results[:20] if r == r])+1} source: {source}")
-                        logger.info(f"   Cat demandée: '{category}' → '{cat_norm}'")
-                        logger.info(f"   Source norm: '{source_norm}'")
-                        logger.info(f"   Match: {cat_match}")
-                
-                # Ajouter si les deux critères sont respectés
-                if lang_match and cat_match:
-                    filtered_results.append(r)
-                    filtered_scores.append(similarities[idx] if idx < len(similarities) else 0.0)
-                
-                # Limiter au nombre demandé
-                if len(filtered_results) >= k:
-                    break
-            
-            # Si aucun résultat avec filtres, essayer SANS filtre catégorie
-            if len(filtered_results) == 0:
-                logger.warning(f"⚠️ Aucun résultat pour catégorie={category}")
-                logger.info(f"🔄 Nouvelle recherche SANS filtre de catégorie...")
-                
-                # Recommencer la recherche sans filtre de catégorie
-                filtered_results = []
-                filtered_scores = []
-                for idx, r in enumerate(results):
-                    source = r.get("source", "")
-                    
-                    # Filtrer SEULEMENT par langue
-                    lang_match = True
-                    if language:
-                        lang_match = f"-{language}" in source
-                    
-                    if lang_match:
-                        filtered_results.append(r)
-                        filtered_scores.append(similarities[idx] if idx < len(similarities) else 0.0)
-                    
-                    if len(filtered_results) >= k:
-                        break
-                
-                # Si toujours rien, retourner message d'erreur
-                if len(filtered_results) == 0:
-                    logger.error(f"❌ Aucun résultat même sans filtre catégorie")
-                    return "Je n'ai pas trouvé d'information sur ce sujet. Pourriez-vous reformuler votre question ?", ""
-                else:
-                    logger.info(f"✅ {len(filtered_results)} résultats trouvés sans filtre catégorie")
-                    results = filtered_results
-                    similarities = filtered_scores
-            else:
-                results = filtered_results
-                similarities = filtered_scores
+        # Sous le seuil, les voisins vectoriels sont écartés ; seuls restent les résultats BM25
+        # contenant l'essentiel des termes rares de la question (un mot commun isolé ne suffit pas).
+        # Sans résultat, pas de fusion ni d'appel LLM : le contexte renvoyé est vide.
+        if confidence < threshold:
+            coverage = self.vector_store.keyword_coverage(query, [r["doc_id"] for r in keyword_results])
+            keyword_results = [r for r in keyword_results if coverage[r["doc_id"]] >= self.min_keyword_coverage]
+            if not keyword_results:
+                logger.warning(
+                    f"❌ Confiance trop faible ({confidence:.3f} < {threshold}), "
+                    f"couverture BM25 max {max(coverage.values(), default=0.0):.2f}"
+                )
+                return "Je ne suis pas sûr de comprendre votre question. Pourriez-vous la reformuler ou choisir un sujet parmi les catégories disponibles ?", ""
+            logger.info(f"🔑 Similarité faible, réponse à partir de {len(keyword_results)} résultats BM25")
+            results = []
         
-        # 🔥 NOUVEAU : Re-ranking hybride (sémantique + mots-clés)
-        logger.info(f"🎯 Re-ranking hybride de {len(results)} résultats...")
-        results, similarities = HybridSearch.rerank_results(
-            query=query,  # Question ORIGINALE (pas enrichie) pour les mots-clés
-            results=results,
-            semantic_scores=similarities,
-            keyword_weight=0.5  # 50% mots-clés, 50% sémantique
-        )
-        logger.info(f"✅ Re-ranking terminé. Top score: {similarities[0]:.3f}")
+        # 🔥 Fusion des classements vectoriel et BM25 (Reciprocal Rank Fusion)
+        documents = {r["doc_id"]: r for r in keyword_results + results}
+        fused = HybridSearch.reciprocal_rank_fusion([
+            [r["doc_id"] for r in results],
+            [r["doc_id"] for r in keyword_results],
+        ])
+        results = [documents[doc_id] for doc_id, _ in fused]
+        similarities = [score for _, score in fused]
+        logger.info(f"✅ Fusion RRF de {len(results)} résultats. Top score: {similarities[0]:.4f}")
         
         # Prendre les k meilleurs résultats après re-ranking
         results = results[:k]
         similarities = similarities[:k]
         
-        # Extraire le texte des résultats, fusionner et limiter la répétition
+        # Extraire le texte des résultats (un document par identifiant après la fusion ; les contenus
+        # identiques sont écartés à l'ingestion, VectorStore.upsert, et par /api/admin/rag/compact)
         context_texts = []
         answer_only_texts = []  # SEULEMENT les réponses, AUCUNE question
-        seen_texts = set()
         
         for r in results:
             txt = r.get("text", "")
-            if txt and txt not in seen_texts:
+            if txt:
                 # Parser pour séparer question et réponse
                 if "\n\n" in txt:
                     parts = txt.split("\n\n", 1)
@@ -197,16 +188,13 @@ class RAGService:
                         context_texts.append(f"Q: {question_part}\nR: {answer_part}")
                         # Mais ENVOYER AU LLM SEULEMENT LA RÉPONSE!
                         answer_only_texts.append(answer_part)
-                        seen_texts.add(txt)
                     else:
                         context_texts.append(txt)
                         answer_only_texts.append(txt)
-                        seen_texts.add(txt)
                 else:
                     # Pas de séparation Q/R claire
                     context_texts.append(txt)
                     answer_only_texts.append(txt)
-                    seen_texts.add(txt)
 
         # IMPORTANT: Le contexte envoyé au LLM contient SEULEMENT les réponses
         # Pas de questions pour éviter confusion!
@@ -219,6 +207,57 @@ class RAGService:
         
         return "Aucune information pertinente trouvée.", ""
 
+    def _vector_search(self, query: str, k: int, language: str = None, category: str = None):
+        """
+        Recherche vectorielle filtrée par langue ET catégorie AVANT la recherche (partitions du VectorStore).
+        Retourne (résultats, similarités, filtre de catégorie appliqué).
+        """
+        query_vector = self.embed_query(query)
+        
+        # ⚠️ IMPORTANT: Si category='general', on filtre SEULEMENT par langue (pas de filtre catégorie)
+        category_filter = category if category and category.lower() != 'general' else None
+        if category_filter and not self.vector_store.count(language=language, category=category_filter):
+            logger.warning(f"⚠️ Aucun document pour catégorie={category}, recherche SANS filtre de catégorie")
+            category_filter = None
+        
+        results, scores = self.vector_store.search(
+            query_vector, k=k, return_scores=True,
+            language=language, category=category_filter
+        )
+        # Distance L2 → 1 / (1 + d), ou similarité cosinus directe (index normalisé)
+        return results, self.vector_store.to_similarity(scores), category_filter
+
+    def _confidence(self, best_similarity: float, min_confidence: float) -> Tuple[float, float]:
+        """(confiance, seuil) : probabilité calibrée si disponible pour la métrique de l'index"""
+        if self.calibrator.applies_to(self.vector_store.base_metric):
+            return self.calibrator.probability(best_similarity), self.calibrator.min_probability
+        return best_similarity, min_confidence
+
+    def calibrate(self, samples: List[Dict[str, Any]], save: bool = True) -> Dict[str, Any]:
+        """
+        Ajuste la correspondance similarité → probabilité sur des questions étiquetées :
+        {"question", "language"?, "category"?, "answerable": bool, "expected_source"?}.
+        Avec expected_source, la question ne compte comme pertinente que si le meilleur
+        document vient de cette source.
+        """
+        similarities, labels = [], []
+        for sample in samples:
+            enriched_query = rag_enhancer.enrich_query(sample["question"], sample.get("category"))
+            results, sims, _ = self._vector_search(
+                enriched_query, 1, sample.get("language"), sample.get("category")
+            )
+            label = bool(sample.get("answerable", True))
+            if label and sample.get("expected_source"):
+                label = bool(results) and sample["expected_source"] in results[0].get("source", "")
+            similarities.append(sims[0] if sims else 0.0)
+            labels.append(label)
+
+        report = self.calibrator.fit(similarities, labels, metric=self.vector_store.base_metric)
+        if save:
+            self.calibrator.save(report)
+        logger.info(f"✅ Calibration de confiance: {report}")
+        return report
+
     # =========================
     # Analyse PDF / Documents
     # =========================
@@ -257,6 +296,13 @@ class RAGService:
         else:
             logger.warning("Aucun texte détecté dans l'image.")
 
+    async def ask_async(self, query: str, **kwargs) -> Tuple[str, str]:
+        """
+        Version async de ask() pour les routes FastAPI : l'embedding et la recherche FAISS
+        tournent dans le pool borné "rag" (RAG_EXECUTOR_WORKERS) au lieu de bloquer la boucle
+        """
+        return await run_in_executor("rag", self.ask, query, **kwargs)
+
     # =========================
     # Embedding
     # =========================
@@ -264,7 +310,18 @@ class RAGService:
         """
         Retourne les embeddings pour une liste de textes
         """
-        return self.embedding_model.encode(texts, convert_to_numpy=True)
+        return self.encoder.encode(texts)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embedding d'une requête (1 x dim), via le cache LRU/TTL partagé
+        puis le micro-batching des requêtes concurrentes
+        """
+        vector = query_embedding_cache.get(query)
+        if vector is None:
+            vector = query_embedding_batcher.encode(query)
+            query_embedding_cache.set(query, vector)
+        return np.asarray(vector, dtype="float32").reshape(1, -1)
     
     def _enrich_query(self, query: str, category: str = None) -> str:
         """
@@ -314,3 +371,17 @@ class RAGService:
             logger.info(f"🔍 Question enrichie: '{query}' + '{keywords}' (catégorie: {category})")
             return f"{query} {keywords}"
         return query
+
+
+def get_rag_service() -> RAGService:
+    """Retourne le RAGService partagé du processus (singleton).
+
+    main.py et les routers /ai utilisent la même instance : un seul index FAISS
+    en mémoire, et les écritures sont visibles immédiatement partout.
+    """
+    global _rag_service_instance
+    if _rag_service_instance is None:
+        with _rag_service_lock:
+            if _rag_service_instance is None:
+                _rag_service_instance = RAGService()
+    return _rag_service_instance
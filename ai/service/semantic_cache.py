@@ -0,0 +1,112 @@
+# ai/service/semantic_cache.py
+"""
+Cache sémantique des réponses LLM : une question proche d'une question déjà traitée
+("comment utiliser le moringa ?" / "comment utiliser moringa") réutilise la réponse
+au lieu de relancer Ollama.
+
+- Un petit index FAISS (produit scalaire sur vecteurs normalisés) par (langue, catégorie)
+- Hit si la similarité cosinus >= SEMANTIC_CACHE_THRESHOLD
+- Éviction LRU (SEMANTIC_CACHE_SIZE entrées) et expiration (SEMANTIC_CACHE_TTL)
+- En mémoire, propre à chaque worker (le cache exact Redis d'AIBrain reste consulté en premier)
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .index_factory import make_flat_index, normalize_vectors
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache:
+    """Réponses mises en cache, retrouvées par similarité de la question"""
+
+    def __init__(self, threshold: Optional[float] = None, max_size: Optional[int] = None, ttl: Optional[int] = None):
+        self.threshold = threshold or float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+        self.max_size = max_size or int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+        self.ttl = ttl or int(os.getenv("SEMANTIC_CACHE_TTL", os.getenv("CACHE_TTL", "3600")))
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "1") != "0"
+        # (langue, catégorie) -> index FAISS ; id -> (expiration, partition, question, réponse)
+        self._indexes: Dict[Tuple[str, str], object] = {}
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _partition(language: str, category: Optional[str]) -> Tuple[str, str]:
+        return (language or "fr", (category or "general").lower())
+
+    def _remove(self, entry_id: int):
+        _, partition, _, _ = self._entries.pop(entry_id)
+        self._indexes[partition].remove_ids(np.array([entry_id], dtype="int64"))
+
+    def get(self, vector: np.ndarray, language: str, category: Optional[str]) -> Optional[Tuple[Dict, float, str]]:
+        """(réponse, similarité, question d'origine) de la question la plus proche, ou None"""
+        if not self.enabled:
+            return None
+        partition = self._partition(language, category)
+        query = normalize_vectors(np.asarray(vector).reshape(1, -1))
+        with self._lock:
+            index = self._indexes.get(partition)
+            if index is None or index.ntotal == 0:
+                self.misses += 1
+                return None
+            similarities, ids = index.search(query, 1)
+            entry_id, similarity = int(ids[0][0]), float(similarities[0][0])
+            if entry_id < 0 or similarity < self.threshold:
+                self.misses += 1
+                return None
+            expires_at, _, question, response = self._entries[entry_id]
+            if expires_at <= time.monotonic():
+                self._remove(entry_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return response, similarity, question
+
+    def set(self, vector: np.ndarray, language: str, category: Optional[str], question: str, response: Dict):
+        if not self.enabled:
+            return
+        partition = self._partition(language, category)
+        vector = normalize_vectors(np.asarray(vector).reshape(1, -1))
+        with self._lock:
+            index = self._indexes.get(partition)
+            if index is None:
+                index = self._indexes[partition] = make_flat_index(vector.shape[1], "cosine")
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = (time.monotonic() + self.ttl, partition, question, response)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate_percent": round(self.hits / total * 100, 2) if total else 0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl
+            }
+
+
+# INSTANCE GLOBALE
+semantic_response_cache = SemanticResponseCache()
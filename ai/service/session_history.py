@@ -0,0 +1,127 @@
+# ai/service/session_history.py
+"""
+Historique conversationnel par session (clé = session_id de ChatRequest).
+
+- En mémoire : LRU borné (SESSION_HISTORY_MAX_SESSIONS sessions) avec expiration
+  (SESSION_HISTORY_TTL), chaque session étant un deque borné (ajout/rognage en O(1))
+- Avec Redis (connexion d'AIBrain) : une liste par session, RPUSH + LTRIM + EXPIRE
+  en un seul aller-retour, partagée entre workers
+- Le résumé injecté dans le prompt est compressé dans un budget de tokens (context_packer)
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Session utilisée quand l'appelant ne fournit pas de session_id (scripts, tests)
+DEFAULT_SESSION = "default"
+
+
+class SessionHistoryStore:
+    """Derniers messages {"role", "content", "timestamp"} de chaque session"""
+
+    def __init__(self, max_messages: Optional[int] = None, max_sessions: Optional[int] = None,
+                 ttl: Optional[int] = None):
+        # 5 échanges utilisateur/assistant par défaut (comme l'ancien historique global)
+        self.max_messages = max_messages or int(os.getenv("SESSION_HISTORY_MAX_MESSAGES", "10"))
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_HISTORY_MAX_SESSIONS", "5000"))
+        self.ttl = ttl or int(os.getenv("SESSION_HISTORY_TTL", "3600"))
+        self.redis_client = None
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def attach_redis(self, redis_client):
+        """Partage l'historique entre workers via Redis (None = mémoire seule)"""
+        self.redis_client = redis_client
+
+    @staticmethod
+    def _redis_key(session_id: str) -> str:
+        return f"yingr_hist:{session_id}"
+
+    # ------------------- LECTURE / ÉCRITURE -------------------
+    def append(self, session_id: Optional[str], role: str, content: str):
+        session_id = session_id or DEFAULT_SESSION
+        message = {"role": role, "content": content, "timestamp": datetime.now().isoformat()}
+
+        if self.redis_client is not None:
+            try:
+                key = self._redis_key(session_id)
+                pipe = self.redis_client.pipeline()
+                pipe.rpush(key, json.dumps(message, ensure_ascii=False))
+                pipe.ltrim(key, -self.max_messages, -1)
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"⚠️  Erreur écriture historique Redis: {e}")
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            messages = entry[1] if entry is not None and entry[0] > now else deque(maxlen=self.max_messages)
+            messages.append(message)
+            self._sessions[session_id] = (now + self.ttl, messages)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, session_id: Optional[str]) -> List[Dict]:
+        session_id = session_id or DEFAULT_SESSION
+
+        if self.redis_client is not None:
+            try:
+                return [json.loads(m) for m in self.redis_client.lrange(self._redis_key(session_id), 0, -1)]
+            except Exception as e:
+                logger.warning(f"⚠️  Erreur lecture historique Redis: {e}")
+
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            if entry[0] <= time.monotonic():
+                del self._sessions[session_id]
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def clear(self, session_id: Optional[str] = None):
+        """Efface une session, ou toutes les sessions locales si session_id est None"""
+        if session_id is None:
+            with self._lock:
+                self._sessions.clear()
+            if self.redis_client is not None:
+                self._clear_redis(DEFAULT_SESSION)
+            return
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.redis_client is not None:
+            self._clear_redis(session_id)
+
+    def _clear_redis(self, session_id: str):
+        try:
+            self.redis_client.delete(self._redis_key(session_id))
+        except Exception as e:
+            logger.warning(f"⚠️  Erreur suppression historique Redis: {e}")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "max_messages": self.max_messages,
+                "ttl_seconds": self.ttl,
+                "evictions": self.evictions,
+                "redis_active": self.redis_client is not None
+            }
+
+
+# INSTANCE GLOBALE
+session_history_store = SessionHistoryStore()
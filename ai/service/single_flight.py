@@ -0,0 +1,213 @@
+# ai/service/single_flight.py
+"""
+Regroupement des générations identiques en cours ("single-flight").
+
+Quand une question populaire arrive en rafale, toutes les requêtes ratent le cache
+en même temps : seule la première lance Ollama, les suivantes attendent son résultat.
+
+- Dans le worker : asyncio.Future par clé (routes async), threading.Event (code synchrone)
+- Entre workers (Redis) : verrou SET NX EX par clé ; les autres workers interrogent
+  le cache de réponses jusqu'à ce que le premier l'ait rempli (ou abandonné)
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# Le premier appelant a échoué ou a été annulé : chacun génère pour soi
+_RETRY = object()
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock_ttl = int(os.getenv("SINGLE_FLIGHT_LOCK_TTL", "150"))
+        self.wait_timeout = float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", "120"))
+        self.poll_interval = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", "0.2"))
+        self.redis_client = None
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._events: Dict[str, Tuple[threading.Event, list]] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.coalesced_remote = 0
+
+    def attach_redis(self, redis_client):
+        """Regroupement entre workers via Redis (None = dans le worker seulement)"""
+        self.redis_client = redis_client
+
+    # ------------------- DANS LE WORKER (ASYNC) -------------------
+    def join(self, key: str) -> Optional[asyncio.Future]:
+        """Génération en cours pour cette clé dans la boucle courante, sinon None"""
+        future = self._futures.get(key)
+        if future is not None and future.get_loop() is asyncio.get_running_loop() and not future.done():
+            return future
+        return None
+
+    def lead(self, key: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._futures[key] = future
+        self.leaders += 1
+        return future
+
+    def resolve(self, key: str, future: asyncio.Future, result=_RETRY):
+        """Publie le résultat aux appelants en attente (_RETRY si échec / annulation)"""
+        if not future.done():
+            future.set_result(result)
+        if self._futures.get(key) is future:
+            del self._futures[key]
+
+    async def wait(self, future: asyncio.Future):
+        """Résultat du premier appelant, ou None s'il faut générer soi-même"""
+        # shield : l'annulation d'un appelant en attente n'annule pas les autres
+        result = await asyncio.shield(future)
+        if result is _RETRY:
+            return None
+        self.coalesced += 1
+        return result
+
+    async def do(self, key: str, generate: Callable[[], Awaitable],
+                 lookup: Optional[Callable[[], Optional[Dict]]] = None) -> Tuple[object, bool]:
+        """
+        Exécute generate() une seule fois par clé. Retourne (résultat, partagé) ;
+        lookup() relit le cache de réponses quand un autre worker génère.
+        """
+        future = self.join(key)
+        if future is not None:
+            result = await self.wait(future)
+            if result is not None:
+                return result, True
+
+        future = self.lead(key)
+        result = _RETRY
+        try:
+            remote = await self._wait_remote_async(key, lookup)
+            if remote is not None:
+                result = remote
+                return remote, True
+            token = self._acquire_remote(key)
+            try:
+                result = await generate()
+            finally:
+                self._release_remote(key, token)
+            return result, False
+        finally:
+            self.resolve(key, future, result)
+
+    # ------------------- DANS LE WORKER (THREADS) -------------------
+    def do_sync(self, key: str, generate: Callable[[], object],
+                lookup: Optional[Callable[[], Optional[Dict]]] = None) -> Tuple[object, bool]:
+        """Équivalent bloquant de do() pour le code synchrone (pool de threads)"""
+        with self._lock:
+            pending = self._events.get(key)
+            if pending is None:
+                pending = self._events[key] = (threading.Event(), [_RETRY])
+                leader = True
+                self.leaders += 1
+            else:
+                leader = False
+
+        event, holder = pending
+        if not leader:
+            event.wait(self.wait_timeout)
+            if holder[0] is not _RETRY:
+                with self._lock:
+                    self.coalesced += 1
+                return holder[0], True
+            return generate(), False
+
+        try:
+            remote = self._wait_remote(key, lookup)
+            if remote is not None:
+                holder[0] = remote
+                return remote, True
+            token = self._acquire_remote(key)
+            try:
+                holder[0] = generate()
+            finally:
+                self._release_remote(key, token)
+            return holder[0], False
+        finally:
+            with self._lock:
+                del self._events[key]
+            event.set()
+
+    # ------------------- ENTRE WORKERS (REDIS) -------------------
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"yingr_flight:{key}"
+
+    def _remote_busy(self, key: str) -> bool:
+        if self.redis_client is None:
+            return False
+        try:
+            return bool(self.redis_client.exists(self._redis_key(key)))
+        except Exception as e:
+            logger.warning(f"⚠️  Erreur verrou single-flight Redis: {e}")
+            return False
+
+    def _acquire_remote(self, key: str) -> Optional[str]:
+        if self.redis_client is None:
+            return None
+        token = uuid4().hex
+        try:
+            self.redis_client.set(self._redis_key(key), token, nx=True, ex=self.lock_ttl)
+        except Exception as e:
+            logger.warning(f"⚠️  Erreur verrou single-flight Redis: {e}")
+        return token
+
+    def _release_remote(self, key: str, token: Optional[str]):
+        if token is None:
+            return
+        try:
+            # Ne supprimer que notre propre verrou (il a pu expirer et être repris)
+            if self.redis_client.get(self._redis_key(key)) == token:
+                self.redis_client.delete(self._redis_key(key))
+        except Exception as e:
+            logger.warning(f"⚠️  Erreur verrou single-flight Redis: {e}")
+
+    def _poll_remote(self, key: str, lookup, deadline: float) -> Tuple[bool, Optional[Dict]]:
+        """(continuer à attendre, résultat trouvé dans le cache)"""
+        result = lookup()
+        if result is not None:
+            with self._lock:
+                self.coalesced_remote += 1
+            return False, result
+        return self._remote_busy(key) and time.monotonic() < deadline, None
+
+    async def _wait_remote_async(self, key: str, lookup) -> Optional[Dict]:
+        if lookup is None or not self._remote_busy(key):
+            return None
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            waiting, result = self._poll_remote(key, lookup, deadline)
+            if not waiting:
+                return result
+
+    def _wait_remote(self, key: str, lookup) -> Optional[Dict]:
+        if lookup is None or not self._remote_busy(key):
+            return None
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            time.sleep(self.poll_interval)
+            waiting, result = self._poll_remote(key, lookup, deadline)
+            if not waiting:
+                return result
+
+    def get_stats(self) -> Dict:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_remote": self.coalesced_remote,
+            "in_flight": len(self._futures) + len(self._events),
+            "redis_active": self.redis_client is not None
+        }
+
+
+# INSTANCE GLOBALE
+single_flight = SingleFlight()
@@ -1,141 +1,1092 @@
 import faiss
+import hashlib
+import itertools
+import json
+import logging
 import os
 import pickle
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+import zlib
+from contextlib import contextmanager
 import numpy as np
 
+from .bm25_index import BM25Index
+from .index_factory import (
+    build_index, default_index_type, default_metric, index_type_of,
+    make_flat_index, metric_of, normalize_vectors, search_parameters
+)
+
+try:
+    import fcntl  # Verrou inter-processus (workers gunicorn)
+except ImportError:  # Windows : un seul processus uvicorn, le verrou de thread suffit
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Journal d'écriture (WAL) : chaque opération est un enregistrement autonome
+# [magic][type][nb ids][octets payload] + payload + crc32
+#   - ajout : ids int64 + vecteurs float32 + méta pickle
+#   - suppression : ids int64
+_WAL_MAGIC = b"YWL2"
+_WAL_HEADER = struct.Struct("<4sBII")
+_WAL_CRC = struct.Struct("<I")
+_WAL_ADD = 1
+_WAL_DELETE = 2
+
+# Lecture de l'index de base en mmap lecture seule : les pages sont partagées
+# entre workers par le cache du système
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def extract_language(source: str) -> str:
+    """Extrait la langue depuis la source (ex: admin-json-Histoire-fr → fr)"""
+    if '-fr' in source:
+        return 'fr'
+    elif '-mo' in source:
+        return 'mo'
+    elif '-di' in source:
+        return 'di'
+    return 'unknown'
+
+
+def normalize_category(text: str) -> str:
+    """Normalise une catégorie/source : sans accents, espaces, '&' ni tirets, en minuscules"""
+    text = unicodedata.normalize('NFD', text or '')
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    return text.lower().replace(' ', '').replace('&', '').replace('-', '')
+
+
+def normalized_content_hash(text: str) -> str:
+    """Empreinte d'un passage (SHA-256) insensible à la casse, aux espaces et à la forme Unicode"""
+    text = " ".join(unicodedata.normalize('NFC', text or '').lower().split())
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _document_keys(meta):
+    """Colonnes indexées d'un document : source, langue, catégorie normalisée"""
+    source = meta.get('source', '')
+    language = meta.get('language') or extract_language(source)
+    # Sans champ "category" (anciens documents), la source complète sert de clé
+    # (ex: admin-json-Plantes Medicinales-fr → adminjsonplantesmedicinalesfr)
+    category = normalize_category(meta.get('category') or source)
+    return source, language, category
+
+
+def content_key(meta):
+    """
+    (clé du passage, (langue, catégorie, empreinte)). Un même texte peut figurer dans
+    plusieurs partitions : l'empreinte n'identifie un passage qu'avec sa langue et sa catégorie.
+    Sans doc_key (anciens documents), l'empreinte dans sa partition sert de clé.
+    """
+    content_hash = meta.get('content_hash') or normalized_content_hash(meta.get('text', ''))
+    _, language, category = _document_keys(meta)
+    scope = (language, category, content_hash)
+    return meta.get('doc_key') or f"hash:{language}:{category}:{content_hash}", scope
+
+
+class _DocumentSegment:
+    """
+    Métadonnées d'une génération dans SQLite (meta.sqlite) : colonnes source, language
+    et category indexées, texte à part, reste des champs en pickle.
+    Seules les lignes demandées sont lues et désérialisées.
+    """
+
+    def __init__(self, directory):
+        path = os.path.join(directory, "meta.sqlite")
+        # Fichier immuable une fois la génération publiée : lecture seule, sans verrou SQLite
+        self.conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self.size = self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        row = self.conn.execute("SELECT value FROM info WHERE key = 'next_id'").fetchone()
+        self.next_id = int(row[0]) if row else 0
+        # Type d'index demandé pour la base (un ivfpq sans assez de vecteurs d'entraînement est écrit en flat) ;
+        # absent des générations plus anciennes
+        row = self.conn.execute("SELECT value FROM info WHERE key = 'index_type'").fetchone()
+        self.index_type = row[0] if row else None
+
+    @staticmethod
+    def write(directory, items, next_id, index_type):
+        conn = sqlite3.connect(os.path.join(directory, "meta.sqlite"))
+        try:
+            conn.execute(
+                "CREATE TABLE documents (id INTEGER PRIMARY KEY, source TEXT, language TEXT, "
+                "category TEXT, text TEXT, extra BLOB)"
+            )
+            conn.execute("CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT)")
+            conn.executemany(
+                "INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)",
+                (_DocumentSegment._row(doc_id, meta) for doc_id, meta in items)
+            )
+            conn.execute("INSERT INTO info VALUES ('next_id', ?)", (str(next_id),))
+            conn.execute("INSERT INTO info VALUES ('index_type', ?)", (index_type,))
+            for column in ("source", "language", "category"):
+                conn.execute(f"CREATE INDEX idx_documents_{column} ON documents ({column})")
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row(doc_id, meta):
+        source, language, category = _document_keys(meta)
+        extra = {key: value for key, value in meta.items() if key != 'text'}
+        return (
+            int(doc_id), source, language, category, meta.get('text'),
+            pickle.dumps(extra, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+
+    @staticmethod
+    def _document(text, extra):
+        meta = pickle.loads(extra)
+        if text is not None:
+            meta['text'] = text
+        return meta
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, ids):
+        """{id: métadonnées} pour les identifiants présents"""
+        if not ids:
+            return {}
+        rows = self.conn.execute(
+            "SELECT id, text, extra FROM documents WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps([int(i) for i in ids]),)
+        )
+        return {doc_id: self._document(text, extra) for doc_id, text, extra in rows}
+
+    def select_ids(self, where, params, exclude):
+        """Identifiants satisfaisant une condition SQL, hors identifiants exclus"""
+        rows = self.conn.execute(f"SELECT id FROM documents WHERE {where}", params)
+        return {doc_id for (doc_id,) in rows if doc_id not in exclude}
+
+    def iter_documents(self, exclude):
+        for doc_id, text, extra in self.conn.execute("SELECT id, text, extra FROM documents ORDER BY id"):
+            if doc_id not in exclude:
+                yield doc_id, self._document(text, extra)
+
+    def group_counts(self, column, exclude):
+        """Nombre de documents par valeur de colonne (source, language, category)"""
+        rows = self.conn.execute(
+            f"SELECT {column}, COUNT(*) FROM documents "
+            f"WHERE id NOT IN (SELECT value FROM json_each(?)) GROUP BY {column}",
+            (json.dumps(sorted(exclude)),)
+        )
+        return dict(rows.fetchall())
+
+    def list_rows(self, offset, limit, language, exclude, excerpt):
+        """Page de documents (extrait de texte seulement) triée par identifiant, et total filtré"""
+        where = "id NOT IN (SELECT value FROM json_each(?))"
+        params = [json.dumps(sorted(exclude))]
+        if language:
+            where += " AND language = ?"
+            params.append(language)
+        total = self.conn.execute(f"SELECT COUNT(*) FROM documents WHERE {where}", params).fetchone()[0]
+        rows = self.conn.execute(
+            f"SELECT id, source, language, category, substr(text, 1, ?), length(text) "
+            f"FROM documents WHERE {where} ORDER BY id LIMIT ? OFFSET ?",
+            [excerpt] + params + [limit, offset]
+        )
+        return total, [
+            {
+                "doc_id": doc_id,
+                "source": source,
+                "language": lang,
+                "category": category,
+                "text": text or "",
+                "text_length": length or 0
+            }
+            for doc_id, source, lang, category, text, length in rows
+        ]
+
+
 class VectorStore:
+    """
+    Index FAISS persistant en segments, à identifiants stables :
+    - une génération de base immuable (data/faiss/gen-XXXXXX/) : index.faiss ouvert
+      en mmap lecture seule et meta.sqlite, partagés entre workers gunicorn
+    - un segment delta en mémoire + un journal append-only (wal.log) pour les
+      ajouts/suppressions depuis la dernière compaction
+
+    Chaque document reçoit un identifiant int64 qui ne change jamais (IndexIDMap2).
+    Les métadonnées de la base sont dans SQLite (meta.sqlite), indexées par source,
+    langue et catégorie ; ces partitions servent de sélecteurs FAISS pour une
+    recherche pré-filtrée exacte.
+    Un index BM25 (bm25.pkl) est tenu à jour et persisté avec chaque génération.
+    L'index de base est flat, HNSW ou IVF-PQ selon RAG_INDEX_TYPE (voir index_factory) ;
+    les vecteurs bruts (vectors.npy) permettent de le reconstruire avec un autre type.
+
+    La compaction écrit une nouvelle génération puis bascule le fichier CURRENT de façon
+    atomique : c'est le signal de rechargement. Chaque worker relit CURRENT et la fin du
+    journal au plus toutes les RAG_REFRESH_INTERVAL secondes.
+    """
+
     def __init__(self, dim=384, path="data/faiss"):
+        self.dim = dim
         self.path = path
-        self.index_path = os.path.join(path, "index.faiss")
-        self.meta_path = os.path.join(path, "meta.pkl")
+        self.current_path = os.path.join(path, "CURRENT")
+        self.lock_path = os.path.join(path, ".lock")
+        self.compact_lock_path = os.path.join(path, ".compact.lock")
+        # Taille du journal au-delà de laquelle une compaction est lancée en arrière-plan
+        self.compact_threshold = int(os.getenv("RAG_WAL_COMPACT_BYTES", str(8 * 1024 * 1024)))
+        # Bases hnsw / ivfpq : reconstruction (graphe, entraînement) bien plus coûteuse qu'un flat,
+        # seuil relevé et délai minimal entre deux bases ; le delta flat reste exact entre-temps
+        self.approx_compact_threshold = int(os.getenv("RAG_APPROX_WAL_COMPACT_BYTES", str(64 * 1024 * 1024)))
+        self.approx_compact_interval = float(os.getenv("RAG_APPROX_COMPACT_INTERVAL", "3600"))
+        self.refresh_interval = float(os.getenv("RAG_REFRESH_INTERVAL", "1.0"))
+        self.use_mmap = os.getenv("RAG_INDEX_MMAP", "1") == "1"
+        # Partitions filtrées jusqu'à cette taille : top-k exact sur leurs seuls vecteurs
+        self.exact_filter_max = int(os.getenv("RAG_FILTER_EXACT_MAX", "4096"))
+        # Type d'index (flat / hnsw / ivfpq) et métrique (l2 / cosine) d'une nouvelle base et de rebuild() ;
+        # les compactions gardent ceux de la base ouverte
+        self.index_type = default_index_type()
+        self.metric = default_metric()
+        self._lock = threading.RLock()
+        self._write_depth = 0
+        self._compaction_mutex = threading.Lock()
+        self._compaction_thread = None
+        self._wal = None
+        self.generation = None
         os.makedirs(path, exist_ok=True)
+        self._load()
 
-        if os.path.exists(self.index_path):
-            self.index = faiss.read_index(self.index_path)
-            with open(self.meta_path, "rb") as f:
-                self.meta = pickle.load(f)
-        else:
-            self.index = faiss.IndexFlatL2(dim)
-            self.meta = []
+    # =========================
+    # Chargement / générations
+    # =========================
+    def _generation_dir(self, generation):
+        return os.path.join(self.path, f"gen-{generation:06d}")
 
-    def add(self, vectors, metadata):
-        vectors = np.array(vectors).astype("float32")
-        self.index.add(vectors)
-        self.meta.extend(metadata)
-        self._save()
-
-    def search(self, vector, k=5, return_scores=False):
-        vector = np.array(vector).astype("float32")
-        D, I = self.index.search(vector, k)
-        # FAISS peut retourner -1 si pas assez d'éléments, ou des indices
-        # qui dépassent la longueur de self.meta si l'index et les métadonnées
-        # sont désynchronisés. On filtre pour éviter les crashs.
-        results = []
-        distances = []
-        for dist, idx in zip(D[0].tolist(), I[0].tolist()):
-            if idx is None or idx < 0:
+    def _read_current(self):
+        if not os.path.exists(self.current_path):
+            return None
+        with open(self.current_path, "r", encoding="utf-8") as f:
+            value = f.read().strip()
+        return int(value) if value else None
+
+    @contextmanager
+    def _write_lock(self):
+        """Verrou d'écriture réentrant : threads du processus + autres workers (si fcntl est disponible)"""
+        with self._lock:
+            if fcntl is None or self._write_depth:
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+            with open(self.lock_path, "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _compaction_lock(self):
+        """
+        Une seule construction de génération à la fois (threads + autres workers).
+        Toujours pris avant le verrou d'écriture, jamais en le tenant.
+        """
+        with self._compaction_mutex:
+            if fcntl is None:
+                yield
+                return
+            with open(self.compact_lock_path, "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        with self._write_lock():
+            generation = self._read_current()
+            if generation is None or not os.path.isdir(self._generation_dir(generation)):
+                generation = self._bootstrap_generation()
+            self._open_generation(generation, truncate_wal=True)
+            self._remove_stale_generations()
+
+    def _bootstrap_generation(self):
+        """Crée la première génération, en reprenant l'ancien format (index.faiss + meta.pkl) s'il existe."""
+        bm25 = BM25Index()
+        ids, vectors = self._no_vectors()
+        items = []
+        if os.path.exists(os.path.join(self.path, "index.faiss")):
+            # Index positionnel (IndexFlatL2) + liste de métadonnées : la position devient l'identifiant
+            index = faiss.read_index(os.path.join(self.path, "index.faiss"))
+            with open(os.path.join(self.path, "meta.pkl"), "rb") as f:
+                metadata = pickle.load(f)
+            logger.info(f"Migration de l'index FAISS existant ({index.ntotal} documents) vers le format segmenté")
+            ids = np.arange(len(metadata), dtype="int64")
+            if index.ntotal:
+                vectors = index.reconstruct_n(0, index.ntotal)
+            items = list(zip(ids.tolist(), metadata))
+            for doc_id, meta in items:
+                bm25.add(doc_id, meta.get('text', ''))
+        self._write_generation(1, ids, vectors, items, len(items), bm25)
+        return 1
+
+    def _write_generation(self, generation, ids, vectors, items, next_id, bm25,
+                          index_type=None, metric=None):
+        """Écrit une génération complète et la publie (sous le verrou d'écriture)"""
+        tmp_dir = self._build_generation(generation, ids, vectors, items, next_id, bm25, index_type, metric)
+        self._publish_generation(generation, tmp_dir)
+
+    def _build_generation(self, generation, ids, vectors, items, next_id, bm25,
+                          index_type=None, metric=None):
+        """
+        Construit l'index de base (flat / hnsw / ivfpq, l2 / cosine) sur les vecteurs et écrit la génération
+        dans un dossier temporaire, retourné sans être publié. Les vecteurs bruts sont gardés
+        (vectors.npy) : les index approchés ne permettent pas de les reconstruire exactement.
+        """
+        tmp_dir = self._generation_dir(generation) + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        index_type = index_type or self.index_type
+        index = build_index(vectors, ids, self.dim, index_type, metric or self.metric)
+        faiss.write_index(index, os.path.join(tmp_dir, "index.faiss"))
+        for name, array in (("ids.npy", ids), ("vectors.npy", vectors)):
+            with open(os.path.join(tmp_dir, name), "wb") as f:
+                np.save(f, array)
+                f.flush()
+                os.fsync(f.fileno())
+        _DocumentSegment.write(tmp_dir, items, next_id, index_type)
+        with open(os.path.join(tmp_dir, "bm25.pkl"), "wb") as f:
+            pickle.dump(bm25.to_state(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        open(os.path.join(tmp_dir, "wal.log"), "wb").close()
+        return tmp_dir
+
+    def _publish_generation(self, generation, tmp_dir, wal_data=b""):
+        """
+        Publie une génération construite : journal initial (écritures reçues pendant la construction),
+        renommage atomique du dossier puis bascule de CURRENT (signal de rechargement).
+        """
+        if wal_data:
+            with open(os.path.join(tmp_dir, "wal.log"), "wb") as f:
+                f.write(wal_data)
+                f.flush()
+                os.fsync(f.fileno())
+
+        gen_dir = self._generation_dir(generation)
+        shutil.rmtree(gen_dir, ignore_errors=True)
+        os.replace(tmp_dir, gen_dir)
+
+        current_tmp = self.current_path + ".tmp"
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(str(generation))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, self.current_path)
+
+    def _open_generation(self, generation, truncate_wal=False):
+        gen_dir = self._generation_dir(generation)
+        self.index_path = os.path.join(gen_dir, "index.faiss")
+        self.wal_path = os.path.join(gen_dir, "wal.log")
+        self.bm25_path = os.path.join(gen_dir, "bm25.pkl")
+
+        flags = _MMAP_FLAGS if self.use_mmap else 0
+        self.base_index = faiss.read_index(self.index_path, flags)
+        self.base_meta = _DocumentSegment(gen_dir)
+        self.next_id = self.base_meta.next_id
+        self.base_metric = metric_of(self.base_index)
+        self.base_index_type = self.base_meta.index_type or index_type_of(self.base_index)
+        self.base_ids, self.base_vectors = self._base_vectors(generation)
+        self.delta_index = make_flat_index(self.dim, self.base_metric)
+        self.delta_meta = {}
+        self.tombstones = set()
+        self._selector_cache = {}
+        # Clés / empreintes de contenu des documents vivants, construites à la première ingestion
+        # puis tenues à jour à chaque ajout / suppression
+        self._content_keys = None
+        self._content_hashes = None
+        self._load_bm25()
+
+        if self._wal is not None:
+            self._wal.close()
+        self.generation = generation
+        self._wal_offset = 0
+        self._replay_wal(truncate=truncate_wal)
+        self._wal = open(self.wal_path, "ab")
+        self._last_refresh = time.monotonic()
+
+    def _remove_stale_generations(self):
+        """
+        Supprime les générations antérieures à la précédente et les dossiers temporaires
+        d'une compaction interrompue. La précédente est gardée pour les workers qui
+        ne l'ont pas encore quittée, la suivante peut être en cours de construction.
+        """
+        keep = {
+            f"gen-{self.generation:06d}", f"gen-{self.generation - 1:06d}", f"gen-{self.generation + 1:06d}.tmp"
+        }
+        for name in os.listdir(self.path):
+            if name.startswith("gen-") and name not in keep:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+    def _load_bm25(self):
+        """Charge l'index BM25 persisté avec la génération"""
+        with open(self.bm25_path, "rb") as f:
+            self.bm25 = BM25Index.from_state(pickle.load(f))
+
+    def refresh(self, force=False):
+        """
+        Prend en compte les écritures des autres workers : nouvelle génération publiée
+        (signal de rechargement) ou nouveaux enregistrements en fin de journal.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = now
+            generation = self._read_current()
+            if generation is not None and generation != self.generation:
+                self._open_generation(generation)
+                logger.info(f"Index FAISS rechargé (génération {self.generation})")
+            elif os.path.getsize(self.wal_path) > self._wal_offset:
+                self._replay_wal()
+
+    def reload(self):
+        """Force la relecture de la génération courante et du journal"""
+        self.refresh(force=True)
+
+    # =========================
+    # Partitions (source / langue / catégorie → ids)
+    # =========================
+    def _filter_ids(self, language=None, category=None):
+        """Identifiants correspondant aux filtres (None = pas de filtre)"""
+        if not language and not category:
+            return None
+        conditions, params = [], []
+        cat_norm = normalize_category(category) if category else None
+        if language:
+            conditions.append("language = ?")
+            params.append(language)
+        if category:
+            conditions.append("instr(category, ?) > 0")
+            params.append(cat_norm)
+        ids = self.base_meta.select_ids(" AND ".join(conditions), params, self.tombstones)
+        for doc_id, meta in self.delta_meta.items():
+            _, doc_language, doc_category = _document_keys(meta)
+            if language and doc_language != language:
+                continue
+            if category and cat_norm not in doc_category:
                 continue
-            if idx >= len(self.meta):
+            ids.add(doc_id)
+        return ids
+
+    def _source_ids(self, source_pattern):
+        """Identifiants dont la source contient le motif"""
+        ids = self.base_meta.select_ids("instr(source, ?) > 0", [source_pattern], self.tombstones)
+        ids.update(doc_id for doc_id, meta in self.delta_meta.items() if source_pattern in meta.get('source', ''))
+        return ids
+
+    def _group_counts(self, column):
+        """Nombre de documents vivants par source / langue / catégorie"""
+        position = ("source", "language", "category").index(column)
+        counts = self.base_meta.group_counts(column, self.tombstones)
+        for meta in self.delta_meta.values():
+            key = _document_keys(meta)[position]
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def _selector(self, language=None, category=None):
+        """Sélecteur FAISS (mis en cache jusqu'à la prochaine écriture) pour une partition"""
+        key = (language, normalize_category(category) if category else None)
+        if key not in self._selector_cache:
+            ids = self._filter_ids(language, category)
+            selector = faiss.IDSelectorBatch(np.array(sorted(ids), dtype="int64")) if ids else None
+            self._selector_cache[key] = (selector, len(ids))
+        return self._selector_cache[key]
+
+    def _partition_vectors(self, language=None, category=None):
+        """
+        ids + vecteurs bruts des documents de base d'une partition (mis en cache jusqu'à la
+        prochaine écriture), pour un top-k exact sans parcourir l'index de base
+        """
+        key = ("exact", language, normalize_category(category) if category else None)
+        if key not in self._selector_cache:
+            ids = np.array(
+                sorted(i for i in self._filter_ids(language, category) if i not in self.delta_meta), dtype="int64"
+            )
+            # ids.npy est croissant : identifiants alloués dans l'ordre, conservé par la compaction
+            vectors = np.asarray(self.base_vectors[np.searchsorted(self.base_ids, ids)], dtype="float32")
+            if self.base_metric == "cosine":
+                vectors = normalize_vectors(vectors)
+            self._selector_cache[key] = (ids, vectors)
+        return self._selector_cache[key]
+
+    def _tombstone_selector(self):
+        """Sélecteur excluant les documents de base supprimés depuis la dernière compaction"""
+        if not self.tombstones:
+            return None
+        if "tombstones" not in self._selector_cache:
+            deleted = faiss.IDSelectorBatch(np.array(sorted(self.tombstones), dtype="int64"))
+            # Garder une référence sur le sélecteur interne (SWIG ne le fait pas)
+            self._selector_cache["tombstones"] = (faiss.IDSelectorNot(deleted), deleted)
+        return self._selector_cache["tombstones"][0]
+
+    def _size(self):
+        return self.base_meta.size - len(self.tombstones) + len(self.delta_meta)
+
+    def count(self, language=None, category=None):
+        """Nombre de documents dans une partition langue/catégorie"""
+        with self._lock:
+            self.refresh()
+            if not language and not category:
+                return self._size()
+            return self._selector(language, category)[1]
+
+    # =========================
+    # Journal (WAL)
+    # =========================
+    def _append_wal(self, kind, ids, vectors=None, metadata=None):
+        """
+        Ajoute un enregistrement (sous le verrou d'écriture, après refresh(force=True)).
+        Des octets au-delà du dernier enregistrement rejoué sont le reste d'un worker mort
+        en pleine écriture : ils sont tronqués, sinon les enregistrements suivants ne seraient
+        jamais relus par les autres workers puis coupés au prochain démarrage.
+        """
+        if os.path.getsize(self.wal_path) > self._wal_offset:
+            logger.warning(f"Journal FAISS tronqué à l'octet {self._wal_offset} (enregistrement incomplet d'un autre worker)")
+            self._wal.flush()
+            os.ftruncate(self._wal.fileno(), self._wal_offset)
+        payload = ids.tobytes()
+        if kind == _WAL_ADD:
+            payload += vectors.tobytes() + pickle.dumps(metadata)
+        record = (
+            _WAL_HEADER.pack(_WAL_MAGIC, kind, len(ids), len(payload))
+            + payload
+            + _WAL_CRC.pack(zlib.crc32(payload))
+        )
+        self._wal.write(record)
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self._wal_offset += len(record)
+
+    def _replay_wal(self, truncate=False):
+        """
+        Rejoue le journal à partir du dernier octet appliqué.
+        Un enregistrement incomplet est ignoré ; il n'est tronqué que sous le verrou
+        d'écriture (c'est alors le reste d'un crash, pas une écriture en cours).
+        """
+        if not os.path.exists(self.wal_path):
+            return
+        with open(self.wal_path, "rb") as f:
+            f.seek(self._wal_offset)
+            data = f.read()
+
+        offset = 0
+        replayed = 0
+        while offset + _WAL_HEADER.size <= len(data):
+            magic, kind, count, payload_len = _WAL_HEADER.unpack_from(data, offset)
+            if magic != _WAL_MAGIC:
+                break
+            payload_start = offset + _WAL_HEADER.size
+            payload_end = payload_start + payload_len
+            if payload_end + _WAL_CRC.size > len(data):
+                break
+            payload = data[payload_start:payload_end]
+            (crc,) = _WAL_CRC.unpack_from(data, payload_end)
+            if crc != zlib.crc32(payload):
+                break
+
+            ids = np.frombuffer(payload[:count * 8], dtype="int64")
+            if kind == _WAL_ADD:
+                vec_end = count * 8 + count * self.dim * 4
+                vectors = np.frombuffer(payload[count * 8:vec_end], dtype="float32").reshape(count, self.dim)
+                self._apply_add(ids, vectors, pickle.loads(payload[vec_end:]))
+            elif kind == _WAL_DELETE:
+                self._apply_delete(ids)
+            offset = payload_end + _WAL_CRC.size
+            replayed += 1
+
+        self._wal_offset += offset
+        if truncate and offset < len(data):
+            logger.warning(f"Journal FAISS tronqué à l'octet {self._wal_offset} (enregistrement incomplet ignoré)")
+            with open(self.wal_path, "r+b") as f:
+                f.truncate(self._wal_offset)
+        if replayed:
+            logger.info(f"{replayed} opérations rejouées depuis le journal FAISS")
+
+    # =========================
+    # Compaction
+    # =========================
+    def _no_vectors(self):
+        return np.empty(0, dtype="int64"), np.empty((0, self.dim), dtype="float32")
+
+    @staticmethod
+    def _index_vectors(index):
+        """ids + vecteurs d'un index flat à identifiants (reconstruction exacte)"""
+        ids = faiss.vector_to_array(index.id_map).astype("int64")
+        return ids, index.index.reconstruct_n(0, index.ntotal)
+
+    def _base_vectors(self, generation):
+        """ids + vecteurs bruts de la base d'une génération (fichiers immuables, vecteurs en mmap)"""
+        gen_dir = self._generation_dir(generation)
+        return np.load(os.path.join(gen_dir, "ids.npy")), np.load(os.path.join(gen_dir, "vectors.npy"), mmap_mode="r")
+
+    def _merged_vectors(self, parts, tombstones):
+        """Vecteurs et ids vivants de segments (ids, vecteurs), hors suppressions"""
+        parts_ids, parts_vectors = [], []
+        for ids, vectors in parts:
+            if not len(ids):
                 continue
-            results.append(self.meta[idx])
-            distances.append(dist)
+            if tombstones:
+                keep = ~np.isin(ids, np.array(sorted(tombstones), dtype="int64"))
+                ids, vectors = ids[keep], vectors[keep]
+            parts_ids.append(ids)
+            parts_vectors.append(np.asarray(vectors, dtype="float32"))
+        if not parts_ids:
+            return self._no_vectors()
+        return np.concatenate(parts_ids), np.vstack(parts_vectors)
+
+    def _snapshot(self):
+        """
+        État à compacter (sous le verrou d'écriture) : seul le delta en mémoire est copié,
+        la base est relue ensuite depuis les fichiers immuables de la génération.
+        """
+        ids, vectors = self._index_vectors(self.delta_index)
+        return {
+            "generation": self.generation,
+            "wal_offset": self._wal_offset,
+            "next_id": self.next_id,
+            "tombstones": set(self.tombstones),
+            "delta_ids": ids,
+            "delta_vectors": vectors,
+            "delta_meta": dict(self.delta_meta),
+        }
+
+    def _build_compacted(self, snapshot, index_type=None, metric=None):
+        """Construit la génération suivante depuis un instantané, sans verrou d'écriture"""
+        gen_dir = self._generation_dir(snapshot["generation"])
+        tombstones = snapshot["tombstones"]
+        ids, vectors = self._merged_vectors(
+            [self._base_vectors(snapshot["generation"]), (snapshot["delta_ids"], snapshot["delta_vectors"])], tombstones
+        )
+
+        # Connexion propre à ce thread ; BM25 repris de la génération puis mis à jour des écarts
+        segment = _DocumentSegment(gen_dir)
+        try:
+            with open(os.path.join(gen_dir, "bm25.pkl"), "rb") as f:
+                bm25 = BM25Index.from_state(pickle.load(f))
+            for doc_id, meta in segment.get_many(sorted(tombstones)).items():
+                bm25.remove(doc_id, meta.get('text', ''))
+            for doc_id, meta in snapshot["delta_meta"].items():
+                bm25.add(doc_id, meta.get('text', ''))
+            items = itertools.chain(segment.iter_documents(tombstones), sorted(snapshot["delta_meta"].items()))
+            return self._build_generation(
+                snapshot["generation"] + 1, ids, vectors, items, snapshot["next_id"], bm25, index_type, metric
+            )
+        finally:
+            segment.close()
+
+    def compact(self, index_type=None, metric=None):
+        """
+        Fusionne base + journal dans une nouvelle génération et la publie (signal de rechargement).
+        Le verrou d'écriture n'est tenu que pour l'instantané du delta puis pour la bascule :
+        recherches et ingestions continuent pendant la construction de l'index, et les écritures
+        reçues entre-temps sont recopiées dans le journal de la nouvelle génération.
+        index_type / metric forcent le type d'index et la métrique de la nouvelle base
+        (par défaut ceux de la base ouverte, quel que soit l'environnement de ce worker).
+        """
+        with self._compaction_lock():
+            with self._write_lock():
+                self.refresh(force=True)
+                snapshot = self._snapshot()
+                index_type = index_type or self.base_index_type
+                metric = metric or self.base_metric
+
+            tmp_dir = self._build_compacted(snapshot, index_type, metric)
+
+            with self._write_lock():
+                self.refresh(force=True)
+                if self.generation != snapshot["generation"]:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    logger.warning(f"Compaction FAISS abandonnée : génération {self.generation} publiée entre-temps")
+                    return
+                with open(self.wal_path, "rb") as f:
+                    f.seek(snapshot["wal_offset"])
+                    wal_data = f.read(self._wal_offset - snapshot["wal_offset"])
+                # Mêmes documents vivants après la bascule : l'index de contenu reste valable
+                content_index = (self._content_keys, self._content_hashes)
+                self._publish_generation(snapshot["generation"] + 1, tmp_dir, wal_data)
+                self._open_generation(snapshot["generation"] + 1)
+                self._content_keys, self._content_hashes = content_index
+                self._remove_stale_generations()
+                logger.info(
+                    f"Index FAISS compacté (génération {self.generation}, {self.base_index.ntotal} documents, "
+                    f"{index_type_of(self.base_index)}, {self.base_metric}, "
+                    f"{len(wal_data)} octets de journal reportés)"
+                )
+
+    def rebuild(self, index_type=None, metric=None):
+        """
+        Reconstruit (et réentraîne) l'index de base depuis les vecteurs bruts, avec le type demandé
+        (par défaut RAG_INDEX_TYPE / RAG_INDEX_METRIC).
+        """
+        self.compact(index_type=index_type or self.index_type, metric=metric or self.metric)
+
+    def get_vectors(self):
+        """ids + vecteurs de tous les documents vivants (reconstruction, benchmark)"""
+        with self._lock:
+            self.refresh()
+            return self._merged_vectors(
+                [self._base_vectors(self.generation), self._index_vectors(self.delta_index)], self.tombstones
+            )
+
+    def compact_async(self):
+        """Lance la compaction dans un thread d'arrière-plan si aucune n'est en cours."""
+        with self._lock:
+            if self._compaction_thread and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(target=self._compact_safely, daemon=True)
+            self._compaction_thread.start()
+
+    def _compact_safely(self):
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Erreur compaction FAISS: {e}")
+
+    def _maybe_compact(self):
+        if self.base_index_type == "flat":
+            if self._wal_offset >= self.compact_threshold:
+                self.compact_async()
+            return
+        # Âge de la base : date d'écriture de l'index, commune à tous les workers
+        age = time.time() - os.path.getmtime(self.index_path)
+        if self._wal_offset >= self.approx_compact_threshold and age >= self.approx_compact_interval:
+            self.compact_async()
+
+    # =========================
+    # Lecture / écriture
+    # =========================
+    def _apply_add(self, ids, vectors, metadata):
+        if self.base_metric == "cosine":
+            vectors = normalize_vectors(vectors)
+        self.delta_index.add_with_ids(vectors, ids)
+        for doc_id, meta in zip(ids.tolist(), metadata):
+            self.delta_meta[doc_id] = meta
+            self.bm25.add(doc_id, meta.get('text', ''))
+            self._remember_content(doc_id, meta)
+        if len(ids):
+            self.next_id = max(self.next_id, int(ids.max()) + 1)
+        self._selector_cache.clear()
+
+    def _apply_delete(self, ids):
+        delta_ids = []
+        base_ids = []
+        for doc_id in ids.tolist():
+            meta = self.delta_meta.pop(doc_id, None)
+            if meta is not None:
+                delta_ids.append(doc_id)
+                self.bm25.remove(doc_id, meta.get('text', ''))
+                self._forget_content(doc_id, meta)
+            elif doc_id not in self.tombstones:
+                base_ids.append(doc_id)
+        for doc_id, meta in self.base_meta.get_many(base_ids).items():
+            self.tombstones.add(doc_id)
+            self.bm25.remove(doc_id, meta.get('text', ''))
+            self._forget_content(doc_id, meta)
+        if delta_ids:
+            self.delta_index.remove_ids(np.array(delta_ids, dtype="int64"))
+        self._selector_cache.clear()
+
+    def _get_many(self, ids):
+        """{id: métadonnées} des documents vivants parmi ids (seules ces lignes sont lues)"""
+        found = {doc_id: self.delta_meta[doc_id] for doc_id in ids if doc_id in self.delta_meta}
+        base_ids = [doc_id for doc_id in ids if doc_id not in found and doc_id not in self.tombstones]
+        found.update(self.base_meta.get_many(base_ids))
+        return found
+
+    def _get(self, doc_id):
+        return self._get_many([doc_id]).get(doc_id)
+
+    def _iter_documents(self):
+        """Documents vivants triés par identifiant (les ids du delta suivent ceux de la base)"""
+        yield from self.base_meta.iter_documents(self.tombstones)
+        yield from sorted(self.delta_meta.items())
+
+    def add(self, vectors, metadata):
+        """Ajoute des vecteurs et retourne leurs identifiants stables."""
+        vectors = np.ascontiguousarray(np.array(vectors).astype("float32").reshape(-1, self.dim))
+        with self._write_lock():
+            self.refresh(force=True)
+            ids = np.arange(self.next_id, self.next_id + len(vectors), dtype="int64")
+            self._append_wal(_WAL_ADD, ids, vectors, metadata)
+            self._apply_add(ids, vectors, metadata)
+            self._maybe_compact()
+        return ids.tolist()
+
+    # =========================
+    # Ingestion idempotente (clé de passage + empreinte de contenu)
+    # =========================
+    def _content_index(self):
+        """{clé: (id, empreinte)} et {(langue, catégorie, empreinte): {ids}} des documents vivants (parcours complet au premier appel)"""
+        if self._content_keys is None:
+            self._content_keys, self._content_hashes = {}, {}
+            for doc_id, meta in self._iter_documents():
+                self._remember_content(doc_id, meta)
+        return self._content_keys, self._content_hashes
+
+    def _remember_content(self, doc_id, meta):
+        if self._content_keys is None:
+            return
+        key, scope = content_key(meta)
+        self._content_keys[key] = (doc_id, scope[2])
+        self._content_hashes.setdefault(scope, set()).add(doc_id)
+
+    def _forget_content(self, doc_id, meta):
+        if self._content_keys is None:
+            return
+        key, scope = content_key(meta)
+        if self._content_keys.get(key, (None,))[0] == doc_id:
+            del self._content_keys[key]
+        ids = self._content_hashes.get(scope)
+        if ids is not None:
+            ids.discard(doc_id)
+            if not ids:
+                del self._content_hashes[scope]
+
+    def _classify(self, metadata):
+        """(statut, id existant) de chaque passage : added, updated ou unchanged"""
+        keys, hashes = self._content_index()
+        plan = []
+        for meta in metadata:
+            key, scope = content_key(meta)
+            existing = keys.get(key)
+            if existing is not None:
+                plan.append(("unchanged" if existing[1] == scope[2] else "updated", existing[0]))
+            elif scope in hashes:
+                # Même contenu déjà indexé dans la même partition sous une autre clé
+                # (ou avant les clés de passage)
+                plan.append(("unchanged", min(hashes[scope])))
+            else:
+                plan.append(("added", None))
+        return plan
+
+    def classify(self, metadata):
+        """Statut de chaque passage par rapport à l'index, sans écrire (pour n'encoder que le nécessaire)"""
+        with self._lock:
+            self.refresh()
+            return [status for status, _ in self._classify(metadata)]
+
+    def upsert(self, vectors, metadata):
+        """
+        Ajoute les nouveaux passages, remplace ceux dont la clé existe avec un autre contenu
+        et ignore ceux déjà indexés. Retourne les identifiants par statut.
+        """
+        vectors = np.ascontiguousarray(np.array(vectors).astype("float32").reshape(-1, self.dim))
+        report = {"added": [], "updated": [], "unchanged": []}
+        with self._write_lock():
+            self.refresh(force=True)
+            plan = self._classify(metadata)
+            rows = [i for i, (status, _) in enumerate(plan) if status != "unchanged"]
+            report["unchanged"] = [doc_id for status, doc_id in plan if status == "unchanged"]
+
+            replaced = np.array([doc_id for status, doc_id in plan if status == "updated"], dtype="int64")
+            if len(replaced):
+                self._append_wal(_WAL_DELETE, replaced)
+                self._apply_delete(replaced)
+            if rows:
+                ids = np.arange(self.next_id, self.next_id + len(rows), dtype="int64")
+                kept = [metadata[i] for i in rows]
+                self._append_wal(_WAL_ADD, ids, vectors[rows], kept)
+                self._apply_add(ids, vectors[rows], kept)
+                for doc_id, i in zip(ids.tolist(), rows):
+                    report[plan[i][0]].append(doc_id)
+            self._maybe_compact()
+        return report
+
+    def delete_duplicates(self):
+        """Supprime les documents dont le contenu (empreinte normalisée) est déjà indexé dans la même partition, garde le plus ancien"""
+        with self._write_lock():
+            self.refresh(force=True)
+            _, hashes = self._content_index()
+            duplicates = [doc_id for ids in hashes.values() if len(ids) > 1 for doc_id in sorted(ids)[1:]]
+            return self.delete_by_ids(duplicates)
+
+    def search(self, vector, k=5, return_scores=False, language=None, category=None):
+        """
+        Recherche les k plus proches voisins, restreinte à la partition
+        langue/catégorie si demandée. Les segments base (mmap) et delta sont interrogés
+        puis fusionnés par score : distance L2 croissante, ou similarité cosinus décroissante.
+        Partition filtrée :
+        - jusqu'à RAG_FILTER_EXACT_MAX documents, top-k exact sur les seuls vecteurs de la
+          partition (un graphe HNSW filtré peut sinon manquer les rares documents acceptés)
+        - au-delà, sélecteur FAISS, avec efSearch / nprobe augmentés selon la sélectivité
+        """
+        vector = np.array(vector).astype("float32").reshape(-1, self.dim)
+        with self._lock:
+            self.refresh()
+            if self.base_metric == "cosine":
+                vector = normalize_vectors(vector)
+            hits = []
+            selectivity = 1.0
+            if language or category:
+                selector, size = self._selector(language, category)
+                if not size:
+                    return ([], []) if return_scores else []
+                selectivity = size / max(1, self._size())
+                segments = [(self.delta_index, selector)]
+                if size <= self.exact_filter_max:
+                    ids, vectors = self._partition_vectors(language, category)
+                    if len(ids):
+                        metric = faiss.METRIC_INNER_PRODUCT if self.base_metric == "cosine" else faiss.METRIC_L2
+                        D, I = faiss.knn(vector, vectors, min(k, len(ids)), metric=metric)
+                        hits.extend((dist, int(ids[i])) for dist, i in zip(D[0].tolist(), I[0].tolist()) if i >= 0)
+                else:
+                    segments.append((self.base_index, selector))
+            else:
+                segments = [(self.base_index, self._tombstone_selector()), (self.delta_index, None)]
+
+            for index, selector in segments:
+                if not index.ntotal:
+                    continue
+                D, I = index.search(vector, k, params=search_parameters(index, selector, selectivity))
+                hits.extend(zip(D[0].tolist(), I[0].tolist()))
+            hits.sort(key=lambda hit: hit[0], reverse=self.base_metric == "cosine")
+
+            # FAISS retourne -1 s'il n'y a pas assez d'éléments ; seules les k lignes
+            # retenues sont lues, les identifiants sans métadonnées sont ignorés.
+            hits = [(dist, doc_id) for dist, doc_id in hits if doc_id >= 0][:k]
+            metas = self._get_many([doc_id for _, doc_id in hits])
+            results = []
+            distances = []
+            for dist, doc_id in hits:
+                meta = metas.get(doc_id)
+                if meta is None:
+                    continue
+                results.append({**meta, "doc_id": doc_id})
+                distances.append(dist)
+        if return_scores:
+            return results, distances  # distances L2 ou similarités cosinus (voir to_similarity)
+        return results
+
+    def to_similarity(self, scores):
+        """
+        Scores de search() → similarité (plus grand = plus proche) :
+        cosinus tel quel, ou 1 / (1 + distance L2) pour l'index historique.
+        """
+        if self.base_metric == "cosine":
+            return [float(score) for score in scores]
+        return [1.0 / (1.0 + score) for score in scores]
+
+    def keyword_search(self, query, k=5, return_scores=False, language=None, category=None):
+        """Recherche BM25 (index inversé), restreinte à la partition langue/catégorie si demandée."""
+        with self._lock:
+            self.refresh()
+            allowed = self._filter_ids(language, category) if (language or category) else None
+            hits = self.bm25.search(query, k=k, allowed_ids=allowed)
+            metas = self._get_many([doc_id for doc_id, _ in hits])
+            hits = [(doc_id, score) for doc_id, score in hits if doc_id in metas]
+            results = [{**metas[doc_id], "doc_id": doc_id} for doc_id, _ in hits]
+            scores = [score for _, score in hits]
         if return_scores:
-            return results, distances  # distances L2 filtrées
+            return results, scores
         return results
 
-    def _save(self):
-        faiss.write_index(self.index, self.index_path)
-        with open(self.meta_path, "wb") as f:
-            pickle.dump(self.meta, f)
-    
+    def keyword_coverage(self, query, doc_ids):
+        """{id: part du poids IDF des termes de la requête présents dans le document} (voir BM25Index.coverage)"""
+        with self._lock:
+            return self.bm25.coverage(query, doc_ids)
+
+    def get_document(self, doc_id):
+        """Retourne les métadonnées d'un document par identifiant (ou None)"""
+        with self._lock:
+            self.refresh()
+            return self._get(doc_id)
+
     def get_all_metadata(self):
-        """Retourne toutes les métadonnées avec index"""
-        return [(i, meta) for i, meta in enumerate(self.meta)]
-    
+        """Retourne toutes les métadonnées avec leur identifiant (parcours complet)"""
+        with self._lock:
+            self.refresh()
+            return list(self._iter_documents())
+
+    def list_documents(self, offset=0, limit=100, language=None, excerpt=200):
+        """
+        Page de documents triée par identifiant, paginée dans SQLite pour la base
+        (seul un extrait du texte est lu). Retourne (total filtré, lignes).
+        """
+        with self._lock:
+            self.refresh()
+            base_total, rows = self.base_meta.list_rows(offset, limit, language, self.tombstones, excerpt)
+            delta_rows = []
+            for doc_id, meta in sorted(self.delta_meta.items()):
+                source, doc_language, category = _document_keys(meta)
+                if language and doc_language != language:
+                    continue
+                text = meta.get('text', '')
+                delta_rows.append({
+                    "doc_id": doc_id,
+                    "source": source,
+                    "language": doc_language,
+                    "category": category,
+                    "text": text[:excerpt],
+                    "text_length": len(text)
+                })
+            start = max(0, offset - base_total)
+            rows.extend(delta_rows[start:start + limit - len(rows)])
+            return base_total + len(delta_rows), rows
+
     def get_stats(self):
         """Statistiques sur l'index FAISS"""
-        total_docs = self.index.ntotal
-        languages = {}
-        sources = {}
-        
-        for meta in self.meta:
-            # Extraire langue depuis source (ex: admin-json-Histoire-fr)
-            source = meta.get('source', '')
-            if '-fr' in source:
-                languages['fr'] = languages.get('fr', 0) + 1
-            elif '-mo' in source:
-                languages['mo'] = languages.get('mo', 0) + 1
-            elif '-di' in source:
-                languages['di'] = languages.get('di', 0) + 1
-            else:
-                languages['unknown'] = languages.get('unknown', 0) + 1
-            
-            # Compter par source
-            sources[source] = sources.get(source, 0) + 1
-        
-        return {
-            'total_documents': total_docs,
-            'languages': languages,
-            'sources': sources,
-            'index_size_mb': os.path.getsize(self.index_path) / (1024*1024) if os.path.exists(self.index_path) else 0
-        }
-    
+        with self._lock:
+            self.refresh()
+            return {
+                'total_documents': self._size(),
+                'languages': self._group_counts('language'),
+                'sources': self._group_counts('source'),
+                'categories': self._group_counts('category'),
+                'generation': self.generation,
+                'index_size_mb': os.path.getsize(self.index_path) / (1024*1024) if os.path.exists(self.index_path) else 0,
+                'wal_size_mb': os.path.getsize(self.wal_path) / (1024*1024) if os.path.exists(self.wal_path) else 0,
+                'index_type': index_type_of(self.base_index),
+                'metric': self.base_metric,
+                'mmap': self.use_mmap
+            }
+
+    def delete_by_ids(self, ids_to_delete):
+        """Supprime des documents par identifiant. Les autres identifiants restent inchangés."""
+        with self._write_lock():
+            self.refresh(force=True)
+            ids = np.array(sorted(self._get_many({int(i) for i in ids_to_delete})), dtype="int64")
+            if not len(ids):
+                return 0
+            self._append_wal(_WAL_DELETE, ids)
+            self._apply_delete(ids)
+            self._maybe_compact()
+        return len(ids)
+
     def delete_by_indices(self, indices_to_delete):
-        """Supprime des documents par leurs indices"""
-        if not indices_to_delete:
-            return
-        
-        # FAISS ne supporte pas la suppression directe
-        # Il faut recréer l'index sans les documents supprimés
-        indices_to_keep = [i for i in range(len(self.meta)) if i not in indices_to_delete]
-        
-        if not indices_to_keep:
-            # Tous les docs supprimés, réinitialiser
-            dim = self.index.d
-            self.index = faiss.IndexFlatL2(dim)
-            self.meta = []
-        else:
-            # Récupérer les vecteurs à garder
-            vectors_to_keep = []
-            meta_to_keep = []
-            
-            for i in indices_to_keep:
-                # Récupérer le vecteur depuis l'index
-                vector = faiss.vector_to_array(self.index.reconstruct(i))
-                vectors_to_keep.append(vector)
-                meta_to_keep.append(self.meta[i])
-            
-            # Créer nouvel index
-            dim = self.index.d
-            self.index = faiss.IndexFlatL2(dim)
-            self.meta = []
-            
-            # Ré-ajouter les vecteurs conservés
-            if vectors_to_keep:
-                vectors_array = np.array(vectors_to_keep).astype('float32')
-                self.index.add(vectors_array)
-                self.meta = meta_to_keep
-        
-        self._save()
-    
+        """Supprime des documents par leurs indices (identifiants stables)"""
+        return self.delete_by_ids(indices_to_delete)
+
     def delete_by_source(self, source_pattern):
         """Supprime tous les documents d'une source spécifique"""
-        indices_to_delete = []
-        for i, meta in enumerate(self.meta):
-            if source_pattern in meta.get('source', ''):
-                indices_to_delete.append(i)
-        
-        self.delete_by_indices(indices_to_delete)
-        return len(indices_to_delete)
-    
+        with self._write_lock():
+            self.refresh(force=True)
+            return self.delete_by_ids(self._source_ids(source_pattern))
+
     def delete_by_language(self, language):
         """Supprime tous les documents d'une langue spécifique (fr, mo, di)"""
-        pattern = f'-{language}'
-        return self.delete_by_source(pattern)
-    
+        with self._write_lock():
+            self.refresh(force=True)
+            return self.delete_by_ids(self._filter_ids(language=language))
+
     def clear_all(self):
-        """Vide complètement l'index RAG"""
-        dim = self.index.d
-        self.index = faiss.IndexFlatL2(dim)
-        self.meta = []
-        self._save()
+        """Vide complètement l'index RAG (les identifiants ne sont pas réutilisés)"""
+        with self._compaction_lock(), self._write_lock():
+            self.refresh(force=True)
+            generation = self.generation + 1
+            ids, vectors = self._no_vectors()
+            self._write_generation(generation, ids, vectors, [], self.next_id, BM25Index())
+            self._open_generation(generation)
+            self._remove_stale_generations()
@@ -0,0 +1,98 @@
+"""Benchmark de débit / latence de bout en bout de /ai/chat/intelligent (ou de sa version streaming).
+
+À lancer contre un backend démarré avec un LLM factice pour des mesures reproductibles :
+    python mock_llm_server.py --port 11434 &          # ou LLM_BACKEND=mock
+    uvicorn main:app --port 8000 &
+    python benchmark_chat.py --requests 200 --concurrency 16
+    python benchmark_chat.py --stream --requests 50    # mesure aussi le temps jusqu'au premier token
+
+Les questions viennent de --questions (une par ligne) ou d'une petite liste par défaut ;
+--unique ajoute un suffixe pour contourner les caches de réponses.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+DEFAULT_QUESTIONS = [
+    "Comment utiliser le moringa contre la fatigue ?",
+    "Comment fabriquer du savon au karité ?",
+    "Quand planter le mil au Burkina ?",
+    "Quels sont les bienfaits du néré ?",
+]
+
+
+async def one_request(client, args, question):
+    payload = {"message": question, "language": "fr"}
+    started = time.perf_counter()
+    if not args.stream:
+        r = await client.post("/ai/chat/intelligent", json=payload)
+        r.raise_for_status()
+        return None, time.perf_counter() - started
+
+    first_token = None
+    async with client.stream("POST", "/ai/chat/intelligent/stream", json=payload) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if first_token is None and line.startswith("event: token"):
+                first_token = time.perf_counter() - started
+    return first_token, time.perf_counter() - started
+
+
+async def run(args):
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    ttfts, latencies, errors = [], [], 0
+
+    async def worker(i, client):
+        nonlocal errors
+        question = questions[i % len(questions)]
+        if args.unique:
+            question = f"{question} ({i})"
+        async with semaphore:
+            try:
+                ttft, latency = await one_request(client, args, question)
+            except Exception as e:
+                errors += 1
+                print(f"❌ {e}")
+                return
+        latencies.append(latency)
+        if ttft is not None:
+            ttfts.append(ttft)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(i, client) for i in range(args.requests)])
+        elapsed = time.perf_counter() - started
+
+    print(f"{len(latencies)} réponses, {errors} erreurs en {elapsed:.1f} s "
+          f"({len(latencies) / elapsed:.2f} req/s, concurrence {args.concurrency})")
+    for label, values in (("latence", latencies), ("premier token", ttfts)):
+        if values:
+            ms = np.array(values) * 1000
+            print(f"  {label:14s} p50={np.percentile(ms, 50):.0f} ms  p95={np.percentile(ms, 95):.0f} ms  "
+                  f"max={ms.max():.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout du chat intelligent")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--questions", help="fichier texte, une question par ligne")
+    parser.add_argument("--unique", action="store_true", help="questions toutes différentes (pas de cache)")
+    parser.add_argument("--stream", action="store_true", help="utiliser /ai/chat/intelligent/stream")
+    parser.add_argument("--timeout", type=float, default=300)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Parité et performances des encodeurs de requête : torch, ONNX float32, ONNX int8.
+
+Usage (après python export_onnx_encoder.py --quantize) :
+    python benchmark_encoder.py                            # textes de data/faiss
+    python benchmark_encoder.py --backends torch,onnx-int8 --texts 500 --queries 200
+
+Chaque encodeur est chargé dans un processus séparé pour mesurer sa mémoire seule :
+- parité : cosinus avec les embeddings torch (minimum et moyenne), recouvrement des
+  5 plus proches voisins de chaque texte
+- latence : requêtes encodées une par une comme en production (p50 / p95)
+- débit : textes encodés par lots de 32
+- mémoire : RSS du processus après chargement et pic après encodage
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+DEFAULT_TEXTS = [
+    "Comment utiliser le moringa contre la fatigue ?",
+    "Comment fabriquer du savon au karité ?",
+    "Quand planter le mil au Burkina ?",
+    "Quels sont les bienfaits du néré ?",
+    "Comment soigner les maux de ventre avec des plantes ?",
+    "Quelle quantité de soude pour un savon noir ?",
+]
+
+
+def rss_mb() -> float:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    except ImportError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def load_texts(args):
+    texts = []
+    if os.path.exists(args.path):
+        from ai.service.vector_store import VectorStore
+        # Copie jetable : ouvrir le store peut migrer, tronquer le journal ou nettoyer des générations
+        with tempfile.TemporaryDirectory() as tmp:
+            copy = os.path.join(tmp, "faiss")
+            shutil.copytree(args.path, copy, ignore=shutil.ignore_patterns(".lock", ".compact.lock"))
+            texts = [meta.get("text", "") for _, meta in VectorStore(path=copy).get_all_metadata()]
+    texts = [t for t in texts if t.strip()] or DEFAULT_TEXTS
+    return [texts[i % len(texts)] for i in range(args.texts)]
+
+
+def load_encoder(backend, onnx_dir):
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
+    from ai.service.onnx_encoder import OnnxEncoder
+    return OnnxEncoder(onnx_dir, quantized=backend == "onnx-int8")
+
+
+def child(args):
+    """Mesures d'un seul encodeur (processus isolé) ; embeddings écrits dans --out"""
+    with open(args.texts_file, "r", encoding="utf-8") as f:
+        texts = json.load(f)
+    base = rss_mb()
+    started = time.perf_counter()
+    encoder = load_encoder(args.child, args.onnx_dir)
+    load_seconds = time.perf_counter() - started
+    loaded = rss_mb()
+
+    encoder.encode(texts[:4])  # préchauffage
+    latencies = []
+    for text in texts[:args.queries]:
+        started = time.perf_counter()
+        encoder.encode([text])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    embeddings = np.asarray(encoder.encode(texts, batch_size=32), dtype="float32")
+    batch_seconds = time.perf_counter() - started
+    np.save(args.out, embeddings)
+
+    print(json.dumps({
+        "load_s": round(load_seconds, 2),
+        "rss_loaded_mb": round(loaded - base, 1),
+        "rss_peak_mb": round(rss_mb(), 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "docs_per_s": round(len(texts) / batch_seconds, 1),
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--path", default="data/faiss", help="index dont les textes servent d'échantillon")
+    parser.add_argument("--onnx-dir", default=None, help="défaut : EMBEDDING_ONNX_DIR")
+    parser.add_argument("--texts", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--texts-file", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    from ai.service.onnx_encoder import parity_report
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    with tempfile.TemporaryDirectory() as tmp:
+        texts_file = os.path.join(tmp, "texts.json")
+        with open(texts_file, "w", encoding="utf-8") as f:
+            json.dump(load_texts(args), f, ensure_ascii=False)
+
+        results, embeddings = {}, {}
+        for backend in backends:
+            out = os.path.join(tmp, f"{backend}.npy")
+            command = [sys.executable, os.path.abspath(__file__), "--child", backend, "--texts-file", texts_file,
+                       "--out", out, "--queries", str(args.queries)]
+            if args.onnx_dir:
+                command += ["--onnx-dir", args.onnx_dir]
+            run = subprocess.run(command, capture_output=True, text=True)
+            if run.returncode != 0:
+                print(f"❌ {backend}: {run.stderr.strip().splitlines()[-1] if run.stderr.strip() else 'échec'}")
+                continue
+            results[backend] = json.loads(run.stdout.strip().splitlines()[-1])
+            embeddings[backend] = np.load(out)
+
+    print(f"{args.texts} textes, {args.queries} requêtes une par une\n")
+    print(f"{'encodeur':<10} {'chargement':>10} {'RSS modèle':>11} {'RSS pic':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'docs/s':>8} {'cos min':>8} {'cos moy':>8} {'voisins':>8}")
+    for backend, r in results.items():
+        parity = {}
+        if "torch" in embeddings and backend != "torch":
+            parity = parity_report(embeddings["torch"], embeddings[backend])
+        print(
+            f"{backend:<10} {r['load_s']:>9.2f}s {r['rss_loaded_mb']:>8.0f} Mo {r['rss_peak_mb']:>6.0f} Mo "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['docs_per_s']:>8.1f} "
+            f"{parity.get('cosine_min', 1.0):>8.4f} {parity.get('cosine_mean', 1.0):>8.4f} "
+            f"{parity.get('neighbors_overlap', 1.0):>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark rappel / latence des types d'index FAISS (flat, hnsw, ivfpq).
+
+Usage :
+    python benchmark_rag_index.py                      # vecteurs de data/faiss
+    python benchmark_rag_index.py --synthetic 100000   # données synthétiques (grappes gaussiennes)
+    python benchmark_rag_index.py --types hnsw,ivfpq --k 5 --queries 200
+
+Le rappel@k est mesuré contre l'index flat (recherche exacte) sur les mêmes données.
+Les requêtes sont des vecteurs de la base légèrement bruités, interrogés un par un
+comme en production. Les réglages RAG_HNSW_* / RAG_IVF_* / RAG_PQ_M sont pris en compte.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ai.service.index_factory import INDEX_TYPES, build_index, index_type_of, search_parameters
+
+
+def load_vectors(args):
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        centers = rng.normal(size=(max(1, args.synthetic // 500), args.dim)).astype("float32")
+        labels = rng.integers(0, len(centers), size=args.synthetic)
+        vectors = centers[labels] + 0.3 * rng.normal(size=(args.synthetic, args.dim)).astype("float32")
+        return np.arange(args.synthetic, dtype="int64"), vectors.astype("float32")
+
+    from ai.service.vector_store import VectorStore
+    store = VectorStore(dim=args.dim, path=args.path)
+    ids, vectors = store.get_vectors()
+    return ids, np.ascontiguousarray(vectors, dtype="float32")
+
+
+def make_queries(vectors, count, seed):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), size=count)]
+    noise = rng.normal(scale=0.05 * float(np.std(vectors)), size=picked.shape)
+    return (picked + noise).astype("float32")
+
+
+def run(index, queries, k):
+    params = search_parameters(index)
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, I = index.search(query.reshape(1, -1), k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(I[0])
+    return np.array(results), np.array(latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="data/faiss")
+    parser.add_argument("--synthetic", type=int, default=0, help="nombre de vecteurs synthétiques")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    ids, vectors = load_vectors(args)
+    if not len(ids):
+        print("Aucun vecteur à indexer")
+        return
+    queries = make_queries(vectors, args.queries, args.seed)
+    k = min(args.k, len(ids))
+    print(f"{len(ids)} vecteurs (dim {vectors.shape[1]}), {len(queries)} requêtes, k={k}\n")
+
+    exact = build_index(vectors, ids, vectors.shape[1], "flat")
+    truth, _ = run(exact, queries, k)
+
+    print(f"{'index':<8} {'construction':>13} {'rappel@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for index_type in args.types.split(","):
+        start = time.perf_counter()
+        index = build_index(vectors, ids, vectors.shape[1], index_type.strip())
+        build_seconds = time.perf_counter() - start
+        found, latencies = run(index, queries, k)
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        print(
+            f"{index_type_of(index):<8} {build_seconds:>12.2f}s {recall:>9.3f} "
+            f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 95):>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Calibration de la confiance du RAG sur un jeu de questions étiquetées.
+
+Usage :
+    python calibrate_confidence.py                                   # data/calibration_questions.jsonl
+    python calibrate_confidence.py mes_questions.jsonl
+
+Une question par ligne (JSON) :
+    {"question": "...", "language": "fr", "category": "...", "answerable": true, "expected_source": "..."}
+answerable=false pour les questions hors sujet. Le résultat est écrit dans RAG_CALIBRATION_PATH
+(data/faiss/calibration.json) ; recharger les workers via POST /api/admin/rag/reload.
+"""
+
+import json
+import sys
+
+from ai.service.rag import get_rag_service
+
+
+def main() -> None:
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/calibration_questions.jsonl"
+    with open(path, "r", encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    print(f"{len(samples)} questions étiquetées ({path})")
+
+    rag = get_rag_service()
+    report = rag.calibrate(samples)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print(
+        f"Réponse si similarité >= {report['similarity_threshold']} "
+        f"(P >= {rag.calibrator.min_probability}, métrique {report['metric']})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-import pickle
-m = pickle.load(open('data/faiss/meta.pkl', 'rb'))
+from ai.service.vector_store import VectorStore
+m = [meta for _, meta in VectorStore().get_all_metadata()]
 print(f"Total: {len(m)}\n")
 
 # Chercher Spiritualite
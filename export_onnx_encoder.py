@@ -0,0 +1,34 @@
+"""Export de l'encodeur all-MiniLM-L6-v2 en ONNX pour EMBEDDING_BACKEND=onnx.
+
+Usage (nécessite torch, sentence-transformers, onnx, onnxruntime) :
+    python export_onnx_encoder.py                   # data/onnx/all-MiniLM-L6-v2/model.onnx
+    python export_onnx_encoder.py --quantize        # + model_int8.onnx (quantification dynamique int8)
+    python benchmark_encoder.py                     # parité avec torch, latence et mémoire
+
+Puis dans .env : EMBEDDING_BACKEND=onnx (et EMBEDDING_ONNX_QUANTIZED=1 pour la version int8).
+Les workers n'ont alors plus besoin de torch (onnxruntime + tokenizers suffisent).
+"""
+
+import argparse
+import os
+
+from ai.service.onnx_encoder import DEFAULT_MODEL, DEFAULT_ONNX_DIR, export_onnx
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--output", default=DEFAULT_ONNX_DIR)
+    parser.add_argument("--quantize", action="store_true", help="produire aussi la version int8")
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    files = export_onnx(args.output, args.model, quantize=args.quantize, opset=args.opset)
+    for kind, path in files.items():
+        # Les exporteurs récents placent les poids à côté du graphe (model.onnx.data)
+        size = sum(os.path.getsize(p) for p in (path, path + ".data") if os.path.exists(p))
+        print(f"{kind:<10} {path} ({size / 1e6:.1f} Mo)")
+
+
+if __name__ == "__main__":
+    main()
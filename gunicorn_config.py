@@ -1,3 +1,3 @@
 bind = "0.0.0.0:10000"  # Render utilise le port interne 10000
-workers = 2  # Suffisant pour l'instance gratuite
+workers = 2  # Suffisant pour l'instance gratuite (index FAISS de base partagé en mmap)
 worker_class = "uvicorn.workers.UvicornWorker"
\ No newline at end of file
@@ -1,15 +1,15 @@
-import pickle
 import os
 
+from ai.service.vector_store import VectorStore
+
 # Charger les métadonnées FAISS
-meta_path = os.path.join('data', 'faiss', 'meta.pkl')
+faiss_dir = os.path.join('data', 'faiss')
 
-if not os.path.exists(meta_path):
-    print("❌ Fichier meta.pkl introuvable")
+if not os.path.exists(os.path.join(faiss_dir, 'CURRENT')) and not os.path.exists(os.path.join(faiss_dir, 'meta.pkl')):
+    print("❌ Index FAISS introuvable")
     exit(1)
 
-with open(meta_path, 'rb') as f:
-    meta = pickle.load(f)
+meta = [m for _, m in VectorStore(path=faiss_dir).get_all_metadata()]
 
 print(f"✅ Total: {len(meta)} documents\n")
 
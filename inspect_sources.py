@@ -1,13 +1,12 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 """
-Inspecter les sources dans meta.pkl
+Inspecter les sources de l'index FAISS
 """
-import pickle
+from ai.service.vector_store import VectorStore
 
-# Charger les métadonnées
-with open('data/faiss/meta.pkl', 'rb') as f:
-    meta = pickle.load(f)
+# Charger les métadonnées (index FAISS : génération courante + journal)
+meta = [m for _, m in VectorStore().get_all_metadata()]
 
 print(f"\n📊 Total: {len(meta)} items dans l'index\n")
 
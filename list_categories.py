@@ -1,7 +1,7 @@
-import pickle
+from ai.service.vector_store import VectorStore
 
-# Charger les métadonnées
-meta = pickle.load(open('data/faiss/meta.pkl', 'rb'))
+# Charger les métadonnées (index FAISS : génération courante + journal)
+meta = [m for _, m in VectorStore().get_all_metadata()]
 
 # Extraire les catégories
 categories = {}
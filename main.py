@@ -39,11 +39,11 @@ logging.getLogger('pymongo.serverSelection').setLevel(logging.WARNING)
 # AI routes yingre ai
 try:
     from ai.routes import ai_chat, ai_ingest
-    from ai.service.rag import rag
+    from ai.service.rag import get_rag_service
 except ImportError:
     try:
         from backend.ai.routes import ai_chat, ai_ingest
-        from backend.ai.service.rag import rag
+        from backend.ai.service.rag import get_rag_service
     except ImportError:
         ai_chat = None
         ai_ingest = None
@@ -517,20 +517,25 @@ async def root():
     }
 
 
-# Importer le vrai moteur IA (RAGService)
+# Importer le vrai moteur IA (RAGService partagé avec les routers /ai)
 try:
-    from ai.service.rag import RAGService
+    from ai.service.rag import get_rag_service
 except ImportError:
-    from backend.ai.service.rag import RAGService
+    from backend.ai.service.rag import get_rag_service
 
-rag = RAGService()
+try:
+    from ai.service.executors import run_in_executor
+except ImportError:
+    from backend.ai.service.executors import run_in_executor
+
+rag = get_rag_service()
 
 @app.post("/api/chat/guest", response_model=GuestChatResponse)
 async def guest_chat(req: GuestChatRequest):
     session_id = req.session_id or str(uuid.uuid4())
     try:
-        # Appel au moteur IA (RAG)
-        answer, context = rag.ask(req.message, k=5)
+        # Appel au moteur IA (RAG) hors de la boucle d'événements
+        answer, context = await rag.ask_async(req.message, k=5)
         conversation_entry = {
             "user_id": session_id,
             "category": req.category,
@@ -540,7 +545,7 @@ async def guest_chat(req: GuestChatRequest):
             ],
             "timestamp": datetime.utcnow()
         }
-        conversation_id = db.save_chat_conversation(conversation_entry)
+        conversation_id = await run_in_executor("io", db.save_chat_conversation, conversation_entry)
         return {
             "conversation_id": conversation_id,
             "response": answer,
@@ -554,7 +559,7 @@ async def guest_chat(req: GuestChatRequest):
 async def health():
     """Health check endpoint"""
     try:
-        stats = db.get_system_stats()  # REMPLACE Database.load()
+        stats = await run_in_executor("io", db.get_system_stats)  # REMPLACE Database.load()
         
         uptime_seconds = time.time() - START_TIME
         days = int(uptime_seconds // 86400)
@@ -1339,6 +1344,7 @@ async def get_rag_stats(_: bool = Depends(verify_admin)):
         return {
             "success": True,
             "stats": stats,
+            "embeddings": rag.encoder.get_stats(),
             "timestamp": datetime.now().isoformat()
         }
     
@@ -1359,34 +1365,15 @@ async def get_rag_documents(
         if not rag or not rag.vector_store:
             raise HTTPException(status_code=503, detail="RAG non initialisé")
         
-        all_docs = rag.vector_store.get_all_metadata()
-        
-        # Filtrer par langue si spécifié
-        if language:
-            filtered = []
-            for idx, meta in all_docs:
-                source = meta.get('source', '')
-                if f'-{language}' in source:
-                    filtered.append({
-                        'index': idx,
-                        'text': meta.get('text', '')[:200] + '...',  # Extrait
-                        'source': source,
-                        'language': language,
-                        'full_text_length': len(meta.get('text', ''))
-                    })
-            all_docs = filtered
-        else:
-            all_docs = [{
-                'index': idx,
-                'text': meta.get('text', '')[:200] + '...',
-                'source': meta.get('source', ''),
-                'language': _extract_language(meta.get('source', '')),
-                'full_text_length': len(meta.get('text', ''))
-            } for idx, meta in all_docs]
-        
-        # Pagination
-        total = len(all_docs)
-        paginated = all_docs[offset:offset+limit]
+        # Pagination et filtre par langue faits dans le stockage des métadonnées
+        total, rows = rag.vector_store.list_documents(offset=offset, limit=limit, language=language)
+        paginated = [{
+            'index': row['doc_id'],
+            'text': row['text'] + '...',  # Extrait
+            'source': row['source'],
+            'language': row['language'],
+            'full_text_length': row['text_length']
+        } for row in rows]
         
         return {
             "success": True,
@@ -1401,35 +1388,23 @@ async def get_rag_documents(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _extract_language(source: str) -> str:
-    """Extrait la langue depuis la source (ex: admin-json-Histoire-fr → fr)"""
-    if '-fr' in source:
-        return 'fr'
-    elif '-mo' in source:
-        return 'mo'
-    elif '-di' in source:
-        return 'di'
-    return 'unknown'
-
-
 @app.delete("/api/admin/rag/documents/{index}", tags=["Admin", "RAG"])
 async def delete_rag_document(
     index: int,
     background_tasks: BackgroundTasks,
     _: bool = Depends(verify_admin)
 ):
-    """Supprimer un document spécifique du RAG par son index"""
+    """Supprimer un document spécifique du RAG par son index (identifiant stable)"""
     try:
         if not rag or not rag.vector_store:
             raise HTTPException(status_code=503, detail="RAG non initialisé")
         
         # Vérifier que l'index existe
-        all_docs = rag.vector_store.get_all_metadata()
-        if index >= len(all_docs):
+        if rag.vector_store.get_document(index) is None:
             raise HTTPException(status_code=404, detail=f"Document index {index} non trouvé")
         
         # Supprimer
-        rag.vector_store.delete_by_indices([index])
+        rag.vector_store.delete_by_ids([index])
         
         # Log
         background_tasks.add_task(
@@ -1570,6 +1545,57 @@ async def clear_all_rag(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/admin/rag/compact", tags=["Admin", "RAG"])
+async def compact_rag(_: bool = Depends(verify_admin)):
+    """Fusionner le journal d'ingestion dans une nouvelle génération de l'index FAISS (sans les doublons)"""
+    try:
+        if not rag or not rag.vector_store:
+            raise HTTPException(status_code=503, detail="RAG non initialisé")
+
+        # Passages au contenu identique dans une même partition (ingestions répétées avant la déduplication) : on garde le plus ancien
+        # Reconstruction de l'index hors de la boucle d'événements (pool "io", le pool "rag" sert les requêtes)
+        duplicates_removed = await run_in_executor("io", rag.vector_store.delete_duplicates)
+        await run_in_executor("io", rag.vector_store.compact)
+        stats = await run_in_executor("io", rag.vector_store.get_stats)
+
+        return {
+            "success": True,
+            "message": "Index RAG compacté",
+            "duplicates_removed": duplicates_removed,
+            "stats": stats
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur compaction RAG: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/admin/rag/reload", tags=["Admin", "RAG"])
+async def reload_rag(_: bool = Depends(verify_admin)):
+    """Recharger la génération courante de l'index FAISS et la calibration (pour ce worker)"""
+    try:
+        if not rag or not rag.vector_store:
+            raise HTTPException(status_code=503, detail="RAG non initialisé")
+
+        await run_in_executor("io", rag.vector_store.reload)
+        await run_in_executor("io", rag.calibrator.load)
+        stats = await run_in_executor("io", rag.vector_store.get_stats)
+
+        return {
+            "success": True,
+            "message": "Index RAG rechargé",
+            "stats": stats
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur rechargement RAG: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/admin/validate-and-ingest/{item_id}", tags=["Admin"])
 async def validate_and_ingest_knowledge(
     item_id: str,
@@ -1734,6 +1760,7 @@ async def admin_ingest_excel(
         # Traiter chaque ligne
         ingested_count = 0
         errors = []
+        pending = []  # (index, record RAG, document MongoDB)
         
         for index, row in df.iterrows():
             try:
@@ -1749,10 +1776,11 @@ async def admin_ingest_excel(
                 # Créer le texte complet pour ingestion
                 full_text = f"{title}\n\n{content}"
                 
-                # Ingérer dans le RAG
-                rag.ingest([full_text], f"admin-excel-{category}")
+                # Clé stable du passage : une ré-importation met à jour au lieu de dupliquer
+                record = {"text": full_text, "source": f"admin-excel-{category}", "category": category,
+                          "doc_key": f"excel:{category}:{title}"}
                 
-                # Sauvegarder dans MongoDB
+                # Document MongoDB (écrit après l'ingestion RAG du lot)
                 document_data = {
                     "id": f"excel_{datetime.now().strftime('%Y%m%d%H%M%S')}_{index}",
                     "filename": f"{title[:30]}.txt",
@@ -1767,8 +1795,7 @@ async def admin_ingest_excel(
                     "size": len(content)
                 }
                 
-                db.add_document(document_data)
-                ingested_count += 1
+                pending.append((index, record, document_data))
                 
             except Exception as e:
                 error_msg = f"Ligne {index + 2}: {str(e)}"
@@ -1776,6 +1803,20 @@ async def admin_ingest_excel(
                 logger.error(f"Erreur ingestion ligne {index + 2}: {e}")
                 continue
         
+        # Ingérer toutes les lignes dans le RAG en un seul lot (un encodage par mini-lot, une écriture),
+        # dans le pool io comme la compaction : les threads du pool rag restent aux recherches
+        rag_report = await run_in_executor("io", rag.ingest_many, [record for _, record, _ in pending])
+        
+        # Sauvegarder dans MongoDB
+        for index, _, document_data in pending:
+            try:
+                await run_in_executor("io", db.add_document, document_data)
+                ingested_count += 1
+            except Exception as e:
+                error_msg = f"Ligne {index + 2}: {str(e)}"
+                errors.append(error_msg)
+                logger.error(f"Erreur ingestion ligne {index + 2}: {e}")
+        
         # Log dans MongoDB
         if background_tasks:
             background_tasks.add_task(
@@ -1789,13 +1830,14 @@ async def admin_ingest_excel(
                 }
             )
         
-        logger.info(f"✅ Excel importé: {ingested_count} connaissances ingérées, {len(errors)} erreurs")
+        logger.info(f"✅ Excel importé: {ingested_count} connaissances ingérées, {len(errors)} erreurs ({rag_report['docs_per_second']} docs/s)")
         
         result = {
             "message": f"Import Excel terminé avec succès",
             "ingested_count": ingested_count,
             "total_rows": len(df),
             "errors_count": len(errors),
+            "rag_ingest": rag_report,
             "success": True
         }
         
@@ -1839,6 +1881,7 @@ async def admin_ingest_json(
         # Traiter chaque connaissance multilingue
         ingested_count = 0
         errors = []
+        pending = []  # (index, langue, record RAG, document MongoDB)
         
         for index, item in enumerate(data):
             try:
@@ -1891,11 +1934,16 @@ async def admin_ingest_json(
                         # Choisir une réponse principale pour MongoDB (ancien champ "reponse" ignoré)
                         answer_for_db = reponse_detaillee or reponse_courte or ""
 
-                        # Ingérer dans le RAG
-                        if rag:
-                            rag.ingest([full_text], f"admin-json-{category}-{lang_code}")
+                        record = {
+                            "text": full_text,
+                            "source": f"admin-json-{category}-{lang_code}",
+                            "category": category,
+                            "language": lang_code,
+                            # Clé stable du passage : une ré-ingestion du même fichier met à jour au lieu de dupliquer
+                            "doc_key": f"json:{category}:{lang_code}:{question or index}",
+                        }
 
-                        # Sauvegarder dans MongoDB (en conservant les champs enrichis si présents)
+                        # Document MongoDB (en conservant les champs enrichis si présents)
                         document_data = {
                             "id": f"json_{category}_{lang_code}_{index}",
                             "filename": f"{(question or (reponse_courte or answer_for_db or ''))[:50]}... ({lang_code})",
@@ -1922,8 +1970,7 @@ async def admin_ingest_json(
                         if avertissement:
                             document_data["warning"] = avertissement
 
-                        db.add_document(document_data)
-                        ingested_count += 1
+                        pending.append((index, lang_code, record, document_data))
 
                     except Exception as lang_error:
                         errors.append({
@@ -1940,6 +1987,23 @@ async def admin_ingest_json(
                 })
                 continue
         
+        # Ingérer toutes les langues dans le RAG en un seul lot (pool io, comme la compaction)
+        rag_report = None
+        if rag:
+            rag_report = await run_in_executor("io", rag.ingest_many, [record for _, _, record, _ in pending])
+        
+        # Sauvegarder dans MongoDB
+        for index, lang_code, _, document_data in pending:
+            try:
+                await run_in_executor("io", db.add_document, document_data)
+                ingested_count += 1
+            except Exception as db_error:
+                errors.append({
+                    "index": index,
+                    "language": lang_code,
+                    "error": str(db_error)
+                })
+        
         # Log dans MongoDB
         background_tasks.add_task(
             db.add_admin_log,
@@ -1954,12 +2018,15 @@ async def admin_ingest_json(
         )
         
         logger.info(f"✅ JSON importé: {ingested_count} connaissances ingérées, {len(errors)} erreurs")
+        if rag_report:
+            logger.info(f"📚 RAG: {rag_report['added']} ajoutées, {rag_report['updated']} mises à jour, {rag_report['unchanged']} inchangées")
         
         result = {
             "message": f"Import JSON terminé avec succès",
             "ingested_count": ingested_count,
             "total_items": len(data),
             "errors_count": len(errors),
+            "rag_ingest": rag_report,
             "success": True
         }
         
@@ -2169,7 +2236,7 @@ async def chat_with_ai(message: ChatMessage, background_tasks: BackgroundTasks):
         logger.info(f"🌍 Langue détectée: {detected_lang}")
         
         # ============ APPEL AU RAG AVEC FILTRE LANGUE ============
-        response_text, sources = rag.ask(message.message, k=5, language=detected_lang)
+        response_text, sources = await rag.ask_async(message.message, k=5, language=detected_lang)
         
         # ============ ANALYSE ET FORMATAGE CONVERSATIONNEL ============
         analysis = conversation_service.analyze_and_respond(
@@ -2222,7 +2289,7 @@ async def chat_with_ai(message: ChatMessage, background_tasks: BackgroundTasks):
         
         # SAUVEGARDE DANS MONGODB
         from mongodb import db
-        mongo_id = db.save_chat_conversation(conversation_data)
+        mongo_id = await run_in_executor("io", db.save_chat_conversation, conversation_data)
         
         # Log admin
         background_tasks.add_task(
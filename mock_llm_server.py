@@ -0,0 +1,114 @@
+"""Serveur LLM factice (protocoles Ollama et OpenAI) pour les tests de bout en bout et benchmarks.
+
+Réponses déterministes produites par MockLLMBackend, avec latence du premier token et débit
+réglables (MOCK_LLM_LATENCY_MS, MOCK_LLM_TOKENS_PER_SEC, MOCK_LLM_MAX_TOKENS), et coût
+d'évaluation du prompt avec cache de préfixe (MOCK_LLM_PROMPT_MS_PER_TOKEN).
+
+Usage :
+    python mock_llm_server.py --port 11434 --latency-ms 300 --tokens-per-sec 20
+    OLLAMA_URL=http://localhost:11434 uvicorn main:app          # backend ollama vers le mock
+    LLM_BACKEND=openai LLM_BASE_URL=http://localhost:11434/v1 ...  # ou protocole OpenAI
+
+Pour se passer complètement de serveur : LLM_BACKEND=mock (même générateur dans le processus).
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from ai.service.llm_backends import MockLLMBackend
+
+app = FastAPI(title="Mock LLM")
+mock = MockLLMBackend()
+
+
+async def _tokens(messages, options, prefill):
+    prefill.update(await asyncio.to_thread(mock.prefill, messages))
+    await asyncio.sleep(mock.latency_ms / 1000)
+    for token in mock.tokens(messages, options):
+        await asyncio.sleep(1.0 / mock.tokens_per_sec)
+        yield token
+
+
+@app.post("/api/chat")
+async def ollama_chat(request: Request):
+    body = await request.json()
+    messages, options = body.get("messages", []), body.get("options") or {}
+    prefill = {}
+
+    if not body.get("stream", True):
+        text = "".join([t async for t in _tokens(messages, options, prefill)])
+        return {"model": body.get("model"), "message": {"role": "assistant", "content": text}, "done": True,
+                "eval_count": len(mock.tokens(messages, options)), **prefill}
+
+    async def stream():
+        produced = 0
+        async for token in _tokens(messages, options, prefill):
+            produced += 1
+            yield json.dumps({"model": body.get("model"), "message": {"role": "assistant", "content": token},
+                              "done": False}) + "\n"
+        yield json.dumps({"model": body.get("model"), "message": {"role": "assistant", "content": ""}, "done": True,
+                          "eval_count": produced, **prefill}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    options = {"num_predict": body["max_tokens"]} if "max_tokens" in body else {}
+    created = int(time.time())
+    prefill = {}
+
+    def usage(completion_tokens):
+        prompt_tokens = mock.prompt_tokens(messages)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": max(0, prompt_tokens - prefill["prompt_eval_count"])}}
+
+    if not body.get("stream"):
+        text = "".join([t async for t in _tokens(messages, options, prefill)])
+        return {"object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage(len(mock.tokens(messages, options)))}
+
+    async def stream():
+        produced = 0
+        async for token in _tokens(messages, options, prefill):
+            produced += 1
+            event = {"object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event = {"object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                     "choices": [], "usage": usage(produced)}
+            yield f"data: {json.dumps(event)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/api/tags")
+def tags():
+    """Liste des modèles (vérification de disponibilité façon Ollama)"""
+    return {"models": [{"name": "mock"}]}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serveur LLM factice (Ollama / OpenAI)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency-ms", type=float, default=None, help="délai avant le premier token")
+    parser.add_argument("--tokens-per-sec", type=float, default=None, help="débit de génération")
+    args = parser.parse_args()
+    if args.latency_ms is not None:
+        mock.latency_ms = args.latency_ms
+    if args.tokens_per_sec:
+        mock.tokens_per_sec = args.tokens_per_sec
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,46 @@
+"""Reconstruction de l'index RAG (FAISS) avec un autre type d'index.
+
+Usage :
+    python rebuild_rag_index.py            # type de RAG_INDEX_TYPE (flat par défaut)
+    python rebuild_rag_index.py hnsw       # flat | hnsw | ivfpq
+    python rebuild_rag_index.py flat cosine  # métrique : l2 | cosine (vecteurs normalisés)
+
+- Reconstruit l'index de base depuis les vecteurs bruts (réentraînement IVF-PQ inclus).
+- Les workers en cours basculent sur la nouvelle génération au prochain rafraîchissement.
+- Les compactions suivantes gardent ce type et cette métrique ; penser à relancer
+  calibrate_confidence.py après un changement de métrique.
+"""
+
+import sys
+import time
+
+from ai.service.index_factory import INDEX_TYPES, METRICS
+from ai.service.embedding import get_encoder
+from ai.service.vector_store import VectorStore
+
+
+def main() -> None:
+    index_type = sys.argv[1].lower() if len(sys.argv) > 1 else None
+    if index_type and index_type not in INDEX_TYPES:
+        print(f"Type inconnu : {index_type} (attendu : {', '.join(INDEX_TYPES)})")
+        sys.exit(1)
+    metric = sys.argv[2].lower() if len(sys.argv) > 2 else None
+    if metric and metric not in METRICS:
+        print(f"Métrique inconnue : {metric} (attendu : {', '.join(METRICS)})")
+        sys.exit(1)
+
+    # Dimension du modèle d'embedding configuré, comme RAGService
+    store = VectorStore(dim=get_encoder().dim)
+    print("Avant reconstruction :")
+    print(store.get_stats())
+
+    start = time.perf_counter()
+    store.rebuild(index_type, metric)
+    print(f"Reconstruction terminée en {time.perf_counter() - start:.1f}s")
+
+    print("Apres reconstruction :")
+    print(store.get_stats())
+
+
+if __name__ == "__main__":
+    main()
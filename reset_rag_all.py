@@ -5,11 +5,13 @@ ATTENTION :
 - A utiliser juste avant de reingérer les connaissances enrichies (via ingest.bat).
 """
 
+from ai.service.embedding import get_encoder
 from ai.service.vector_store import VectorStore
 
 
 def main() -> None:
-    store = VectorStore(dim=384)
+    # Dimension du modèle d'embedding configuré, comme RAGService
+    store = VectorStore(dim=get_encoder().dim)
     before = store.get_stats()
     print("Avant reinitialisation :")
     print(before)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests du RAGService sans modèle d'embedding ni index de production :
+encodeur factice (sac de mots haché), index FAISS dans un dossier temporaire.
+- questions hors sujet rejetées (même avec un mot commun trouvé par BM25)
+- ré-ingestion du même lot idempotente
+
+    python -m pytest -q test_rag_offline.py
+"""
+import hashlib
+import unicodedata
+
+import numpy as np
+import pytest
+
+from ai.service import rag as rag_module
+from ai.service.embedding import Encoder
+
+DIM = 384
+
+KNOWLEDGE = [
+    ("Plantes Medicinales", "Le neem soigne les maux d'estomac et le paludisme."),
+    ("Plantes Medicinales", "Le kinkeliba se boit en tisane pour la digestion."),
+    ("Agriculture", "L'oignon rouge se cultive en saison sèche près des bas-fonds."),
+    ("Agriculture", "Le mil et le sorgho résistent à la sécheresse."),
+]
+
+
+class _HashingModel:
+    """Sac de mots haché : les textes qui partagent des mots ont des vecteurs proches"""
+
+    def get_sentence_embedding_dimension(self):
+        return DIM
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        vectors = np.zeros((len(texts), DIM), dtype="float32")
+        for row, text in enumerate(texts):
+            text = unicodedata.normalize("NFD", text.lower())
+            text = "".join(c if c.isalnum() else " " for c in text if unicodedata.category(c) != "Mn")
+            for word in text.split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % DIM] += 1.0
+        return vectors
+
+
+def _records(knowledge):
+    return [
+        {"text": text, "source": f"admin-json-{category}-fr", "category": category, "language": "fr",
+         "doc_key": f"json:{category}:fr:{i}"}
+        for i, (category, text) in enumerate(knowledge)
+    ]
+
+
+def _is_rejected(answer):
+    return any(word in answer.lower() for word in ["reformuler", "pas trouvé", "pas sûr"])
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("EMBEDDING_DISK_CACHE", "0")
+    encoder = Encoder("hashing-test", _HashingModel(), "test")
+    monkeypatch.setattr(rag_module, "get_encoder", lambda *args: encoder)
+    service = rag_module.RAGService()
+    service.ingest_many(_records(KNOWLEDGE))
+    return service
+
+
+@pytest.mark.parametrize("question, category", [
+    ("météo", None),
+    ("voiture rouge", None),
+    ("football", "Plantes Medicinales"),
+])
+def test_off_topic_question_is_rejected(rag, question, category):
+    answer, context = rag.ask(question, language="fr", category=category, min_confidence=0.6)
+    assert _is_rejected(answer)
+    assert context == ""
+
+
+def test_on_topic_question_is_answered(rag):
+    answer, context = rag.ask("neem estomac", language="fr", category="Plantes Medicinales", min_confidence=0.6)
+    assert not _is_rejected(answer)
+    assert "neem" in context
+
+
+def test_reingestion_is_idempotent(rag):
+    total = rag.vector_store.count()
+    report = rag.ingest_many(_records(KNOWLEDGE))
+    assert (report["added"], report["updated"], report["unchanged"]) == (0, 0, len(KNOWLEDGE))
+    assert rag.vector_store.count() == total
+
+    # Même fichier corrigé : seule la réponse modifiée est remplacée, sous le même identifiant de passage
+    knowledge = list(KNOWLEDGE)
+    knowledge[3] = ("Agriculture", "Le mil, le sorgho et le fonio résistent à la sécheresse.")
+    report = rag.ingest_many(_records(knowledge) + _records(knowledge[:1]))
+    assert (report["added"], report["updated"], report["unchanged"], report["duplicates"]) == (0, 1, 3, 1)
+    assert rag.vector_store.count() == total
+    assert rag.vector_store.keyword_search("fonio", k=1)[0]["doc_key"] == "json:Agriculture:fr:3"
+
+
+def test_same_text_in_another_language_is_ingested(rag):
+    total = rag.vector_store.count()
+    category, text = KNOWLEDGE[0]
+    records = [
+        {"text": text, "source": f"admin-json-{category}-{language}", "category": category, "language": language,
+         "doc_key": f"json:{category}:{language}:0"}
+        for language in ("mo", "di")
+    ]
+    report = rag.ingest_many(records + records[:1])
+    assert (report["added"], report["unchanged"], report["duplicates"]) == (2, 0, 1)
+    assert rag.vector_store.count() == total + 2
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests du VectorStore (index FAISS segmenté) dans un dossier temporaire :
+reprise du journal après un crash, recherche filtrée sur petite partition,
+compaction concurrente des écritures, ingestion idempotente.
+
+    python -m pytest -q test_vector_store.py
+"""
+import os
+
+import numpy as np
+import pytest
+
+from ai.service.vector_store import VectorStore, normalized_content_hash
+
+DIM = 384
+
+
+def _vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype("float32")
+
+
+def _docs(n, language="fr"):
+    return [{"text": f"document {i}", "source": f"admin-json-Test-{language}"} for i in range(n)]
+
+
+def test_wal_replay_after_crash_ignores_truncated_record(tmp_path):
+    path = str(tmp_path / "faiss")
+    store = VectorStore(dim=DIM, path=path)
+    first = store.add(_vectors(3), _docs(3))
+    store.delete_by_ids([first[0]])
+    store.add(_vectors(2, seed=1), _docs(2))
+    wal_path, complete = store.wal_path, store._wal_offset
+
+    # Crash pendant l'écriture du dernier enregistrement : il n'en reste que le début
+    with open(wal_path, "r+b") as f:
+        f.truncate(complete - 10)
+
+    reopened = VectorStore(dim=DIM, path=path)
+    ids = [doc_id for doc_id, _ in reopened.get_all_metadata()]
+    assert ids == first[1:]
+    assert os.path.getsize(wal_path) < complete - 10
+
+    # Le journal tronqué reste exploitable : une nouvelle écriture survit au redémarrage
+    added = reopened.add(_vectors(1, seed=2), _docs(1))
+    assert [doc_id for doc_id, _ in VectorStore(dim=DIM, path=path).get_all_metadata()] == first[1:] + added
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_filtered_search_on_small_partition_is_exact(tmp_path, monkeypatch, index_type):
+    monkeypatch.setenv("RAG_INDEX_TYPE", index_type)
+    # efSearch volontairement bas : le graphe filtré seul raterait des documents de la partition
+    monkeypatch.setenv("RAG_HNSW_EF_SEARCH", "8")
+    vectors = _vectors(2000)
+    metadata = [
+        {"text": f"document {i}", "source": "admin-json-Test-fr" if i % 100 == 0 else "admin-json-Test-mo"}
+        for i in range(len(vectors))
+    ]
+    store = VectorStore(dim=DIM, path=str(tmp_path / "faiss"))
+    store.add(vectors, metadata)
+    store.compact()
+    assert store.get_stats()["index_type"] == index_type
+
+    query = _vectors(1, seed=7)
+    partition = np.arange(0, len(vectors), 100)
+    distances = ((vectors[partition] - query) ** 2).sum(axis=1)
+    expected = partition[np.argsort(distances)[:10]].tolist()
+
+    results = store.search(query, k=10, language="fr")
+    assert [r["doc_id"] for r in results] == expected
+
+    # Chemin du sélecteur FAISS (grandes partitions) : efSearch relevé selon la sélectivité
+    store.exact_filter_max = 0
+    results = store.search(query, k=10, language="fr")
+    assert len(results) == 10
+    assert all(r["source"].endswith("-fr") for r in results)
+
+
+def test_compaction_keeps_writes_made_during_build(tmp_path, monkeypatch):
+    path = str(tmp_path / "faiss")
+    store = VectorStore(dim=DIM, path=path)
+    initial = store.add(_vectors(5), _docs(5))
+    during = []
+
+    build = store._build_compacted
+
+    def build_with_concurrent_writes(snapshot, *args):
+        # Le verrou d'écriture est libre pendant la construction
+        during.extend(store.add(_vectors(2, seed=3), _docs(2)))
+        store.delete_by_ids([initial[0]])
+        return build(snapshot, *args)
+
+    monkeypatch.setattr(store, "_build_compacted", build_with_concurrent_writes)
+    store.compact()
+
+    expected = initial[1:] + during
+    assert store.generation == 2
+    assert [doc_id for doc_id, _ in store.get_all_metadata()] == expected
+    assert [doc_id for doc_id, _ in VectorStore(dim=DIM, path=path).get_all_metadata()] == expected
+
+
+def test_upsert_is_idempotent(tmp_path):
+    store = VectorStore(dim=DIM, path=str(tmp_path / "faiss"))
+    records = [
+        {"text": text, "source": "admin-json-Test-fr", "doc_key": f"json:test:fr:{i}",
+         "content_hash": normalized_content_hash(text)}
+        for i, text in enumerate(["Le karité", "Le néré", "Le baobab"])
+    ]
+    report = store.upsert(_vectors(3), records)
+    assert len(report["added"]) == 3
+
+    assert store.classify(records) == ["unchanged"] * 3
+    report = store.upsert(_vectors(3), records)
+    assert (len(report["added"]), len(report["updated"]), len(report["unchanged"])) == (0, 0, 3)
+
+    changed = {**records[1], "text": "Le néré (soumbala)", "content_hash": normalized_content_hash("Le néré (soumbala)")}
+    report = store.upsert(_vectors(1, seed=4), [changed])
+    assert len(report["updated"]) == 1
+    assert store.count() == 3
+    assert store.get_document(report["updated"][0])["text"] == "Le néré (soumbala)"
+
+    # Ancien document sans clé au contenu identique (à la casse et aux espaces près)
+    store.add(_vectors(1, seed=5), [{"text": "le  KARITÉ", "source": "admin-json-Test-fr"}])
+    assert store.delete_duplicates() == 1
+    assert store.count() == 3
+
+
+def test_write_after_torn_record_from_another_worker_survives(tmp_path):
+    path = str(tmp_path / "faiss")
+    worker_a = VectorStore(dim=DIM, path=path)
+    worker_b = VectorStore(dim=DIM, path=path)
+    first = worker_a.add(_vectors(2), _docs(2))
+
+    # Le worker A meurt au milieu d'un ajout : début d'enregistrement sans fin
+    with open(worker_a.wal_path, "ab") as f:
+        f.write(b"YWL2\x01garbage")
+
+    added = worker_b.add(_vectors(1, seed=1), _docs(1))
+    reopened = VectorStore(dim=DIM, path=path)
+    assert [doc_id for doc_id, _ in reopened.get_all_metadata()] == first + added
+
+
+def test_same_text_in_another_partition_is_added(tmp_path):
+    store = VectorStore(dim=DIM, path=str(tmp_path / "faiss"))
+    text = "Le karité"
+    record = {"text": text, "source": "admin-json-Test-fr", "category": "Test", "language": "fr",
+              "doc_key": "json:Test:fr:0", "content_hash": normalized_content_hash(text)}
+    store.upsert(_vectors(1), [record])
+
+    other_language = {**record, "source": "admin-json-Test-mo", "language": "mo", "doc_key": "json:Test:mo:0"}
+    other_category = {**record, "category": "Autre", "doc_key": "json:Autre:fr:0"}
+    same_partition = {**record, "doc_key": "json:Test:fr:1"}
+    assert store.classify([other_language, other_category, same_partition]) == ["added", "added", "unchanged"]
+
+    store.upsert(_vectors(2, seed=1), [other_language, other_category])
+    assert len(store.search(_vectors(1), k=5, language="mo")) == 1
+    assert store.delete_duplicates() == 0
+
+
+def test_compaction_keeps_the_index_type_of_the_base(tmp_path, monkeypatch):
+    path = str(tmp_path / "faiss")
+    monkeypatch.setenv("RAG_INDEX_TYPE", "ivfpq")
+    store = VectorStore(dim=DIM, path=path)
+    # Base vide : pas de quoi entraîner IVF-PQ, écrite en flat mais toujours demandée en ivfpq
+    assert store.get_stats()["index_type"] == "flat"
+
+    # Worker configuré autrement : la compaction ne change pas le type de la base
+    monkeypatch.setenv("RAG_INDEX_TYPE", "flat")
+    other_worker = VectorStore(dim=DIM, path=path)
+    other_worker.add(_vectors(2000), _docs(2000))
+    other_worker.compact()
+    assert other_worker.get_stats()["index_type"] == "ivfpq"
+
+    other_worker.rebuild("hnsw")
+    other_worker.compact()
+    assert VectorStore(dim=DIM, path=path).get_stats()["index_type"] == "hnsw"